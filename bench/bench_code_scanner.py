@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# bench_code_scanner.py – legacy 3×findall scanner vs single-pass / multi-core scanner
+#
+#   python3 bench/bench_code_scanner.py                 # synthetic tree (2000 files)
+#   python3 bench/bench_code_scanner.py --files=20000
+#   python3 bench/bench_code_scanner.py --input=/path/to/repo
+
+import sys, re, time, random, pathlib, tempfile, shutil
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+from code_scanner import extract_code_sentences
+
+def legacy_extract_code_sentences(source_dir):
+    """Verbatim copy of the v1 scanner, kept as the reference implementation."""
+    code_snippets = set()
+    for file in pathlib.Path(source_dir).rglob("*.cs"):
+        try:
+            text = file.read_text(errors="ignore")
+        except Exception:
+            continue
+        patterns = [
+            r"[A-Z][A-Za-z0-9_]+\.[A-Za-z0-9_]+\.[A-Za-z0-9_]+",
+            r"[A-Z][A-Za-z0-9_]+\.[A-Za-z0-9_]+",
+            r"[A-Za-z0-9_]+\("
+        ]
+        for pat in patterns:
+            for m in re.findall(pat, text):
+                if len(m) > 4 and not m.startswith("using"):
+                    code_snippets.add(m.strip("("))
+    return sorted(code_snippets)
+
+LINES = [
+    "using System.Data.SqlClient;",
+    "var setting = ConfigurationManager.AppSettings[\"Key{n}\"];",
+    "var user = HttpContext.Current?.User?.Identity?.Name;",
+    "Task.Factory.StartNew(() => Console.WriteLine(\"{n}\"));",
+    "SqlConnection conn{n} = new SqlConnection(setting);",
+    "services.AddScoped<IService{n}, Service{n}>();",
+    "var x{n} = Helper{n}.Compute(a.b.c, Foo_{n}.Bar.Baz());",
+    "return JsonConvert.SerializeObject(model{n}, Formatting.Indented);",
+    "// comment with Some.Dotted.Words and call_{n}( stuff",
+]
+
+def generate_tree(root: pathlib.Path, files: int, lines: int = 120, seed: int = 7):
+    rnd = random.Random(seed)
+    for i in range(files):
+        d = root / f"Project{i % 40}" / f"Folder{i % 13}"
+        d.mkdir(parents=True, exist_ok=True)
+        body = "\n".join(rnd.choice(LINES).format(n=rnd.randint(0, 500)) for _ in range(lines))
+        (d / f"File{i}.cs").write_text(f"namespace Gen{i % 40}\n{{\nclass C{i}\n{{\n{body}\n}}\n}}\n")
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    out = fn(*a, **kw)
+    return out, time.perf_counter() - t0
+
+def main():
+    args = sys.argv[1:]
+    files = int(next((a.split("=",1)[1] for a in args if a.startswith("--files=")), "2000"))
+    given = next((a.split("=",1)[1] for a in args if a.startswith("--input=")), None)
+
+    tmp = None
+    if given:
+        root = pathlib.Path(given)
+    else:
+        tmp = pathlib.Path(tempfile.mkdtemp(prefix="scanbench_"))
+        root = tmp
+        generate_tree(root, files)
+    try:
+        n = sum(1 for _ in root.rglob("*.cs"))
+        legacy, t_legacy = timed(legacy_extract_code_sentences, root)
+        single, t_single = timed(extract_code_sentences, root, jobs=1)
+        multi, t_multi = timed(extract_code_sentences, root)
+
+        print(f"📂 {root} – {n} .cs files, {len(legacy)} patterns")
+        print(f"   legacy (3× findall)    : {t_legacy:8.3f}s")
+        print(f"   single-pass, 1 core    : {t_single:8.3f}s  ({t_legacy / max(t_single, 1e-9):.1f}×)")
+        print(f"   single-pass, all cores : {t_multi:8.3f}s  ({t_legacy / max(t_multi, 1e-9):.1f}×)")
+        same = legacy == single == multi
+        print(f"   identical output       : {'✅' if same else '❌'}")
+        return 0 if same else 1
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
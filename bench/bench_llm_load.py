@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# bench_llm_load.py – load generator for the LLM server: replays recorded migration prompts
+#
+#   python3 bench/bench_llm_load.py --endpoint=http://127.0.0.1:18081/v1/chat/completions --concurrency=1,2,4,8
+#   python3 bench/bench_llm_load.py --fake --fake-slots=4 --concurrency=1,4,8     # offline, bench/fake_llm_server.py
+#
+# Prompts come from --prompts= (JSON lines with site/prompt/max_tokens/temperature,
+# as written by LLM_RECORD_PROMPTS=... src/main.py); the bundled
+# bench/prompts/migration_prompts.jsonl was recorded from a synthetic solution.
+# Every concurrency level sends --requests= requests (prompts cycled) with
+# streaming on and reports p50/p99 latency and TTFT, requests/s and
+# aggregate completion tokens/s. --json= writes the results.
+
+import os, sys, json, time, asyncio, pathlib, statistics
+import httpx
+
+BENCH = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH))
+PROMPTS = BENCH / "prompts" / "migration_prompts.jsonl"
+
+def _opt(args, key, default):
+    return next((a.split("=",1)[1] for a in args if a.startswith(f"--{key}=")), default)
+
+def load_prompts(path):
+    rows = [json.loads(l) for l in pathlib.Path(path).read_text().splitlines() if l.strip()]
+    if not rows:
+        raise ValueError(f"no prompts in {path}")
+    return rows
+
+def percentile(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, round(q * (len(s) - 1))))]
+
+async def one_request(http, endpoint, model, row, max_tokens):
+    """Returns (latency_s, ttft_s, completion tokens) or raises."""
+    payload = {"model": model, "messages": [{"role": "user", "content": row["prompt"]}],
+               "max_tokens": max_tokens or row.get("max_tokens", 800),
+               "temperature": row.get("temperature", 0.2), "stream": True,
+               "stream_options": {"include_usage": True},
+               "cache_prompt": True}         # llama-server: keep the slot's KV for the next prompt
+    t0 = time.perf_counter()
+    ttft, tokens, usage = None, 0, None
+    async with http.stream("POST", endpoint, json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or []
+            if choices and (choices[0].get("delta") or {}).get("content"):
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                tokens += 1
+    if usage and usage.get("completion_tokens"):
+        tokens = usage["completion_tokens"]
+    return time.perf_counter() - t0, ttft, tokens
+
+async def run_level(endpoint, model, prompts, concurrency, requests, max_tokens, timeout):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results, errors = [], []
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as http:
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(prompts[i % len(prompts)])
+
+        async def worker():
+            while True:
+                try:
+                    row = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    results.append(await one_request(http, endpoint, model, row, max_tokens))
+                except Exception as e:
+                    errors.append(repr(e))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+    lat = [r[0] for r in results]
+    ttft = [r[1] for r in results if r[1] is not None]
+    tokens = sum(r[2] for r in results)
+    return {
+        "concurrency": concurrency, "requests": len(results), "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "p50_s": round(percentile(lat, 0.50), 3) if lat else None,
+        "p99_s": round(percentile(lat, 0.99), 3) if lat else None,
+        "mean_s": round(statistics.mean(lat), 3) if lat else None,
+        "ttft_p50_s": round(percentile(ttft, 0.50), 3) if ttft else None,
+        "ttft_p99_s": round(percentile(ttft, 0.99), 3) if ttft else None,
+        "req_per_s": round(len(results) / wall, 2) if wall else None,
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / wall, 1) if wall else None,
+        "first_error": errors[0] if errors else None,
+    }
+
+def main():
+    args = sys.argv[1:]
+    prompts = load_prompts(_opt(args, "prompts", str(PROMPTS)))
+    levels = [int(c) for c in _opt(args, "concurrency", "1,2,4,8").split(",") if c]
+    requests = int(_opt(args, "requests", 32))
+    max_tokens = int(_opt(args, "max-tokens", 0)) or None
+    timeout = float(_opt(args, "timeout", 300))
+    model = _opt(args, "model", "Phi-4-mini-instruct-Q3_K_S.gguf")
+    endpoint = _opt(args, "endpoint", os.getenv("LLM_ENDPOINT", "http://127.0.0.1:18081/v1/chat/completions"))
+
+    server = None
+    if "--fake" in args:
+        import fake_llm_server
+        server, endpoint = fake_llm_server.start(latency_ms=float(_opt(args, "fake-latency-ms", 50)),
+                                                 token_ms=float(_opt(args, "fake-token-ms", 2)),
+                                                 slots=int(_opt(args, "fake-slots", 1)))
+    print(f"🧪 {len(prompts)} recorded prompt(s), {requests} request(s) per level → {endpoint}")
+    print(f"   {'conc':>4} {'ok':>4} {'err':>4} {'p50 s':>8} {'p99 s':>8} {'ttft p50':>9} {'ttft p99':>9} {'req/s':>7} {'tok/s':>8}")
+    out = []
+    try:
+        for c in levels:
+            r = asyncio.run(run_level(endpoint, model, prompts, c, requests, max_tokens, timeout))
+            out.append(r)
+            fmt = lambda v, w: f"{v:>{w}}" if v is not None else f"{'–':>{w}}"
+            print(f"   {c:>4} {r['requests']:>4} {r['errors']:>4} {fmt(r['p50_s'], 8)} {fmt(r['p99_s'], 8)} "
+                  f"{fmt(r['ttft_p50_s'], 9)} {fmt(r['ttft_p99_s'], 9)} {fmt(r['req_per_s'], 7)} {fmt(r['tokens_per_s'], 8)}")
+            if r["first_error"]:
+                print(f"      first error: {r['first_error'][:200]}")
+    finally:
+        if server is not None:
+            server.shutdown()
+    path = _opt(args, "json", "")
+    if path:
+        pathlib.Path(path).write_text(json.dumps({"endpoint": endpoint, "prompts": len(prompts),
+                                                  "requests": requests, "levels": out}, indent=2))
+        print(f"📈 Saved to {path}")
+    return 1 if any(r["errors"] for r in out) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# bench_rule_engine.py – legacy packages × rules re.search loop vs compiled RuleEngine
+#
+#   python3 bench/bench_rule_engine.py                  # 3000 rules, 300 packages
+#   python3 bench/bench_rule_engine.py --rules=10000 --packages=1000
+
+import sys, re, time, random, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+from rule_engine import RuleEngine
+
+def legacy_match_rules(packages, rules):
+    """Verbatim copy of the v1 rule_loader.match_rules, kept as the reference implementation."""
+    matched = []
+    for pkg, version in packages:
+        for r in rules:
+            pat = r.get("pattern", "")
+            try:
+                if re.search(pat, pkg, re.IGNORECASE):
+                    matched.append({
+                        "id": r.get("id","RULE"),
+                        "package": pkg,
+                        "currentVersion": version,
+                        "issue": r.get("issue"),
+                        "recommendation": r.get("recommendation"),
+                        "autofix": r.get("autofix", False)
+                    })
+            except re.error:
+                continue
+    return matched
+
+PARTS = ["Microsoft", "Extensions", "AspNetCore", "Newtonsoft", "Json", "System", "Data", "SqlClient",
+         "Web", "Http", "Logging", "Serilog", "Swashbuckle", "EntityFrameworkCore", "Identity", "Azure",
+         "Storage", "Blobs", "Polly", "Dapper", "AutoMapper", "MediatR", "Sinks", "Abstractions"]
+
+def package_name(rnd):
+    return ".".join(rnd.sample(PARTS, rnd.randint(1, 4)))
+
+def generate(n_rules, n_packages, seed=7):
+    """Mostly literal package names, plus anchored, alternation, wildcard and some broken patterns."""
+    rnd = random.Random(seed)
+    rules = []
+    for i in range(n_rules):
+        k = rnd.random()
+        if k < 0.6:   pat = package_name(rnd)
+        elif k < 0.7: pat = "^" + re.escape(package_name(rnd))
+        elif k < 0.8: pat = f"({rnd.choice(PARTS)}|{rnd.choice(PARTS)})"
+        elif k < 0.9: pat = rnd.choice(PARTS).lower() + ".*" + rnd.choice(PARTS)
+        elif k < 0.95: pat = rnd.choice(PARTS) + r"\.(?:Core|Web)$"
+        else:         pat = rnd.choice(PARTS) + "("
+        rules.append({"id": f"R{i}", "pattern": pat, "recommendation": "upgrade"})
+    packages = [(package_name(rnd), "1.0.0") for _ in range(n_packages)]
+    return rules, packages
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    out = fn(*a, **kw)
+    return out, time.perf_counter() - t0
+
+def main():
+    args = sys.argv[1:]
+    n_rules = int(next((a.split("=",1)[1] for a in args if a.startswith("--rules=")), "3000"))
+    n_packages = int(next((a.split("=",1)[1] for a in args if a.startswith("--packages=")), "300"))
+    rules, packages = generate(n_rules, n_packages)
+
+    legacy, t_legacy = timed(legacy_match_rules, packages, rules)
+    engine, t_build = timed(RuleEngine, rules)
+    compiled, t_match = timed(engine.match, packages)
+
+    print(f"📜 {n_rules} rules ({len(engine.problems)} bad), {n_packages} packages, {len(legacy)} matches")
+    print(f"   legacy loop      : {t_legacy:8.3f}s")
+    print(f"   engine compile   : {t_build:8.3f}s")
+    print(f"   engine match     : {t_match:8.3f}s  ({t_legacy / max(t_match, 1e-9):.1f}×)")
+    same = legacy == compiled
+    print(f"   identical output : {'✅' if same else '❌'}")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# fake_dotnet.py – offline stand-in for the dotnet CLI (restore / build / list package / build-server)
+#
+#   DOTNET_EXE=/path/to/bench/fake_dotnet.py python src/main.py --input=...
+#
+# Output follows MSBuild's minimal verbosity so msbuild_log parses it like
+# the real thing. Timings are simulated (sleep) and tunable:
+#   FAKE_DOTNET_STARTUP_S    process/MSBuild startup when no warm server (0.8)
+#   FAKE_DOTNET_WARM_S       startup with a warm server (0.05)
+#   FAKE_DOTNET_COMPILE_MS   per compiled .cs file (20)
+#   FAKE_DOTNET_RESTORE_S    restore (0.3)
+#   FAKE_DOTNET_STATE        where the "server is warm" marker lives
+# Errors: every legacy API in LEGACY_ERRORS found in a .cs file is reported
+# unless the package that provides it is referenced, plus any line
+# containing `// fake-error CS1234: message`.
+
+import os, re, sys, json, time, pathlib, tempfile
+
+STATE = pathlib.Path(os.getenv("FAKE_DOTNET_STATE", pathlib.Path(tempfile.gettempdir()) / "fake_dotnet"))
+STARTUP_S = float(os.getenv("FAKE_DOTNET_STARTUP_S", "0.8"))
+WARM_S = float(os.getenv("FAKE_DOTNET_WARM_S", "0.05"))
+COMPILE_MS = float(os.getenv("FAKE_DOTNET_COMPILE_MS", "20"))
+RESTORE_S = float(os.getenv("FAKE_DOTNET_RESTORE_S", "0.3"))
+
+# token → (code, message, package that makes it compile)
+LEGACY_ERRORS = {
+    "HttpContext.Current": ("CS0117", "'HttpContext' does not contain a definition for 'Current'", None),
+    "ConfigurationManager": ("CS0103", "The name 'ConfigurationManager' does not exist in the current context",
+                             "Microsoft.Extensions.Configuration"),
+    "SqlConnection": ("CS0246", "The type or namespace name 'SqlConnection' could not be found",
+                      "Microsoft.Data.SqlClient"),
+}
+FAKE_ERROR_RE = re.compile(r"//\s*fake-error\s+([A-Z]+\d+):\s*(.*)")
+
+def _project(cwd: pathlib.Path, args):
+    explicit = [a for a in args if a.endswith(".csproj")]
+    if explicit:
+        return pathlib.Path(explicit[0])
+    found = sorted(cwd.glob("*.csproj"))
+    if not found:
+        print("MSBUILD : error MSB1003: Specify a project or solution file.")
+        sys.exit(1)
+    return found[0]
+
+def _server_warm():
+    return (STATE / "server").exists()
+
+def _startup(args):
+    time.sleep(WARM_S if _server_warm() else STARTUP_S)
+    if "-nodeReuse:true" in args or "-p:UseSharedCompilation=true" in args:
+        STATE.mkdir(parents=True, exist_ok=True)
+        (STATE / "server").touch()
+
+def restore(csproj: pathlib.Path):
+    time.sleep(RESTORE_S)
+    obj = csproj.parent / "obj"
+    obj.mkdir(exist_ok=True)
+    pkgs = re.findall(r'PackageReference Include="(.*?)"', csproj.read_text())
+    (obj / "project.assets.json").write_text(json.dumps({"version": 3, "packages": pkgs,
+                                                          "project": csproj.read_text()}))
+    print(f"  Restored {csproj} (in {int(RESTORE_S * 1000)} ms).")
+
+def _diagnostics(csproj: pathlib.Path, sources, pkgs):
+    out = []
+    for cs in sources:
+        for n, line in enumerate(cs.read_text(errors="ignore").splitlines(), 1):
+            for token, (code, msg, pkg) in LEGACY_ERRORS.items():
+                col = line.find(token)
+                if col >= 0 and not (pkg and pkg in pkgs):
+                    out.append(f"{cs}({n},{col + 1}): error {code}: {msg} [{csproj}]")
+            m = FAKE_ERROR_RE.search(line)
+            if m:
+                out.append(f"{cs}({n},1): error {m.group(1)}: {m.group(2)} [{csproj}]")
+    return out
+
+def build(csproj: pathlib.Path, args):
+    _startup(args)
+    obj = csproj.parent / "obj"
+    assets = obj / "project.assets.json"
+    if "--no-restore" not in args:
+        restore(csproj)
+    elif not assets.exists():
+        msg = (f"/usr/share/dotnet/sdk/Microsoft.PackageDependencyResolution.targets(266,5): error NETSDK1004: "
+               f"Assets file '{assets}' not found. Run a NuGet package restore to generate this file. [{csproj}]")
+        print(msg); print("\nBuild FAILED.\n"); print(msg); print("    0 Warning(s)\n    1 Error(s)")
+        return 1
+
+    pkgs = json.loads(assets.read_text()).get("packages", [])
+    sources = sorted(p for p in csproj.parent.rglob("*.cs") if "obj" not in p.parts and "bin" not in p.parts)
+    stamp = obj / "fake.stamp"
+    if "--no-incremental" in args or not stamp.exists():
+        changed = sources
+    else:
+        since = stamp.stat().st_mtime_ns
+        inputs = sources + [csproj, assets]
+        changed = sources if any(p.stat().st_mtime_ns > since for p in inputs) else []
+    time.sleep(len(changed) * COMPILE_MS / 1000)
+
+    errors = _diagnostics(csproj, sources, pkgs)
+    for e in errors:
+        print(e)
+    if errors:
+        stamp.unlink(missing_ok=True)
+        print("\nBuild FAILED.\n")
+        for e in errors:
+            print(e)
+        print(f"    0 Warning(s)\n    {len(errors)} Error(s)")
+        return 1
+    stamp.touch()
+    (csproj.parent / "bin").mkdir(exist_ok=True)
+    print(f"  {csproj.stem} -> {csproj.parent / 'bin' / (csproj.stem + '.dll')}")
+    print("\nBuild succeeded.\n    0 Warning(s)\n    0 Error(s)")
+    return 0
+
+def list_package(csproj: pathlib.Path):
+    assets = csproj.parent / "obj" / "project.assets.json"
+    if not assets.exists():
+        print(f"No assets file was found for `{csproj}`. Please run restore before running this command.")
+        return 1
+    restored = json.loads(assets.read_text())
+    tfm = re.search(r"<TargetFramework>(.*?)</TargetFramework>", restored.get("project", ""))
+    pkgs = re.findall(r'PackageReference Include="(.*?)" Version="(.*?)"', restored.get("project", ""))
+    print(json.dumps({"version": 1, "parameters": "--outdated", "projects": [{
+        "path": str(csproj),
+        "frameworks": [{"framework": tfm.group(1) if tfm else "unknown", "topLevelPackages": [
+            {"id": p, "requestedVersion": v, "resolvedVersion": v, "latestVersion": "9.0.0"} for p, v in pkgs]}]}]},
+        indent=2))
+    return 0
+
+def main(argv):
+    cwd = pathlib.Path.cwd()
+    if not argv:
+        print("Usage: dotnet [command]"); return 1
+    cmd, args = argv[0], argv[1:]
+    if cmd == "restore":
+        restore(_project(cwd, args)); return 0
+    if cmd == "build":
+        return build(_project(cwd, args), args)
+    if cmd == "list":
+        return list_package(_project(cwd, args))
+    if cmd == "build-server":
+        (STATE / "server").unlink(missing_ok=True)
+        print("Shut down build servers."); return 0
+    if cmd == "--version":
+        print("9.0.100-fake"); return 0
+    print(f"fake_dotnet: unsupported command {cmd!r}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
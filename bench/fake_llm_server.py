@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# fake_llm_server.py – offline OpenAI-compatible /v1/chat/completions for the benchmarks
+#
+#   python3 bench/fake_llm_server.py --port=18081 --latency-ms=200 --token-ms=5 [--slots=4]
+#   LLM_ENDPOINT=http://127.0.0.1:18081/v1/chat/completions python3 src/main.py ...
+#
+# Answers by prompt kind, like the real call sites expect:
+#   rule generation ("Generate NEW rules") → JSON array of rules
+#   verifier micro-fix ("Reply with JSON only") → {"find": ..., "replace": ...}
+#   anything else → a short canned summary
+# Supports both plain JSON and SSE streaming ("stream": true). --slots=N
+# serves at most N requests at a time, like llama-server's parallel slots
+# (0 = unlimited).
+
+import sys, json, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RULES = [
+    {"id": "AUTO-R001", "pattern": "ConfigurationManager.AppSettings", "issue": "System.Configuration is not available",
+     "recommendation": "Configuration", "confidence": 0.9, "autofix": True},
+    {"id": "AUTO-R002", "pattern": "HttpContext.Current", "issue": "No static HttpContext in ASP.NET Core",
+     "recommendation": "HttpContextAccessor.HttpContext", "confidence": 0.85, "autofix": True},
+    {"id": "AUTO-R003", "pattern": "System.Data.SqlClient", "issue": "Legacy SQL client",
+     "recommendation": "Microsoft.Data.SqlClient", "confidence": 0.95, "autofix": True},
+]
+SUMMARY = "Retargeted the project, replaced legacy configuration and SQL client APIs, remaining issues listed above."
+
+def answer(prompt: str) -> str:
+    if "Generate NEW rules" in prompt:
+        return json.dumps(CANNED_RULES)
+    if "Reply with JSON only" in prompt:
+        snippet = prompt.rsplit(":\n", 1)[-1]
+        for line in snippet.splitlines():
+            if "HttpContext.Current" in line:
+                return json.dumps({"find": "HttpContext.Current", "replace": "HttpContextAccessor.HttpContext"})
+        return "I could not find a safe minimal edit."
+    return SUMMARY
+
+class _NoSlots:
+    def __enter__(self): pass
+    def __exit__(self, *exc): pass
+
+class Handler(BaseHTTPRequestHandler):
+    latency_s = 0.0
+    token_s = 0.0
+    requests = 0
+    slots = _NoSlots()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        text = answer(prompt)
+        type(self).requests += 1
+        with self.slots:
+            self._reply(body, text)
+
+    def _reply(self, body, text):
+        time.sleep(self.latency_s)
+        words = text.split(" ")
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for i, w in enumerate(words):
+                time.sleep(self.token_s)
+                delta = {"choices": [{"delta": {"content": w + (" " if i < len(words) - 1 else "")}}]}
+                self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+                self.wfile.flush()
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {"choices": [], "usage": {"completion_tokens": len(words)}}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        time.sleep(self.token_s * len(words))
+        out = json.dumps({"choices": [{"message": {"role": "assistant", "content": text}}],
+                          "usage": {"completion_tokens": len(words)}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128          # load tests open many connections at once
+    daemon_threads = True
+
+def start(port=0, latency_ms=0.0, token_ms=0.0, slots=0):
+    """Starts the server on a daemon thread; returns (server, endpoint URL)."""
+    handler = type("FakeLLMHandler", (Handler,), {"latency_s": latency_ms / 1000, "token_s": token_ms / 1000,
+                                                  "slots": threading.Semaphore(slots) if slots else _NoSlots()})
+    server = _Server(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+def main():
+    args = sys.argv[1:]
+    opt = lambda k, d: next((a.split("=",1)[1] for a in args if a.startswith(f"--{k}=")), d)
+    server, url = start(int(opt("port", 18081)), float(opt("latency-ms", 0)), float(opt("token-ms", 0)),
+                        int(opt("slots", 0)))
+    print(f"🤖 Fake LLM at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
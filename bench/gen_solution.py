@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# gen_solution.py – synthetic .NET solution generator for the benchmarks
+#
+#   python3 bench/gen_solution.py /tmp/sln --projects=20 --files=50 --depth=4 --seed=7
+#
+# Projects form ProjectReference chains `depth` levels deep. A `legacy` share
+# of the files use the APIs the pipeline targets (ConfigurationManager,
+# HttpContext.Current, System.Data.SqlClient), which bench/fake_dotnet.py
+# reports as compile errors.
+
+import sys, random, pathlib
+
+CSPROJ = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup>
+    <OutputType>{output}</OutputType>
+    <TargetFramework>net6.0</TargetFramework>
+    <Nullable>enable</Nullable>
+  </PropertyGroup>
+  <ItemGroup>
+    <PackageReference Include="Newtonsoft.Json" Version="12.0.3" />
+{packages}  </ItemGroup>
+{references}</Project>
+"""
+
+MODERN_LINES = [
+    "var items{n} = new List<int> {{ {n}, {n} + 1 }};",
+    "var json{n} = JsonConvert.SerializeObject(items{n}, Formatting.Indented);",
+    "services.AddScoped<IService{n}, Service{n}>();",
+    "var x{n} = Helper{n}.Compute(a.b.c, Foo_{n}.Bar.Baz());",
+    "logger.LogInformation(\"step {n}\");",
+    "// comment with Some.Dotted.Words and call_{n}( stuff",
+]
+LEGACY_LINES = [
+    "var setting{n} = ConfigurationManager.AppSettings[\"Key{n}\"];",
+    "var user{n} = HttpContext.Current?.User?.Identity?.Name;",
+    "SqlConnection conn{n} = new SqlConnection(\"Server=.;Database=db{n}\");",
+]
+LEGACY_USINGS = "using System.Configuration;\nusing System.Data.SqlClient;\nusing System.Web;\n"
+
+def _source(rnd, ns, cls, lines, legacy):
+    body = []
+    for _ in range(lines):
+        pool = LEGACY_LINES if legacy and rnd.random() < 0.15 else MODERN_LINES
+        body.append("        " + rnd.choice(pool).format(n=rnd.randint(0, 500)))
+    usings = "using System;\nusing System.Collections.Generic;\nusing Newtonsoft.Json;\n" + (LEGACY_USINGS if legacy else "")
+    return (f"{usings}\nnamespace {ns}\n{{\n    public class {cls}\n    {{\n        public void Run()\n        {{\n"
+            + "\n".join(body) + "\n        }\n    }\n}\n")
+
+def generate_solution(root: pathlib.Path, projects=10, files=20, depth=3, lines=60, legacy=0.3, seed=7):
+    """
+    Writes `projects` projects under root; project i references project i-1
+    unless i starts a new chain (every `depth` projects). Returns the csproj paths.
+    """
+    rnd = random.Random(seed)
+    root = pathlib.Path(root)
+    paths = []
+    for i in range(projects):
+        name = f"Gen.Project{i:03}"
+        d = root / name
+        d.mkdir(parents=True, exist_ok=True)
+        refs = ""
+        if depth > 1 and i % depth:
+            prev = f"Gen.Project{i-1:03}"
+            refs = f'  <ItemGroup>\n    <ProjectReference Include="..\\{prev}\\{prev}.csproj" />\n  </ItemGroup>\n'
+        legacy_project = rnd.random() < max(legacy, 0.0) * 2
+        packages = '    <PackageReference Include="System.Data.SqlClient" Version="4.8.5" />\n' if legacy_project else ""
+        output = "Exe" if i % depth == depth - 1 or depth <= 1 else "Library"
+        (d / f"{name}.csproj").write_text(CSPROJ.format(output=output, packages=packages, references=refs))
+        for j in range(files):
+            sub = d / ("Services" if j % 3 else "Models")
+            sub.mkdir(exist_ok=True)
+            is_legacy = legacy_project and rnd.random() < legacy
+            (sub / f"C{j:04}.cs").write_text(_source(rnd, name, f"C{j:04}", lines, is_legacy))
+        paths.append(d / f"{name}.csproj")
+    return paths
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__ or "usage: gen_solution.py DIR [--projects=N --files=M --depth=D --seed=S]")
+        return 1
+    opt = lambda k, d: next((a.split("=",1)[1] for a in args if a.startswith(f"--{k}=")), d)
+    paths = generate_solution(pathlib.Path(args[0]), int(opt("projects", 10)), int(opt("files", 20)),
+                              int(opt("depth", 3)), int(opt("lines", 60)), float(opt("legacy", 0.3)),
+                              int(opt("seed", 7)))
+    print(f"🧪 Generated {len(paths)} project(s) under {args[0]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# run_bench.py – offline benchmark suite (synthetic solution + fake dotnet + fake LLM) with regression history
+#
+#   python3 bench/run_bench.py                          # default size, all components
+#   python3 bench/run_bench.py --projects=40 --files=80 --depth=5 --repeat=3
+#   python3 bench/run_bench.py --only=code_scanner,match_rules --check
+#
+# Every run appends one JSON line to the history (bench/results/history.jsonl,
+# or UPGRADE_BENCH_HISTORY / --history=). A component regresses when it is
+# slower than the median of the last 5 runs with the same config by more
+# than --tolerance (default 0.25) and by at least 50 ms; --check then exits 1.
+
+import os, sys, json, time, shutil, pathlib, tempfile, statistics, subprocess, datetime
+
+BENCH = pathlib.Path(__file__).resolve().parent
+ROOT = BENCH.parent
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(BENCH))
+
+from gen_solution import generate_solution
+import fake_llm_server
+
+COMPONENTS = ["code_scanner", "scan_index_warm", "match_rules", "learning_db",
+              "autofix_pipeline", "verifier", "end_to_end"]
+HISTORY = pathlib.Path(os.getenv("UPGRADE_BENCH_HISTORY", BENCH / "results" / "history.jsonl"))
+BASELINE_RUNS = 5
+NOISE_FLOOR_S = 0.05
+
+def _opt(args, key, default):
+    return next((a.split("=",1)[1] for a in args if a.startswith(f"--{key}=")), default)
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def _env(work: pathlib.Path, endpoint: str, cfg: dict):
+    """Everything the pipeline reads from the environment, pointed at the sandbox."""
+    return {
+        "DOTNET_EXE": str(BENCH / "fake_dotnet.py"),
+        "FAKE_DOTNET_STATE": str(work / "fake_dotnet"),
+        "FAKE_DOTNET_STARTUP_S": str(cfg["dotnet_startup_s"]),
+        "FAKE_DOTNET_WARM_S": str(cfg["dotnet_warm_s"]),
+        "FAKE_DOTNET_COMPILE_MS": str(cfg["dotnet_compile_ms"]),
+        "FAKE_DOTNET_RESTORE_S": str(cfg["dotnet_restore_s"]),
+        "UPGRADE_MEMORY_DB": str(work / "upgrade_memory.db"),
+        "UPGRADE_LLM_CACHE": str(work / "llm_cache.db"),
+        "UPGRADE_SCAN_INDEX": str(work / "scan_index.db"),
+        "NUGET_PACKAGES": str(work / "nuget"),
+        "LLM_ENDPOINT": endpoint,
+        "LLM_MAX_CONCURRENCY": str(cfg["llm_concurrency"]),
+    }
+
+def _timed(fn, repeat=1):
+    """Best of `repeat` runs of fn(); returns (seconds, last result)."""
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+# -------------------------------------------------------------------------
+# Components (imported lazily: modules read their env at import time)
+# -------------------------------------------------------------------------
+def bench_code_scanner(ctx):
+    from code_scanner import scan_code_patterns
+    return _timed(lambda: scan_code_patterns(ctx["sln"]), ctx["repeat"])
+
+def bench_scan_index_warm(ctx):
+    from scan_index import get_index
+    from code_scanner import scan_code_patterns
+    index = get_index()
+    scan_code_patterns(ctx["sln"], index=index)           # populate
+    return _timed(lambda: scan_code_patterns(ctx["sln"], index=index), ctx["repeat"])
+
+def bench_match_rules(ctx):
+    from rule_loader import match_rules
+    from bench_rule_engine import generate
+    rules, packages = generate(ctx["cfg"]["rules"], 300)
+    return _timed(lambda: match_rules(packages, rules), ctx["repeat"])
+
+def bench_learning_db(ctx):
+    import learning_db
+    from bench_rule_engine import generate
+    rules, _ = generate(500, 0)
+    rows = [(r["id"], r["pattern"], r["recommendation"], f"P{i % 20}", ["CS0246"], i % 3 != 0, 0.9)
+            for i, r in enumerate(rules * 10)]
+    queries = [r["pattern"][:12] for r in rules[:200]]
+    def run():
+        learning_db.log_rule_results(rows)
+        return learning_db.query_successful_scored_bulk(queries)
+    return _timed(run, ctx["repeat"])
+
+def _legacy_workspace(ctx):
+    import workspace, build_executor
+    proj = next((p for p in ctx["csprojs"] if "SqlClient" in p.read_text()), ctx["csprojs"][0])
+    tmp, _ = workspace.create_workspace(proj.parent, prefix="bench_ws_")
+    build_executor.restore(tmp / "proj")
+    return tmp
+
+BUILD_COMPONENTS = {"autofix_pipeline", "verifier"}
+
+def warm_up(ctx):
+    """One throwaway build so build components always start against warm build servers."""
+    import workspace, build_executor
+    tmp = _legacy_workspace(ctx)
+    try:
+        build_executor.build(tmp / "proj", phase="warm-up")
+    finally:
+        workspace.remove_workspace(tmp)
+
+def bench_autofix_pipeline(ctx):
+    import workspace
+    from autofix_engine import run_autofix_pipeline
+    best = None
+    for _ in range(ctx["repeat"]):
+        tmp = _legacy_workspace(ctx)
+        try:
+            dt, out = _timed(lambda: run_autofix_pipeline(tmp / "proj", fake_llm_server.CANNED_RULES,
+                                                          batch=ctx["cfg"]["autofix_batch"]))
+        finally:
+            workspace.remove_workspace(tmp)
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+def bench_verifier(ctx):
+    import workspace
+    from verifier import verify_and_retry
+    best = None
+    for _ in range(ctx["repeat"]):
+        tmp = _legacy_workspace(ctx)
+        try:
+            dt, out = _timed(lambda: verify_and_retry(tmp / "proj"))
+        finally:
+            workspace.remove_workspace(tmp)
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+def bench_end_to_end(ctx):
+    out_dir = ctx["work"] / "reports"
+    cmd = [sys.executable, str(SRC / "main.py"), f"--input={ctx['sln']}", f"--output={out_dir}",
+           f"--jobs={ctx['cfg']['jobs']}", f"--autofix-batch={ctx['cfg']['autofix_batch']}"]
+    t0 = time.perf_counter()
+    p = subprocess.run(cmd, cwd=ctx["work"], env={**os.environ}, capture_output=True, text=True)
+    dt = time.perf_counter() - t0
+    reports = len(list(out_dir.glob("*_upgrade_summary.md")))
+    crashes = len(list(out_dir.glob("crash_*.log")))
+    if p.returncode or crashes:
+        print(p.stdout[-2000:], p.stderr[-2000:])
+    return dt, {"reports": reports, "crashes": crashes, "returncode": p.returncode}
+
+# -------------------------------------------------------------------------
+# History / regression check
+# -------------------------------------------------------------------------
+def load_history(path=HISTORY):
+    if not path.exists():
+        return []
+    out = []
+    for line in path.read_text().splitlines():
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            continue
+    return out
+
+def regressions(timings: dict, cfg: dict, history: list, tolerance: float):
+    """{component: (seconds, baseline median)} for components slower than their recent baseline."""
+    same = [h for h in history if h.get("config") == cfg]
+    out = {}
+    for name, t in timings.items():
+        past = [h["timings"][name] for h in same[-BASELINE_RUNS:] if name in h.get("timings", {})]
+        if not past:
+            continue
+        base = statistics.median(past)
+        if t > base * (1 + tolerance) and t - base >= NOISE_FLOOR_S:
+            out[name] = (t, base)
+    return out
+
+def main():
+    args = sys.argv[1:]
+    cfg = {
+        "projects": int(_opt(args, "projects", 8)),
+        "files": int(_opt(args, "files", 30)),
+        "depth": int(_opt(args, "depth", 3)),
+        "lines": int(_opt(args, "lines", 60)),
+        "seed": int(_opt(args, "seed", 7)),
+        "rules": int(_opt(args, "rules", 2000)),
+        "jobs": int(_opt(args, "jobs", 2)),
+        "autofix_batch": _opt(args, "autofix-batch", "rule"),
+        "llm_concurrency": int(_opt(args, "llm-concurrency", 2)),
+        "llm_latency_ms": float(_opt(args, "llm-latency-ms", 20)),
+        "llm_token_ms": float(_opt(args, "llm-token-ms", 1)),
+        "dotnet_startup_s": float(_opt(args, "dotnet-startup-s", 0.3)),
+        "dotnet_warm_s": float(_opt(args, "dotnet-warm-s", 0.02)),
+        "dotnet_compile_ms": float(_opt(args, "dotnet-compile-ms", 2)),
+        "dotnet_restore_s": float(_opt(args, "dotnet-restore-s", 0.1)),
+    }
+    repeat = max(1, int(_opt(args, "repeat", 1)))
+    only = [c for c in _opt(args, "only", ",".join(COMPONENTS)).split(",") if c]
+    unknown = set(only) - set(COMPONENTS)
+    if unknown:
+        print(f"unknown component(s): {', '.join(sorted(unknown))}; choose from {', '.join(COMPONENTS)}")
+        return 2
+    history_path = pathlib.Path(_opt(args, "history", str(HISTORY)))
+    tolerance = float(_opt(args, "tolerance", 0.25))
+
+    work = pathlib.Path(tempfile.mkdtemp(prefix="upgrade_bench_"))
+    server, endpoint = fake_llm_server.start(latency_ms=cfg["llm_latency_ms"], token_ms=cfg["llm_token_ms"])
+    os.environ.update(_env(work, endpoint, cfg))
+    try:
+        sln = work / "sln"
+        csprojs = generate_solution(sln, cfg["projects"], cfg["files"], cfg["depth"], cfg["lines"], seed=cfg["seed"])
+        ctx = {"cfg": cfg, "work": work, "sln": sln, "csprojs": csprojs, "repeat": repeat}
+        print(f"🧪 {cfg['projects']} project(s) × {cfg['files']} file(s), depth {cfg['depth']} in {work}")
+
+        if BUILD_COMPONENTS & set(only):
+            warm_up(ctx)
+        timings, details = {}, {}
+        for name in only:
+            dt, out = globals()[f"bench_{name}"](ctx)
+            timings[name] = round(dt, 4)
+            if name == "end_to_end":
+                details[name] = out
+            print(f"   {name:<18}: {dt:8.3f}s")
+
+        history = load_history(history_path)
+        regressed = regressions(timings, cfg, history, tolerance)
+        for name, (t, base) in regressed.items():
+            print(f"⚠️ Regression: {name} {t:.3f}s vs median {base:.3f}s of last {BASELINE_RUNS} run(s)")
+        if not regressed and any(h.get("config") == cfg for h in history):
+            print(f"✅ No regression against the last {BASELINE_RUNS} comparable run(s)")
+
+        if "--no-save" not in args:
+            history_path.parent.mkdir(parents=True, exist_ok=True)
+            entry = {"ts": datetime.datetime.now().isoformat(timespec="seconds"), "rev": _git_rev(),
+                     "config": cfg, "timings": timings, "details": details, "llm_requests": server.RequestHandlerClass.requests}
+            with open(history_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            print(f"📈 Saved to {history_path}")
+        return 1 if regressed and "--check" in args else 0
+    finally:
+        server.shutdown()
+        if "build_executor" in sys.modules:
+            sys.modules["build_executor"].shutdown()
+        if "--keep" not in args:
+            shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
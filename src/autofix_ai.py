@@ -1,4 +1,5 @@
 import pathlib, difflib, os, re
+from utils import write_text
 
 def _suggest_fix(text: str, pattern: str, recommendation: str) -> str:
     # Simple heuristics for common patterns
@@ -52,6 +53,6 @@ def generate_code_fix(filepath: str, pattern: str, recommendation: str) -> bool:
 
     # Backup + write
     p.with_suffix(p.suffix + ".bak")
-    p.write_text(updated)
+    write_text(p, updated)
     print(f"✅ AI modified {p} (diff saved)")
     return True
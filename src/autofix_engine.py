@@ -1,23 +1,40 @@
 #!/usr/bin/env python3
-# Layer 2/3 AI-Python Fixer v5
+# Layer 2/3 AI-Python Fixer v7 (one-pass rewrite plan, batched edits + build bisection)
 import pathlib, re
-from utils import run_cmd, file_text, write_text, backup_file, restore_backup, has_build_success
+from utils import file_text, write_text, backup_file, restore_backup
+from rewrite_engine import plan_rewrites
+import build_executor
 
-def validate_build(proj_dir: pathlib.Path):
-    log = run_cmd(["dotnet","build","--nologo","-v","m","--no-incremental"], cwd=proj_dir)
-    return has_build_success(log), log
+def validate_build(proj_dir: pathlib.Path, phase="autofix"):
+    """Incremental build on warm servers; returns (ok, msbuild_log.BuildResult)."""
+    return build_executor.build(proj_dir, phase=phase)
 
-def _ensure_package(csproj: pathlib.Path, pkg: str, version: str = None):
+# Packages a rule's pattern implies; all of them go into the csproj in one edit.
+PACKAGE_HINTS = {
+    "sqlconnection": ["Microsoft.Data.SqlClient"],
+    "configurationmanager": ["Microsoft.Extensions.Configuration",
+                             "Microsoft.Extensions.Configuration.Json",
+                             "Microsoft.Extensions.Configuration.Binder"],
+}
+
+def _ensure_packages(csproj: pathlib.Path, packages):
+    """packages: [(name, version or None)]; missing ones are added with a single write."""
     text = file_text(csproj)
-    if pkg in text:
-        return False
-    line = f'  <PackageReference Include="{pkg}"' + (f' Version="{version}"' if version else "") + ' />\n'
-    new_text = re.sub(r"(</ItemGroup>)", line + r"\1", text, count=1)
+    missing = [(p, v) for p, v in dict.fromkeys(packages) if p not in text]
+    if not missing:
+        return []
+    lines = "".join(f'  <PackageReference Include="{p}"' + (f' Version="{v}"' if v else "") + ' />\n'
+                    for p, v in missing)
+    new_text = re.sub(r"(</ItemGroup>)", lambda m: lines + m.group(1), text, count=1)
     if new_text == text:
-        new_text = text.replace("</Project>", f"<ItemGroup>\n{line}</ItemGroup>\n</Project>")
+        new_text = text.replace("</Project>", f"<ItemGroup>\n{lines}</ItemGroup>\n</Project>")
     write_text(csproj, new_text)
-    print(f"📦 Ensured {pkg}{' '+version if version else ''}")
-    return True
+    for p, v in missing:
+        print(f"📦 Ensured {p}{' '+v if v else ''}")
+    return [p for p, _ in missing]
+
+def _ensure_package(csproj: pathlib.Path, pkg: str, version: str = None):
+    return bool(_ensure_packages(csproj, [(pkg, version)]))
 
 def _incremental_try_build_after_file_edit(proj_dir: pathlib.Path, edited_file: pathlib.Path) -> bool:
     ok, log = validate_build(proj_dir)
@@ -27,35 +44,132 @@ def _incremental_try_build_after_file_edit(proj_dir: pathlib.Path, edited_file:
         return False
     return True
 
-def _apply_text_sub(file_path: pathlib.Path, pattern: str, recommendation: str) -> bool:
-    text = file_text(file_path)
+def _apply_text_sub(file_path: pathlib.Path, text: str, pattern: str, recommendation: str):
+    """Returns the new text (written to disk) or None if the pattern is absent."""
     if pattern not in text:
-        return False
+        return None
     backup_file(file_path)
     fixed = text.replace(pattern, recommendation)
     write_text(file_path, fixed)
     print(f"🧠 AI-sub in {file_path.name}: '{pattern}' → '{recommendation[:60]}...'")
-    return True
+    return fixed
 
-def run_autofix_pipeline(proj_dir: pathlib.Path, rules: list):
-    applied = []
+# -------------------------------------------------------------------------
+# Batched mode: apply many edits, build once, bisect only when it breaks
+# -------------------------------------------------------------------------
+BATCH_MODES = ("file", "rule", "all")
+
+def _error_signature(result) -> set:
+    """Position-independent error set: (file name, code, message)."""
+    return {(pathlib.Path(d.file).name, d.code, d.message) for d in result.errors}
+
+def _materialize(originals: dict, edits: list, current: dict):
+    """
+    Rewrites every touched file as original + the given edits, in rule order.
+    current holds what is on disk, so unchanged files are neither read nor written.
+    """
+    for cs, text in originals.items():
+        for rid, f, patt, rec in edits:
+            if f == cs:
+                text = text.replace(patt, rec)
+        if text != current.get(cs):
+            write_text(cs, text)
+            current[cs] = text
+
+class _BatchBuilder:
+    def __init__(self, proj_dir: pathlib.Path, originals: dict):
+        self.proj_dir = proj_dir
+        self.originals = originals
+        self.current = dict(originals)
+        self.builds = 0
+        self.baseline = False     # error signature before any edit (None = green, False = not built yet)
+
+    def _build(self, edits: list):
+        _materialize(self.originals, edits, self.current)
+        self.builds += 1
+        return validate_build(self.proj_dir)
+
+    def accepts(self, edits: list) -> bool:
+        """An edit set is kept if the build is green or adds no error beyond the baseline."""
+        ok, log = self._build(edits)
+        if ok:
+            return True
+        if self.baseline is False:
+            base_ok, base_log = self._build([])
+            self.baseline = None if base_ok else _error_signature(base_log)
+        return self.baseline is not None and _error_signature(log) <= self.baseline
+
+    def bisect(self, accepted: list, candidates: list, known_bad=False) -> list:
+        """Returns the subset of candidates that can be kept on top of accepted."""
+        if not candidates:
+            return []
+        if not known_bad and self.accepts(accepted + candidates):
+            return candidates
+        if len(candidates) == 1:
+            rid, cs, patt, _ = candidates[0]
+            print(f"↩️ Reverted {rid} in {cs.name} ('{patt[:40]}') due to build break")
+            return []
+        mid = len(candidates) // 2
+        left = self.bisect(accepted, candidates[:mid])
+        # If the whole set broke and the left half is clean, the break is on the right.
+        right = self.bisect(accepted + left, candidates[mid:], known_bad=known_bad and left == candidates[:mid])
+        return left + right
+
+def _run_batched(proj_dir: pathlib.Path, plan, mode: str) -> list:
+    originals, edits = plan.originals, plan.edits
+    if not edits:
+        return []
+    if mode == "all":
+        groups = [edits]
+    else:
+        groups = {}
+        for e in edits:
+            groups.setdefault(e[0], []).append(e)
+        groups = list(groups.values())
+
+    builder = _BatchBuilder(proj_dir, originals)
+    accepted = []
+    for group in groups:
+        if builder.accepts(accepted + group):
+            accepted += group
+        else:
+            accepted += builder.bisect(accepted, group, known_bad=True)
+
+    _materialize(originals, accepted, builder.current)
+    print(f"🧮 Batched autofix ({mode}): kept {len(accepted)}/{len(edits)} edit(s) in {builder.builds} build(s)")
+    return [rid for rid, *_ in accepted]
+
+def run_autofix_pipeline(proj_dir: pathlib.Path, rules: list, batch: str = "file"):
+    """
+    batch="file" keeps the original behaviour (one build per edited file);
+    "rule" applies each rule's edits together and "all" applies every rule's
+    edits at once, bisecting over the edit set when the build breaks.
+    Sources are walked and read once for all rules (rewrite_engine).
+    """
     csproj = next(proj_dir.rglob("*.csproj"))
-    for r in rules:
-        patt = (r.get("pattern") or "").lower()
-        if "sqlconnection" in patt:
-            _ensure_package(csproj, "Microsoft.Data.SqlClient")
-        if "configurationmanager" in patt:
-            _ensure_package(csproj, "Microsoft.Extensions.Configuration")
-            _ensure_package(csproj, "Microsoft.Extensions.Configuration.Json")
-            _ensure_package(csproj, "Microsoft.Extensions.Configuration.Binder")
+    needed = [(pkg, None) for r in rules
+              for hint, pkgs in PACKAGE_HINTS.items() if hint in (r.get("pattern") or "").lower()
+              for pkg in pkgs]
+    _ensure_packages(csproj, needed)
+
+    plan = plan_rewrites(proj_dir, [r for r in rules if r.get("autofix")])
+    print(f"🪄 Rewrite plan: {len(plan.edits)} edit(s) in {len(plan.originals)}/{plan.scanned} file(s)")
+    if batch != "file":
+        return _run_batched(proj_dir, plan, batch)
+
+    applied = []
+    current = dict(plan.originals)
     for r in rules:
         if not r.get("autofix"): 
             continue
         rid = r.get("id","AUTO-RXXX")
         patt = r.get("pattern","")
         rec  = r.get("recommendation","")
-        for cs in proj_dir.rglob("*.cs"):
-            if _apply_text_sub(cs, patt, rec):
-                if _incremental_try_build_after_file_edit(proj_dir, cs):
-                    applied.append(rid)
+        if not patt:
+            continue
+        for cs, text in current.items():
+            fixed = _apply_text_sub(cs, text, patt, rec)
+            if fixed is not None and _incremental_try_build_after_file_edit(proj_dir, cs):
+                current[cs] = fixed
+                applied.append(rid)
     return applied
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# build_executor.py – v1 (warm MSBuild nodes + compiler server, incremental builds, per-phase savings)
+
+import os, time, pathlib, threading
+from msbuild_log import run_build
+from utils import run_cmd
+import metrics
+
+DOTNET_EXE = os.getenv("DOTNET_EXE", "dotnet")
+# 0 = every build is a clean --no-incremental build (the pre-executor behaviour)
+BUILD_INCREMENTAL = os.getenv("UPGRADE_BUILD_INCREMENTAL", "1") == "1"
+BUILD_TIMEOUT = float(os.getenv("UPGRADE_BUILD_TIMEOUT", "0")) or None
+
+# Keep MSBuild worker nodes, the MSBuild server and VBCSCompiler alive between builds.
+WARM_ENV = {
+    "MSBUILDDISABLENODEREUSE": "0",
+    "DOTNET_CLI_USE_MSBUILD_SERVER": "1",
+    "DOTNET_CLI_TELEMETRY_OPTOUT": "1",
+    "DOTNET_SKIP_FIRST_TIME_EXPERIENCE": "1",
+}
+WARM_ARGS = ["-nodeReuse:true", "-p:UseSharedCompilation=true"]
+
+# Diagnostics that point at leftover obj/ state or a wedged server rather than the code.
+STALE_CODES = {
+    "NETSDK1004",   # assets file not found
+    "NETSDK1005",   # assets file has no target for the framework
+    "NETSDK1047",   # assets file has no target for framework/RID
+    "MSB3021", "MSB3026", "MSB3027",   # cannot copy / file locked
+    "MSB3491",      # cannot write lines to file
+    "MSB3883",      # unexpected exception from the compiler server
+    "CS2012",       # cannot open output for writing
+}
+
+BUILDS = metrics.counter("upgrade_builds_total", "dotnet builds by pipeline phase and mode")
+BUILD_SECONDS = metrics.histogram("upgrade_build_duration_seconds", "Build wall time by phase, stale fallbacks included")
+
+_state = {}
+_state_lock = threading.Lock()
+
+def _project_fingerprint(proj_dir: pathlib.Path):
+    """Anything that invalidates a restore: project/props/targets files and NuGet config."""
+    fp = []
+    for pat in ("*.csproj", "*.props", "*.targets", "nuget.config", "NuGet.Config"):
+        for p in sorted(proj_dir.glob(pat)):
+            st = p.stat()
+            fp.append((p.name, st.st_mtime_ns, st.st_size))
+    return tuple(fp)
+
+def _get_state(proj_dir: pathlib.Path):
+    key = str(pathlib.Path(proj_dir).resolve())
+    with _state_lock:
+        st = _state.get(key)
+        if st is None:
+            st = _state[key] = {"restored": None, "fallback_fp": None, "cold_s": None, "phases": {}}
+        return st
+
+def _cmd(restore: bool, clean: bool):
+    cmd = [DOTNET_EXE, "build", "--nologo", "-v", "m"] + WARM_ARGS
+    if not restore:
+        cmd.append("--no-restore")
+    if clean or not BUILD_INCREMENTAL:
+        cmd.append("--no-incremental")
+    return cmd
+
+def is_stale(result) -> bool:
+    return any(d.code in STALE_CODES for d in result.errors)
+
+def build(proj_dir: pathlib.Path, phase="build", clean=False):
+    """
+    Builds proj_dir incrementally against warm servers. Restores only when the
+    project files changed since the last restore; retries as a clean build
+    with restore if the failure looks like stale state, at most once per
+    version of the project files (a second time would not fix it).
+    Returns (ok, msbuild_log.BuildResult).
+    """
+    proj_dir = pathlib.Path(proj_dir)
+    st = _get_state(proj_dir)
+    env = {**os.environ, **WARM_ENV}
+
+    t0 = time.perf_counter()
+    fp = _project_fingerprint(proj_dir)
+    restore = st["restored"] != fp
+    result = run_build(_cmd(restore, clean), cwd=proj_dir, timeout=BUILD_TIMEOUT, env=env)
+    fallback = False
+    if not result.ok and is_stale(result) and st["fallback_fp"] != fp:
+        st["fallback_fp"] = fp
+        print(f"♻️ Stale build state in {proj_dir.name} ({', '.join(sorted(set(result.error_codes()) & STALE_CODES))}); clean rebuild")
+        fallback = True
+        result = run_build(_cmd(True, True), cwd=proj_dir, timeout=BUILD_TIMEOUT, env=env)
+    if restore or fallback:
+        st["restored"] = _project_fingerprint(proj_dir)
+    seconds = time.perf_counter() - t0
+    _account(st, phase, seconds, fallback)
+    mode = "clean" if clean or not BUILD_INCREMENTAL else "incremental"
+    BUILDS.inc(phase=phase, mode=mode, restore=restore, ok=result.ok)
+    if fallback:
+        BUILDS.inc(phase=phase, mode="stale-fallback", restore=True, ok=result.ok)
+    BUILD_SECONDS.observe(seconds, phase=phase)
+    return result.ok, result
+
+def restore(proj_dir: pathlib.Path) -> str:
+    """Explicit restore; the next build skips it unless the project files change."""
+    proj_dir = pathlib.Path(proj_dir)
+    out = run_cmd([DOTNET_EXE, "restore"], cwd=proj_dir)
+    _get_state(proj_dir)["restored"] = _project_fingerprint(proj_dir)
+    return out
+
+def _account(st, phase, seconds, fallback):
+    if st["cold_s"] is None:
+        st["cold_s"] = seconds                 # first build of the workspace = cold reference
+    ph = st["phases"].setdefault(phase, {"builds": 0, "seconds": 0.0, "fallbacks": 0})
+    ph["builds"] += 1
+    ph["seconds"] += seconds
+    ph["fallbacks"] += int(fallback)
+
+def phase_stats(proj_dir: pathlib.Path) -> dict:
+    """{phase: {builds, seconds, fallbacks, saved_s}}; saved_s is against a cold build each time."""
+    st = _get_state(proj_dir)
+    cold = st["cold_s"] or 0.0
+    out = {}
+    for phase, ph in st["phases"].items():
+        out[phase] = dict(ph, seconds=round(ph["seconds"], 2),
+                          saved_s=round(max(0.0, ph["builds"] * cold - ph["seconds"]), 2))
+    return out
+
+def describe_savings(proj_dir: pathlib.Path) -> str:
+    st = _get_state(proj_dir)
+    stats = phase_stats(proj_dir)
+    if not stats:
+        return "no builds"
+    parts = [f"{phase}: {ph['builds']} build(s) in {ph['seconds']}s, ~{ph['saved_s']}s saved"
+             + (f", {ph['fallbacks']} clean fallback(s)" if ph["fallbacks"] else "")
+             for phase, ph in stats.items()]
+    return f"cold build {round(st['cold_s'] or 0, 2)}s; " + "; ".join(parts)
+
+def forget(proj_dir: pathlib.Path):
+    with _state_lock:
+        _state.pop(str(pathlib.Path(proj_dir).resolve()), None)
+
+def shutdown():
+    """Stops MSBuild nodes, the MSBuild server and VBCSCompiler at the end of the run."""
+    return run_cmd([DOTNET_EXE, "build-server", "shutdown"])
@@ -1,22 +1,137 @@
-import pathlib, re
+#!/usr/bin/env python3
+# code_scanner.py – v2 (single precompiled pass per file, multi-core, streamed)
 
-def extract_code_sentences(source_dir):
+import os, pathlib, re, multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+
+# The three legacy patterns only ever match characters in [A-Za-z0-9_.(],
+# so every match lives inside one "token": a maximal run of [A-Za-z0-9_.]
+# plus an optional trailing "(". One pass finds the tokens; the legacy
+# patterns then run on the (short, heavily repeated) tokens only.
+TOKEN_RE = re.compile(r"[A-Za-z0-9_.]+\(?")
+CODE_PATTERNS = (
+    re.compile(r"[A-Z][A-Za-z0-9_]+\.[A-Za-z0-9_]+\.[A-Za-z0-9_]+"),
+    re.compile(r"[A-Z][A-Za-z0-9_]+\.[A-Za-z0-9_]+"),
+    re.compile(r"[A-Za-z0-9_]+\("),
+)
+
+PARALLEL_MIN_FILES = 200
+CHUNK_SIZE = 64
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_MAX = 200_000
+
+def _token_patterns(tok: str):
+    hit = _TOKEN_CACHE.get(tok)
+    if hit is not None:
+        return hit
+    found = []
+    if "." in tok:
+        found += CODE_PATTERNS[0].findall(tok)
+        found += CODE_PATTERNS[1].findall(tok)
+    if tok.endswith("("):
+        found += CODE_PATTERNS[2].findall(tok)
+    hit = tuple(m.strip("(") for m in found if len(m) > 4 and not m.startswith("using"))
+    if len(_TOKEN_CACHE) >= _TOKEN_CACHE_MAX:
+        _TOKEN_CACHE.clear()
+    _TOKEN_CACHE[tok] = hit
+    return hit
+
+def patterns_in_text(text: str) -> set:
+    found = set()
+    for tok in set(TOKEN_RE.findall(text)):
+        found.update(_token_patterns(tok))
+    return found
+
+def patterns_in_file(path) -> set:
+    try:
+        text = pathlib.Path(path).read_text(errors="ignore")
+    except Exception:
+        return set()
+    return patterns_in_text(text)
+
+def _scan_chunk(paths):
+    return [(p, patterns_in_file(p)) for p in paths]
+
+def _pool_context():
+    # Never fork: the orchestrator runs scheduler, LLM-loop, live-log and
+    # outdated-scan threads, and a child forked while one of them holds a
+    # lock can deadlock. Workers re-import the main module, which is why
+    # main.py keeps its run behind a __main__ guard.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+# One process pool per run, shared by every scheduler worker: --jobs N
+# concurrent scans split POOL_WORKERS processes instead of each starting
+# cpu_count() of their own.
+POOL_WORKERS = os.cpu_count() or 1
+_scan_jobs = 1
+_pool = None
+_pool_lock = threading.Lock()
+
+def configure_pool(jobs=1, workers=None):
+    """Called once by main(): jobs = concurrent callers (--jobs), workers = pool size."""
+    global POOL_WORKERS, _scan_jobs
+    shutdown_pool()
+    POOL_WORKERS = max(1, workers or os.cpu_count() or 1)
+    _scan_jobs = max(1, jobs)
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=_pool_context())
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def iter_chunked(items, chunk_fn, jobs=None):
+    """
+    Runs chunk_fn over CHUNK_SIZE slices of items and yields its per-item
+    results as they arrive. Large inputs fan out over the shared process
+    pool with this caller's share of it in flight; small ones, and jobs=1,
+    stay in-process.
+    """
+    items = list(items)
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    if (jobs or POOL_WORKERS) <= 1 or len(items) < PARALLEL_MIN_FILES:
+        for chunk in chunks:
+            yield from chunk_fn(chunk)
+        return
+
+    pool = _get_pool()
+    in_flight = 2 * max(1, min(jobs or POOL_WORKERS, POOL_WORKERS // _scan_jobs))
+    pending = []
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(chunk_fn, chunk))
+            if len(pending) >= in_flight:
+                yield from pending.pop(0).result()
+        while pending:
+            yield from pending.pop(0).result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+def iter_file_patterns(files, jobs=None):
+    """Yields (path, pattern set) per file as results arrive."""
+    return iter_chunked([str(f) for f in files], _scan_chunk, jobs)
+
+def extract_code_sentences(source_dir, jobs=None):
     code_snippets = set()
-    for file in pathlib.Path(source_dir).rglob("*.cs"):
-        try:
-            text = file.read_text(errors="ignore")
-        except Exception:
-            continue
-        patterns = [
-            r"[A-Z][A-Za-z0-9_]+\.[A-Za-z0-9_]+\.[A-Za-z0-9_]+",
-            r"[A-Z][A-Za-z0-9_]+\.[A-Za-z0-9_]+",
-            r"[A-Za-z0-9_]+\("
-        ]
-        for pat in patterns:
-            for m in re.findall(pat, text):
-                if len(m) > 4 and not m.startswith("using"):
-                    code_snippets.add(m.strip("("))
+    for _, found in iter_file_patterns(pathlib.Path(source_dir).rglob("*.cs"), jobs):
+        code_snippets |= found
     return sorted(code_snippets)
 
-def scan_code_patterns(source_dir):
-    return extract_code_sentences(source_dir)
+def scan_code_patterns(source_dir, jobs=None, index=None, stats=None):
+    """
+    index: optional scan_index.ScanIndex – only new/changed files are re-parsed
+    and stats (optional dict) receives the hit/miss counts.
+    """
+    if index is not None:
+        return index.scan(source_dir, jobs, stats)
+    return extract_code_sentences(source_dir, jobs)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# diag_compress.py – v1 (cluster + dedupe MSBuild diagnostics into a token budget)
+
+import os, re, math
+from msbuild_log import BuildResult, parse_text
+
+# Same variable phi4_server.py reads, so prompts are sized for the real context.
+N_CTX = int(os.getenv("N_CTX", "8192"))
+CHARS_PER_TOKEN = float(os.getenv("UPGRADE_CHARS_PER_TOKEN", "3.5"))
+DIAG_BUDGET_RULES = int(os.getenv("UPGRADE_DIAG_BUDGET_RULES", "3000"))
+DIAG_BUDGET_SUMMARY = int(os.getenv("UPGRADE_DIAG_BUDGET_SUMMARY", "1000"))
+
+QUOTED_RE = re.compile(r"'[^']*'|\"[^\"]*\"")
+NUMBER_RE = re.compile(r"\b\d+(\.\d+)*\b")
+
+def count_tokens(text: str) -> int:
+    """Cheap, slightly pessimistic estimate for a llama.cpp BPE vocabulary."""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+def message_template(msg: str) -> str:
+    """'The name 'Foo' does not exist' and '... 'Bar' ...' share one template."""
+    return NUMBER_RE.sub("N", QUOTED_RE.sub("'…'", msg)).strip()
+
+def cluster_diagnostics(diagnostics):
+    """
+    Groups msbuild_log.Diagnostic records by (severity, code, file, message
+    template). Returns clusters in first-seen order: dicts with sev, code,
+    file, line, msg (first instance), count and lines (source lines seen).
+    """
+    clusters = {}
+    for d in diagnostics:
+        file = os.path.basename(d.file) or d.project or "?"
+        key = (d.severity, d.code, file, message_template(d.message))
+        c = clusters.get(key)
+        if c is None:
+            c = clusters[key] = {"sev": d.severity, "code": d.code, "file": file,
+                                 "line": str(d.line) if d.line is not None else None,
+                                 "msg": d.message, "count": 0, "lines": []}
+        c["count"] += 1
+        if d.line is not None and str(d.line) not in c["lines"]:
+            c["lines"].append(str(d.line))
+    return list(clusters.values())
+
+def _render(c) -> str:
+    where = f"{c['file']}({c['line']})" if c["line"] else c["file"]
+    extra = ""
+    if c["count"] > 1:
+        extra = f"  [x{c['count']}" + (f", lines {','.join(c['lines'][:8])}" if len(c["lines"]) > 1 else "") + "]"
+    return f"{where}: {c['sev']} {c['code']}: {c['msg']}{extra}"
+
+def _ranked(clusters):
+    """
+    Errors before warnings; round-robin over distinct codes so every code is
+    represented before any code gets a second cluster; bigger clusters first.
+    """
+    out = []
+    for sev in ("error", "warning"):
+        by_code = {}
+        for c in sorted((c for c in clusters if c["sev"] == sev), key=lambda c: -c["count"]):
+            by_code.setdefault(c["code"], []).append(c)
+        queues = sorted(by_code.values(), key=lambda q: -sum(c["count"] for c in q))
+        while queues:
+            for q in queues:
+                out.append(q.pop(0))
+            queues = [q for q in queues if q]
+    return out
+
+def compress_diagnostics(log, budget_tokens: int) -> str:
+    """
+    Turns a build log (msbuild_log.BuildResult or raw text) into at most
+    budget_tokens of distinct, most informative diagnostics plus a one-line
+    tally. Logs without MSBuild diagnostics fall back to their unique lines.
+    """
+    if budget_tokens <= 0 or not log:
+        return ""
+    result = log if isinstance(log, BuildResult) else parse_text(log)
+    clusters = cluster_diagnostics(result.diagnostics)
+
+    if clusters:
+        n_err = sum(c["count"] for c in clusters if c["sev"] == "error")
+        n_warn = sum(c["count"] for c in clusters if c["sev"] == "warning")
+        header = (f"{n_err} error(s), {n_warn} warning(s) in {len(clusters)} distinct group(s); "
+                  f"codes: {', '.join(sorted({c['code'] for c in clusters}))}")
+        candidates = [_render(c) for c in _ranked(clusters)]
+    else:
+        header = ""
+        candidates = list(dict.fromkeys(l.strip() for l in result.text.splitlines() if l.strip()))
+
+    if count_tokens(header) > budget_tokens:
+        header = ""
+    used = count_tokens(header)
+    picked = _pick(candidates, used, budget_tokens)
+    if len(picked) < len(candidates):
+        # The tally line is part of the budget too: re-pick with room for it.
+        tally_cost = count_tokens(f"... {len(candidates)} more group(s) omitted") + 1
+        picked = _pick(candidates, used, budget_tokens - tally_cost)
+        if used + tally_cost <= budget_tokens:
+            picked.append(f"... {len(candidates) - len(picked)} more group(s) omitted")
+    return "\n".join(([header] if header else []) + picked)
+
+def _pick(lines, used: int, budget_tokens: int):
+    """Greedy: every line that still fits, in rank order."""
+    picked = []
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > budget_tokens:
+            continue
+        picked.append(line)
+        used += cost
+    return picked
+
+def fit_budget(wanted: int, max_tokens: int, *prompt_parts: str, margin: int = 64) -> int:
+    """Clamps a diagnostics budget so prompt + completion stay inside N_CTX."""
+    fixed = sum(count_tokens(p) for p in prompt_parts)
+    return max(0, min(wanted, N_CTX - max_tokens - fixed - margin))
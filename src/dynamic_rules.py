@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 # dynamic_rules.py – v12 (Rule Decay + Project Types + Safety)
 
-import json
+import os, json
 from llm_client import query_llm
 from utils import extract_error_codes
-from learning_db import query_successful_scored
+from learning_db import query_successful_scored_bulk
 from project_type import detect_project_type
+from diag_compress import compress_diagnostics, fit_budget, count_tokens, DIAG_BUDGET_RULES
 
 SAFE_AUTOFIX_KEYWORDS = [
     "Newtonsoft.Json", "Swashbuckle",
@@ -16,28 +17,51 @@ SAFE_AUTOFIX_KEYWORDS = [
 
 CONFIDENCE_THRESHOLD = 0.70
 
-def generate_dynamic_rules(project_json: str, diag: str, code_patterns: list, csproj_path=None):
-    diag_excerpt = (diag or "")[:12000]
-    errors = list(sorted(set(extract_error_codes(diag_excerpt))))
+# Learned rules kept per project (best score first) and the prompt tokens
+# their JSON may take; both before the diagnostics get what is left.
+LEARNED_RULES_MAX = int(os.getenv("UPGRADE_LEARNED_RULES_MAX", "20"))
+LEARNED_BUDGET_RULES = int(os.getenv("UPGRADE_LEARNED_BUDGET_RULES", "1200"))
 
-    project_type = detect_project_type(csproj_path)
-    print(f"📌 Project Type Detected: {project_type}")
+# Static header first: an in-process model (llm_backends) re-evaluates only
+# what follows the longest prompt prefix it has already seen.
+RULES_PROMPT_HEADER = """You are a .NET migration expert.
+Generate NEW rules with:
+- id
+- pattern
+- issue
+- recommendation
+- confidence (0–1)
+- autofix (true/false)
+
+Use the proven fixes (decay scored), project, error codes and diagnostics below.
+"""
+
+def generate_dynamic_rules(project_json: str, diag: str, code_patterns: list, csproj_path=None, project_type=None):
+    errors = list(sorted(set(extract_error_codes(diag))))
+
+    if project_type is None:
+        project_type = detect_project_type(csproj_path)
+        print(f"📌 Project Type Detected: {project_type}")
 
     # ---------------------------------------------------------------------
     # 1. Learned rules (decayed + ranked)
     # ---------------------------------------------------------------------
-    learned_rules = []
-    for patt in errors + [p.get("pattern","") for p in code_patterns]:
-        hits = query_successful_scored(patt)
-        for pattern, rec, score in hits:
-            learned_rules.append({
-                "id": f"MEM-R{int(score*100)}",
-                "pattern": pattern,
-                "issue": f"Learned fix (score={round(score,2)})",
-                "recommendation": rec,
-                "confidence": score,
-                "autofix": score >= 0.80
-            })
+    queries = errors + [p.get("pattern","") if isinstance(p, dict) else p for p in code_patterns]
+    hits_by_query = query_successful_scored_bulk(queries)
+    best = {}
+    for patt in queries:
+        for pattern, rec, score in hits_by_query[patt]:
+            if score > best.get((pattern, rec), -1.0):
+                best[(pattern, rec)] = score
+    ranked = sorted(best.items(), key=lambda kv: -kv[1])[:LEARNED_RULES_MAX]
+    learned_rules = [{
+        "id": f"MEM-R{int(score*100)}",
+        "pattern": pattern,
+        "issue": f"Learned fix (score={round(score,2)})",
+        "recommendation": rec,
+        "confidence": score,
+        "autofix": score >= 0.80
+    } for (pattern, rec), score in ranked]
 
     if learned_rules:
         print(f"🧠 Loaded {len(learned_rules)} decayed learned rules")
@@ -45,20 +69,12 @@ def generate_dynamic_rules(project_json: str, diag: str, code_patterns: list, cs
     # ---------------------------------------------------------------------
     # 2. AI Rule Generation
     # ---------------------------------------------------------------------
-    prompt = f"""
-You are a .NET migration expert.
+    def render(learned):
+        return RULES_PROMPT_HEADER + f"""
 PROJECT TYPE: {project_type}
 
-Below are proven fixes with decay scoring:
-{json.dumps(learned_rules, indent=2)}
-
-Generate NEW rules with:
-- id
-- pattern
-- issue
-- recommendation
-- confidence (0–1)
-- autofix (true/false)
+Proven fixes with decay scoring:
+{json.dumps(learned, indent=2)}
 
 Project JSON:
 {project_json}
@@ -67,12 +83,20 @@ Error Codes:
 {errors}
 
 Diagnostics:
-{diag_excerpt}
 """
+    # Lowest-scored learned rules leave the prompt first, then the
+    # diagnostics are fitted into whatever room remains.
+    shown = list(learned_rules)
+    learned_budget = fit_budget(LEARNED_BUDGET_RULES, 1800, render([])) + count_tokens(json.dumps([]))
+    while shown and count_tokens(json.dumps(shown, indent=2)) > learned_budget:
+        shown.pop()
+    head = render(shown)
+    budget = fit_budget(DIAG_BUDGET_RULES, 1800, head)
+    prompt = head + compress_diagnostics(diag, budget) + "\n"
 
     ai_rules = []
     try:
-        response = query_llm(prompt, max_tokens=1800, temperature=0.2)
+        response = query_llm(prompt, max_tokens=1800, temperature=0.2, site="rules")
         if response.strip().startswith("["):
             ai_rules = json.loads(response)
     except Exception:
@@ -1,64 +1,354 @@
 #!/usr/bin/env python3
-# learning_db.py – v3 (with rule decay + weighted scoring)
+# learning_db.py – v9 (WAL connections, bulk inserts, cached bulk lookup, incremental rule_stats, UDF-free rank index)
 
-import sqlite3, json, pathlib, time
+import sqlite3, json, pathlib, time, os, re, math, threading
+from tracing import traced
 
-DB_PATH = pathlib.Path("/opt/oss-migrate/upgrade-poc/upgrade_memory.db")
+DB_PATH = pathlib.Path(os.getenv("UPGRADE_MEMORY_DB", "/opt/oss-migrate/upgrade-poc/upgrade_memory.db"))
+
+# Materialised per-(pattern, recommendation) aggregates, kept current by a
+# trigger on every insert into the raw log. Decay is applied at read time
+# from last_at (epoch seconds of the most recent log row).
+#
+# rank orders rows exactly as the decayed score does for RANK_DECAY, without
+# depending on the current time:
+#   log(avg_s * avg_c * d^((now - last_at)/day)) = rank + (now/day)·log(d)
+#   rank = log(avg_s * avg_c) - (last_at/day)·log(d)
+# so top-K reads walk an index on rank. SQLite has no portable log(), so
+# rank is computed in Python: the stats trigger resets it to NULL and
+# log_rule_results / init_db fill in the NULL rows. Any other writer to
+# ai_rules_log still works; its rows are ranked when this module next writes
+# or starts.
+RANK_DECAY = 0.9
+
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rule_stats (
+    pattern TEXT NOT NULL,
+    recommendation TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    success_sum INTEGER NOT NULL,
+    confidence_n INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    last_at INTEGER,
+    rank REAL,
+    PRIMARY KEY (pattern, recommendation)
+);
+CREATE TRIGGER IF NOT EXISTS trg_ai_rules_log_stats AFTER INSERT ON ai_rules_log
+WHEN NEW.pattern IS NOT NULL
+BEGIN
+    INSERT INTO rule_stats(pattern, recommendation, n, success_sum, confidence_n, confidence_sum, last_at)
+    VALUES (NEW.pattern, IFNULL(NEW.recommendation, ''), 1, IFNULL(NEW.build_success, 0),
+            NEW.confidence IS NOT NULL, IFNULL(NEW.confidence, 0),
+            CAST(strftime('%s', NEW.created_at) AS INTEGER))
+    ON CONFLICT(pattern, recommendation) DO UPDATE SET
+        n = n + 1,
+        success_sum = success_sum + excluded.success_sum,
+        confidence_n = confidence_n + excluded.confidence_n,
+        confidence_sum = confidence_sum + excluded.confidence_sum,
+        last_at = MAX(IFNULL(last_at, 0), IFNULL(excluded.last_at, 0)),
+        rank = NULL;
+END;
+"""
+
+RANK_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_rule_stats_rank ON rule_stats(rank DESC, last_at DESC);
+CREATE INDEX IF NOT EXISTS idx_rule_stats_pattern_rank ON rule_stats(pattern, rank DESC, last_at DESC);
+"""
+
+# Older schema objects: the v7 rank triggers called a per-connection Python
+# function, idx_ai_rules_log_scoring is unused since rule_stats, and the
+# stats trigger is recreated from STATS_SCHEMA with its rank reset.
+LEGACY_SCHEMA = """
+DROP TRIGGER IF EXISTS trg_rule_stats_rank_ins;
+DROP TRIGGER IF EXISTS trg_rule_stats_rank_upd;
+DROP TRIGGER IF EXISTS trg_ai_rules_log_stats;
+DROP INDEX IF EXISTS idx_ai_rules_log_scoring;
+"""
+
+def _rule_rank(n, success_sum, confidence_n, confidence_sum, last_at):
+    """-inf (sorts after every real rank) when the score is 0: log is undefined there."""
+    avg = (success_sum / n if n else 0.0) * (confidence_sum / confidence_n if confidence_n else 0.0)
+    if avg <= 0:
+        return float("-inf")
+    return math.log(avg) - ((last_at or 0) / (60*60*24)) * math.log(RANK_DECAY)
+
+def _rank_pending(conn):
+    """Fills rank for rule_stats rows the trigger (or a rebuild) left NULL."""
+    rows = conn.execute("SELECT rowid, n, success_sum, confidence_n, confidence_sum, last_at "
+                        "FROM rule_stats WHERE rank IS NULL").fetchall()
+    conn.executemany("UPDATE rule_stats SET rank = ? WHERE rowid = ?",
+                     [(_rule_rank(*r[1:]), r[0]) for r in rows])
+
+def _connect() -> sqlite3.Connection:
+    return sqlite3.connect(DB_PATH, timeout=30)
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
 
 def init_db():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    """Creates the schema once per process (per DB path)."""
+    key = str(DB_PATH)
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = _connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+        CREATE TABLE IF NOT EXISTS ai_rules_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_id TEXT,
+            pattern TEXT,
+            recommendation TEXT,
+            project TEXT,
+            error_codes TEXT,
+            build_success INTEGER,
+            confidence REAL DEFAULT 1.0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_ai_rules_log_pattern ON ai_rules_log(pattern);
+        CREATE INDEX IF NOT EXISTS idx_ai_rules_log_rule_id ON ai_rules_log(rule_id);
+        CREATE INDEX IF NOT EXISTS idx_ai_rules_log_created_at ON ai_rules_log(created_at);
+        """)
+        conn.executescript(LEGACY_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(rule_stats)")}
+        if columns and "rank" not in columns:
+            conn.execute("ALTER TABLE rule_stats ADD COLUMN rank REAL")       # stats from v6
+        conn.executescript(STATS_SCHEMA)
+        conn.executescript(RANK_SCHEMA)
+        stats_rows = conn.execute("SELECT COUNT(*) FROM rule_stats").fetchone()[0]
+        if not stats_rows and conn.execute("SELECT 1 FROM ai_rules_log WHERE pattern IS NOT NULL LIMIT 1").fetchone():
+            _rebuild_rule_stats(conn)
+        _rank_pending(conn)
+        conn.commit(); conn.close()
+        _schema_ready.add(key)
+
+def get_conn() -> sqlite3.Connection:
+    """Long-lived connection for the calling thread (one per scheduler worker)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != str(DB_PATH):
+        init_db()
+        conn = _connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn, _local.path = conn, str(DB_PATH)
+    return conn
+
+@traced("learning_db.log_rule_results", "db")
+def log_rule_results(rows):
+    """
+    Bulk insert in a single transaction.
+    rows: iterable of (rule_id, pattern, recommendation, project, errors, success, confidence)
+    """
+    data = [(rid, patt, rec, proj, json.dumps(errs), int(ok), conf)
+            for rid, patt, rec, proj, errs, ok, conf in rows]
+    if not data:
+        return 0
+    conn = get_conn()
+    with conn:
+        conn.executemany(
+            "INSERT INTO ai_rules_log(rule_id,pattern,recommendation,project,error_codes,build_success,confidence) "
+            "VALUES (?,?,?,?,?,?,?)", data)
+        _rank_pending(conn)
+    _refresh_snapshot(conn, {row[1] for row in data if row[1] is not None})
+    return len(data)
+
+def log_rule_result(rule_id, pattern, recommendation, project, errors, success, confidence=1.0):
+    log_rule_results([(rule_id, pattern, recommendation, project, errors, success, confidence)])
+
+def _rebuild_rule_stats(conn):
+    conn.execute("DELETE FROM rule_stats")
     conn.execute("""
-    CREATE TABLE IF NOT EXISTS ai_rules_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        rule_id TEXT,
-        pattern TEXT,
-        recommendation TEXT,
-        project TEXT,
-        error_codes TEXT,
-        build_success INTEGER,
-        confidence REAL DEFAULT 1.0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
+        INSERT INTO rule_stats(pattern, recommendation, n, success_sum, confidence_n, confidence_sum, last_at)
+        SELECT pattern, IFNULL(recommendation, ''), COUNT(*), IFNULL(SUM(build_success), 0),
+               COUNT(confidence), IFNULL(SUM(confidence), 0),
+               MAX(CAST(strftime('%s', created_at) AS INTEGER))
+        FROM ai_rules_log
+        WHERE pattern IS NOT NULL
+        GROUP BY pattern, IFNULL(recommendation, '')
     """)
-    conn.commit(); conn.close()
+    _rank_pending(conn)
 
-def log_rule_result(rule_id, pattern, recommendation, project, errors, success, confidence=1.0):
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        "INSERT INTO ai_rules_log(rule_id,pattern,recommendation,project,error_codes,build_success,confidence) "
-        "VALUES (?,?,?,?,?,?,?)",
-        (rule_id, pattern, recommendation, project, json.dumps(errors), int(success), confidence)
-    )
-    conn.commit(); conn.close()
-
-def query_successful_scored(pattern_like: str, limit=5, decay_weight=0.9):
+@traced("learning_db.rebuild_rule_stats", "db")
+def rebuild_rule_stats():
+    """Recomputes rule_stats from the raw ai_rules_log (e.g. after manual edits)."""
+    conn = get_conn()
+    with conn:
+        _rebuild_rule_stats(conn)
+    _drop_snapshot()
+    return conn.execute("SELECT COUNT(*) FROM rule_stats").fetchone()[0]
+
+SCORED_STATS_SQL = """
+    SELECT pattern, recommendation,
+           success_sum * 1.0 / n, confidence_sum / NULLIF(confidence_n, 0),
+           strftime('%s','now') - last_at AS age_seconds
+    FROM rule_stats
+"""
+
+def _score(rows, decay_weight):
+    out = []
+    for pattern, rec, avg_success, avg_conf, age_sec in rows:
+        decay_factor = decay_weight ** ((age_sec or 0) / (60*60*24))   # per day decay
+        score = avg_success * (avg_conf or 0.0) * decay_factor
+        out.append((pattern, rec, float(score), age_sec))
+    return out
+
+def _ranked(where: str, params, limit, decay_weight):
+    """
+    Top-K rows for the filter. With decay_weight == RANK_DECAY the order
+    comes from the rank index and only `limit` rows are read and scored;
+    any other decay scores every matching row.
+    """
+    conn = get_conn()
+    if decay_weight == RANK_DECAY:
+        rows = conn.execute(SCORED_STATS_SQL + f" WHERE {where} ORDER BY rank DESC, last_at DESC LIMIT ?",
+                            (*params, limit)).fetchall()
+        return [(p, rec, score) for p, rec, score, _ in _score(rows, decay_weight)]
+    rows = conn.execute(SCORED_STATS_SQL + f" WHERE {where}", params).fetchall()
+    processed = sorted(_score(rows, decay_weight), key=lambda x: (-x[2], x[3]))
+    return [(p, rec, score) for p, rec, score, _ in processed[:limit]]
+
+@traced("learning_db.query_successful_scored", "db")
+def query_successful_scored(pattern_like: str, limit=5, decay_weight=RANK_DECAY):
     """
     Returns learned rules ordered by:
     score = (avg_success_rate * avg_confidence * decay_factor)
+    A substring match cannot seek an index: SQLite walks idx_rule_stats_rank
+    from the best rank and stops after `limit` matching rows.
     """
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
+    return _ranked("pattern LIKE ?", (f"%{pattern_like}%", ), limit, decay_weight)
 
-    cur = conn.execute("""
-        SELECT pattern, recommendation,
-               AVG(build_success), AVG(confidence),
-               (strftime('%s','now') - strftime('%s', created_at)) as age_seconds
-        FROM ai_rules_log
-        WHERE pattern LIKE ?
-        GROUP BY pattern, recommendation
-        ORDER BY age_seconds ASC
-    """, (f"%{pattern_like}%", ))
+@traced("learning_db.query_top_rules", "db")
+def query_top_rules(pattern: str, limit=5, decay_weight=RANK_DECAY):
+    """Exact-pattern top-K: a range read of idx_rule_stats_pattern_rank."""
+    return _ranked("pattern = ?", (pattern, ), limit, decay_weight)
 
-    rows = cur.fetchall()
-    conn.close()
+# -------------------------------------------------------------------------
+# Bulk lookup: cached rule_stats snapshot + in-memory trigram substring index
+# -------------------------------------------------------------------------
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
 
-    processed = []
-    for pattern, rec, avg_success, avg_conf, age_sec in rows:
-        decay_factor = decay_weight ** (age_sec / (60*60*24))   # per day decay
-        score = avg_success * avg_conf * decay_factor
-        processed.append((pattern, rec, float(score)))
+def _like_fold(s: str) -> str:
+    """SQLite LIKE is case-insensitive for ASCII letters only."""
+    return s.translate(_ASCII_LOWER)
+
+def _trigrams(s: str):
+    return {s[i:i+3] for i in range(len(s) - 2)}
+
+class SubstringIndex:
+    """
+    Answers `stored LIKE '%q%'` for many q against a growing list of stored
+    strings. Trigram postings narrow the candidates; each candidate is then
+    verified with the exact LIKE semantics (ASCII case folding, % and _).
+    """
+    def __init__(self, values=()):
+        self.values = []
+        self.postings = {}
+        for v in values:
+            self.add(v)
+
+    def add(self, value: str) -> int:
+        i = len(self.values)
+        self.values.append(_like_fold(value))
+        for g in _trigrams(self.values[i]):
+            self.postings.setdefault(g, set()).add(i)
+        return i
+
+    def _candidates(self, literals):
+        cand = None
+        for lit in literals:
+            for g in _trigrams(lit):
+                ids = self.postings.get(g, set())
+                cand = ids if cand is None else cand & ids
+                if not cand:
+                    return set()
+        return set(range(len(self.values))) if cand is None else cand
+
+    def search(self, q: str):
+        q = _like_fold(q)
+        if "%" in q or "_" in q:
+            literals = [lit for lit in re.split(r"[%_]", q) if lit]
+            rx = re.compile("".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in q), re.S)
+            return [i for i in self._candidates(literals) if rx.search(self.values[i])]
+        return [i for i in self._candidates([q]) if q in self.values[i]]
+
+RAW_STATS_SQL = "SELECT pattern, recommendation, n, success_sum, confidence_n, confidence_sum, last_at FROM rule_stats"
 
-    processed = sorted(processed, key=lambda x: x[2], reverse=True)
-    return processed[:limit]
+class StatsSnapshot:
+    """
+    In-memory copy of rule_stats plus a SubstringIndex over its patterns,
+    loaded once per process (per DB path). log_rule_results re-reads only
+    the patterns it touched and rebuild_rule_stats drops the snapshot;
+    writes from other processes show up in the next run.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.index = SubstringIndex()
+        self.patterns = []          # index slot -> pattern
+        self.stats = []             # index slot -> {recommendation: raw stats}
+        self.slot = {}
+
+    def load(self, rows):
+        for pattern, rec, *raw in rows:
+            i = self.slot.get(pattern)
+            if i is None:
+                i = self.slot[pattern] = self.index.add(pattern)
+                self.patterns.append(pattern)
+                self.stats.append({})
+            self.stats[i][rec] = raw
+
+    def scored(self, i, now, decay_weight):
+        out = []
+        for rec, (n, success_sum, confidence_n, confidence_sum, last_at) in self.stats[i].items():
+            age_sec = now - last_at if last_at is not None else None
+            avg_conf = confidence_sum / confidence_n if confidence_n else None
+            out.append((self.patterns[i], rec, success_sum * 1.0 / n, avg_conf, age_sec))
+        return _score(out, decay_weight)
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+def _get_snapshot() -> StatsSnapshot:
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != str(DB_PATH):
+            snap = StatsSnapshot(str(DB_PATH))
+            snap.load(get_conn().execute(RAW_STATS_SQL).fetchall())
+            _snapshot = snap
+        return _snapshot
+
+def _refresh_snapshot(conn, patterns):
+    """Re-reads the given patterns' rule_stats rows into a loaded snapshot."""
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != str(DB_PATH):
+            return
+        patterns = list(patterns)
+        for i in range(0, len(patterns), 500):
+            part = patterns[i:i + 500]
+            _snapshot.load(conn.execute(RAW_STATS_SQL + f" WHERE pattern IN ({','.join('?' * len(part))})",
+                                        part).fetchall())
+
+def _drop_snapshot():
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+@traced("learning_db.query_successful_scored_bulk", "db")
+def query_successful_scored_bulk(patterns, limit=5, decay_weight=RANK_DECAY):
+    """
+    Same ranking as query_successful_scored, for a whole list of patterns
+    against the process-wide StatsSnapshot: returns
+    {pattern: [(pattern, recommendation, score), ...]}. Only the matched
+    patterns are scored.
+    """
+    snap = _get_snapshot()
+    now = int(time.time())
+    result = {}
+    with _snapshot_lock:
+        for q in dict.fromkeys(patterns):
+            hits = [g for i in snap.index.search(q or "") for g in snap.scored(i, now, decay_weight)]
+            hits.sort(key=lambda x: (-x[2], x[3] or 0))     # ties: newest first, as in the per-pattern query
+            result[q] = [(p, rec, score) for p, rec, score, _ in hits[:limit]]
+    return result
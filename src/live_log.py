@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# live_log.py – v1 (background, batched live-log sender for the dashboard's /ws/logs)
+
+import os, time, queue, atexit, threading
+import requests
+import metrics
+
+DASHBOARD_URL = os.getenv("UPGRADE_DASHBOARD_URL", "http://127.0.0.1:8899")
+QUEUE_LINES = int(os.getenv("UPGRADE_LIVE_LOG_QUEUE", "10000"))
+BATCH_LINES = int(os.getenv("UPGRADE_LIVE_LOG_BATCH", "500"))
+FLUSH_S = float(os.getenv("UPGRADE_LIVE_LOG_FLUSH_MS", "50")) / 1000
+# "drop": a full queue drops the new line (the migration never waits);
+# "block": push() waits up to BLOCK_S for room, then drops.
+ON_FULL = os.getenv("UPGRADE_LIVE_LOG_ON_FULL", "drop")
+BLOCK_S = float(os.getenv("UPGRADE_LIVE_LOG_BLOCK_S", "1"))
+POST_TIMEOUT = float(os.getenv("UPGRADE_LIVE_LOG_TIMEOUT", "2"))
+MAX_BACKOFF_S = 5.0
+
+LINES = metrics.counter("upgrade_live_log_lines_total", "Live-log lines sent to or dropped before the dashboard")
+
+class LiveLogSender:
+    """One daemon thread draining a bounded queue into POST /push-logs batches over a kept-alive session."""
+
+    def __init__(self, url=f"{DASHBOARD_URL}/push-logs", maxsize=QUEUE_LINES, on_full=ON_FULL):
+        self.url = url
+        self.on_full = on_full
+        self._q = queue.Queue(maxsize=maxsize)
+        self._session = requests.Session()
+        self._dropped = 0              # not yet reported to the dashboard
+        self.down = False              # last send failed
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="live-log", daemon=True)
+        self._thread.start()
+
+    def push(self, line: str):
+        try:
+            if self.on_full == "block":
+                self._q.put(line, timeout=BLOCK_S)
+            else:
+                self._q.put_nowait(line)
+        except queue.Full:
+            self._drop(1)
+
+    def _drop(self, n):
+        with self._lock:
+            self._dropped += n
+        LINES.inc(n, result="dropped")
+
+    def _next_batch(self):
+        batch = [self._q.get()]
+        deadline = time.monotonic() + FLUSH_S
+        while len(batch) < BATCH_LINES:
+            try:
+                batch.append(self._q.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            batch = self._next_batch()
+            with self._lock:
+                dropped, self._dropped = self._dropped, 0
+            messages = batch + ([f"… {dropped} live-log line(s) dropped"] if dropped else [])
+            try:
+                self._session.post(self.url, json={"messages": messages}, timeout=POST_TIMEOUT).raise_for_status()
+                LINES.inc(len(batch), result="sent")
+                backoff = 0.0
+                self.down = False
+            except Exception:
+                # Dashboard slow or down: lose this batch, back off; the queue keeps the migration unblocked.
+                self._drop(len(batch))
+                with self._lock:
+                    self._dropped += dropped          # still unreported
+                backoff = min(MAX_BACKOFF_S, backoff * 2 or 0.1)
+                self.down = True
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+            if backoff:
+                time.sleep(backoff)
+
+    def flush(self, timeout=1.0) -> bool:
+        """Waits (bounded) for queued lines to be sent; gives up at once while the dashboard is down."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks and not self.down and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._q.unfinished_tasks
+
+_SENDER = None
+_SENDER_LOCK = threading.Lock()
+
+def get_sender() -> LiveLogSender:
+    global _SENDER
+    with _SENDER_LOCK:
+        if _SENDER is None:
+            _SENDER = LiveLogSender()
+            atexit.register(_SENDER.flush)
+        return _SENDER
+
+def push(line: str):
+    get_sender().push(line)
@@ -1,7 +1,13 @@
-from llama_cpp import Llama
+import llm_backends
 class LocalLLM:
     def __init__(self, model_path, ctx=2048, threads=4):
-        self.llm=Llama(model_path=model_path,n_ctx=ctx,n_threads=threads)
+        # The process-wide in-process model for model_path: LLM_BACKEND=llama_cpp's when it
+        # is the same file, so the model is loaded once (see llm_backends.llama_backend)
+        shared=llm_backends.get_backend()
+        if getattr(shared,"model_path",None)==model_path and shared.n_ctx>=ctx:
+            self.backend=shared
+        else:
+            self.backend=llm_backends.llama_backend(model_path,ctx,threads)
     def summarize(self,project_info,build_diag,rule_hits):
         prompt=f"""
 You are an offline .NET 6→8 upgrade advisor.
@@ -16,5 +22,5 @@ DIAGNOSTICS:
 RULES:
 {rule_hits}
 """
-        res=self.llm(prompt,max_tokens=400,temperature=0.2)
-        return res["choices"][0]["text"].strip()
+        res=self.backend.complete(prompt,max_tokens=400,temperature=0.2,raw=True)
+        return res.text.strip()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# llm_backends.py – v1 (pluggable completion backends: HTTP server, in-process llama.cpp, offline mock)
+#
+#   LLM_BACKEND=http      (default) OpenAI-compatible server at LLM_ENDPOINT (phi4_server.py), see llm_client.py
+#   LLM_BACKEND=llama_cpp model loaded once per process, prompt-prefix KV states kept in a LlamaRAMCache
+#   LLM_BACKEND=mock      no model; deterministic replies with simulated prompt-eval / generation cost
+#
+# Prompts should put their static header first: both in-process backends
+# only skip evaluating the longest prefix they have already seen.
+
+import os, time, threading
+from typing import NamedTuple, Optional
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "http")
+LLM_MODEL_PATH = os.getenv("LLM_MODEL_PATH", "/opt/oss-migrate/llm-planner-ai/models/Phi-4-mini-instruct-Q3_K_S.gguf")
+LLM_N_CTX = int(os.getenv("LLM_N_CTX", "8192"))
+LLM_N_THREADS = int(os.getenv("LLM_N_THREADS", "4"))
+LLM_PREFIX_CACHE_MB = int(os.getenv("LLM_PREFIX_CACHE_MB", "1024"))
+
+class Completion(NamedTuple):
+    text: str
+    tokens: int                        # generated
+    load_s: float = 0.0                # model load paid by this call (first call only)
+    prompt_eval_s: float = 0.0         # until the first generated token
+    gen_s: float = 0.0
+    prompt_tokens: Optional[int] = None
+    reused_tokens: Optional[int] = None   # prompt prefix served from the KV cache, when known
+
+    def timings(self) -> dict:
+        return {"load_s": round(self.load_s, 3), "prompt_eval_s": round(self.prompt_eval_s, 3),
+                "gen_s": round(self.gen_s, 3), "prompt_tokens": self.prompt_tokens,
+                "reused_tokens": self.reused_tokens}
+
+class Backend:
+    """
+    complete() is blocking and may be called from several threads; llm_client
+    runs it off the event loop. The prompt is sent as one user chat message,
+    or as-is (text completion) with raw=True.
+    """
+    name = "backend"
+    model = "unknown"
+
+    def complete(self, prompt: str, max_tokens=800, temperature=0.2, on_delta=None, raw=False) -> Completion:
+        raise NotImplementedError
+
+# -------------------------------------------------------------------------
+# In-process llama.cpp
+# -------------------------------------------------------------------------
+class LlamaCppBackend(Backend):
+    name = "llama_cpp"
+
+    def __init__(self, model_path=LLM_MODEL_PATH, n_ctx=LLM_N_CTX, n_threads=LLM_N_THREADS,
+                 prefix_cache_mb=LLM_PREFIX_CACHE_MB):
+        self.model_path = model_path
+        self.model = os.path.basename(model_path)
+        self.n_ctx, self.n_threads, self.prefix_cache_mb = n_ctx, n_threads, prefix_cache_mb
+        self._llm = None
+        self._lock = threading.Lock()         # one llama context: evaluations are serialised
+        self.load_s = None
+
+    def _load(self):
+        from llama_cpp import Llama, LlamaRAMCache
+        t0 = time.perf_counter()
+        llm = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads, verbose=False)
+        if self.prefix_cache_mb > 0:
+            llm.set_cache(LlamaRAMCache(capacity_bytes=self.prefix_cache_mb << 20))
+        self.load_s = time.perf_counter() - t0
+        print(f"🧠 Loaded {self.model} in-process in {self.load_s:.1f}s "
+              f"(n_ctx={self.n_ctx}, threads={self.n_threads}, prefix cache {self.prefix_cache_mb} MB)")
+        return llm
+
+    def llm(self):
+        """The loaded llama_cpp.Llama (loads on first use)."""
+        with self._lock:
+            if self._llm is None:
+                self._llm = self._load()
+            return self._llm
+
+    def complete(self, prompt, max_tokens=800, temperature=0.2, on_delta=None, raw=False) -> Completion:
+        with self._lock:
+            load_s = 0.0
+            if self._llm is None:
+                self._llm = self._load()
+                load_s = self.load_s
+            llm = self._llm
+            t0 = time.perf_counter()
+            t_first, parts = None, []
+            if raw:
+                stream = llm.create_completion(prompt, max_tokens=max_tokens, temperature=temperature, stream=True)
+            else:
+                stream = llm.create_chat_completion(messages=[{"role": "user", "content": prompt}],
+                                                    max_tokens=max_tokens, temperature=temperature, stream=True)
+            for chunk in stream:
+                choice = chunk["choices"][0]
+                delta = choice.get("text") if raw else (choice.get("delta") or {}).get("content")
+                if not delta:
+                    continue
+                if t_first is None:
+                    t_first = time.perf_counter()
+                parts.append(delta)
+                if on_delta:
+                    on_delta(delta)
+            end = time.perf_counter()
+            tokens = len(parts)
+            return Completion("".join(parts), tokens, load_s,
+                              prompt_eval_s=(t_first or end) - t0, gen_s=end - (t_first or end),
+                              prompt_tokens=max(0, llm.n_tokens - tokens))
+
+# -------------------------------------------------------------------------
+# Offline mock (tests, benchmarks): models prefix reuse over whitespace tokens
+# -------------------------------------------------------------------------
+class MockBackend(Backend):
+    name = "mock"
+    model = "mock"
+
+    def __init__(self, reply=None, load_s=0.0, prompt_ms_per_token=0.0, gen_ms_per_token=0.0, cached_prompts=32):
+        self.reply = reply or (lambda prompt: "mock completion")
+        self.load_cost_s = load_s
+        self.prompt_s = prompt_ms_per_token / 1000
+        self.gen_s = gen_ms_per_token / 1000
+        self.cached_prompts = cached_prompts
+        self._seen = []                    # token lists of recent prompts, newest last
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _common_prefix(a, b):
+        n = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            n += 1
+        return n
+
+    def complete(self, prompt, max_tokens=800, temperature=0.2, on_delta=None, raw=False) -> Completion:
+        with self._lock:          # raw: same reply either way
+            load_s = 0.0
+            if not self._loaded:
+                time.sleep(self.load_cost_s)
+                self._loaded, load_s = True, self.load_cost_s
+            toks = prompt.split()
+            reused = max((self._common_prefix(toks, s) for s in self._seen), default=0)
+            t0 = time.perf_counter()
+            time.sleep(self.prompt_s * (len(toks) - reused))
+            prompt_eval_s = time.perf_counter() - t0
+            self._seen = (self._seen + [toks])[-self.cached_prompts:]
+
+            words = self.reply(prompt).split(" ")[:max_tokens]
+            t1 = time.perf_counter()
+            for i, w in enumerate(words):
+                time.sleep(self.gen_s)
+                if on_delta:
+                    on_delta(w + (" " if i < len(words) - 1 else ""))
+            return Completion(" ".join(words), len(words), load_s, prompt_eval_s, time.perf_counter() - t1,
+                              prompt_tokens=len(toks), reused_tokens=reused)
+
+# -------------------------------------------------------------------------
+# Process-wide backend (None = HTTP, handled by llm_client)
+# -------------------------------------------------------------------------
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+_LLAMA = {}                        # model path -> [LlamaCppBackend, ...]
+_LLAMA_LOCK = threading.Lock()
+
+def llama_backend(model_path=LLM_MODEL_PATH, n_ctx=LLM_N_CTX, n_threads=LLM_N_THREADS) -> LlamaCppBackend:
+    """
+    Process-wide LlamaCppBackend per model file, so the model is loaded once
+    for LLM_BACKEND=llama_cpp and llm_agent.LocalLLM alike. A caller that
+    needs a larger context than every loaded copy gets its own.
+    """
+    with _LLAMA_LOCK:
+        for b in _LLAMA.get(model_path, []):
+            if b.n_ctx >= n_ctx:
+                return b
+        b = LlamaCppBackend(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads)
+        _LLAMA.setdefault(model_path, []).append(b)
+        return b
+
+def get_backend():
+    global _BACKEND
+    if LLM_BACKEND == "http":
+        return None
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            if LLM_BACKEND == "llama_cpp":
+                _BACKEND = llama_backend()
+            elif LLM_BACKEND == "mock":
+                _BACKEND = MockBackend(prompt_ms_per_token=float(os.getenv("LLM_MOCK_PROMPT_MS", "0")),
+                                       gen_ms_per_token=float(os.getenv("LLM_MOCK_GEN_MS", "0")))
+            else:
+                raise ValueError(f"LLM_BACKEND must be http, llama_cpp or mock (got {LLM_BACKEND!r})")
+        return _BACKEND
+
+def set_backend(backend):
+    """Installs a backend instance (e.g. a MockBackend with a custom reply); None = HTTP."""
+    global _BACKEND, LLM_BACKEND
+    with _BACKEND_LOCK:
+        _BACKEND = backend
+        LLM_BACKEND = backend.name if backend is not None else "http"
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# llm_cache.py – v1 (content-addressed LLM response cache: in-memory LRU → size-bounded SQLite)
+
+import os, json, time, pathlib, sqlite3, hashlib, threading
+from collections import OrderedDict
+from tracing import traced
+import metrics
+
+LLM_CACHE_PATH = pathlib.Path(os.getenv("UPGRADE_LLM_CACHE", "/opt/oss-migrate/upgrade-poc/llm_cache.db"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("UPGRADE_LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_MEM_ENTRIES = int(os.getenv("UPGRADE_LLM_CACHE_MEM_ENTRIES", "256"))
+
+# Call sites that must always hit the model ("*" = all). Set from main.py's
+# --no-llm-cache[=summary,rules,verifier] or UPGRADE_LLM_NO_CACHE.
+DISABLED_SITES = {s for s in os.getenv("UPGRADE_LLM_NO_CACHE", "").split(",") if s}
+
+def cache_key(model: str, prompt: str, max_tokens: int, temperature: float) -> str:
+    raw = json.dumps([model, prompt, int(max_tokens), float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def enabled_for(site: str) -> bool:
+    return "*" not in DISABLED_SITES and site not in DISABLED_SITES
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES, mem_entries=LLM_CACHE_MEM_ENTRIES):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.mem_entries = mem_entries
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used);
+        """)
+        self._disk_bytes = self._conn.execute("SELECT IFNULL(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def _remember(self, key, value):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    @traced("llm_cache.get", "db")
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.stats["mem_hits"] += 1
+                return self._mem[key]
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE llm_cache SET last_used=? WHERE key=?", (time.time(), key))
+            self._remember(key, row[0])
+            self.stats["disk_hits"] += 1
+            return row[0]
+
+    @traced("llm_cache.put", "db")
+    def put(self, key, value: str):
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._remember(key, value)
+            if size > self.max_bytes:
+                return
+            with self._conn:
+                old = self._conn.execute("SELECT size FROM llm_cache WHERE key=?", (key,)).fetchone()
+                self._conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?,?,?,?,?)",
+                                   (key, value, size, now, now))
+                self._disk_bytes += size - (old[0] if old else 0)
+                self.stats["stores"] += 1
+                if self._disk_bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """Drops least-recently-used rows until the disk tier is at 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used ASC"):
+            if self._disk_bytes <= target:
+                break
+            victims.append((key,))
+            self._disk_bytes -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key=?", victims)
+        self.stats["evictions"] += len(victims)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._mem.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._disk_bytes = 0
+
+def describe_stats(stats: dict) -> str:
+    hits = stats.get("mem_hits", 0) + stats.get("disk_hits", 0)
+    total = hits + stats.get("misses", 0)
+    rate = hits / total if total else 0.0
+    return (f"{hits} hit(s) ({stats.get('mem_hits', 0)} memory, {stats.get('disk_hits', 0)} disk), "
+            f"{stats.get('misses', 0)} miss(es), {stats.get('evictions', 0)} eviction(s) – hit rate {rate:.1%}")
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache() -> LLMCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = LLMCache()
+        return _CACHE
+
+@metrics.collector
+def _cache_metrics():
+    if _CACHE is None:
+        return []
+    return [("upgrade_llm_cache_events_total", "LLM response cache lookups and maintenance", {"event": k}, v)
+            for k, v in _CACHE.stats.items()]
@@ -1,24 +1,283 @@
-import requests, json
+#!/usr/bin/env python3
+# llm_client.py – v5 (async pooled client, bounded concurrency, SSE streaming to live log, pluggable backends)
 
-LLM_ENDPOINT = "http://localhost:18081/v1/chat/completions"
+import os, json, time, asyncio, threading
+from collections import deque
+import httpx
+import llm_cache
+import llm_backends
+from utils import push_live_log
+from tracing import span
+import metrics
 
-def query_llm(prompt: str, max_tokens=800, temperature=0.2):
+LLM_ENDPOINT = os.getenv("LLM_ENDPOINT", "http://localhost:18081/v1/chat/completions")
+LLM_MODEL = "Phi-4-mini-instruct-Q3_K_S.gguf"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "180"))
+# Keep in line with the server's parallel slots; extra requests would only queue there.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))
+# Stream completions (SSE) and forward them line by line to the dashboard.
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+# Append every model request (cache misses) as JSON lines, e.g. for bench/bench_llm_load.py.
+LLM_RECORD_PROMPTS = os.getenv("LLM_RECORD_PROMPTS", "")
+
+# Per-call timings: site, ttft_s, total_s, tokens, tokens_per_s, cached.
+# A ring buffer like tracing's span buffer: a long run keeps the newest calls.
+LLM_CALL_STATS_MAX = int(os.getenv("LLM_CALL_STATS_MAX", "10000"))
+CALL_STATS = deque(maxlen=LLM_CALL_STATS_MAX)
+_calls_dropped = 0
+_stats_lock = threading.Lock()
+LLM_CALLS = metrics.counter("upgrade_llm_calls_total", "Model calls by site, cached or not")
+LLM_TOKENS = metrics.counter("upgrade_llm_completion_tokens_total", "Completion tokens generated")
+LLM_TTFT = metrics.histogram("upgrade_llm_ttft_seconds", "Time to first streamed token")
+LLM_PHASE_SECONDS = metrics.histogram("upgrade_llm_backend_seconds", "In-process backends: load / prompt_eval / gen time")
+
+def _record(site, t0, t_first, tokens, cached=False, timings=None):
+    """timings: llm_backends.Completion.timings() for in-process backends."""
+    total = time.perf_counter() - t0
+    gen = timings["gen_s"] if timings else (total - t_first if t_first is not None else 0.0)
+    entry = {
+        "site": site,
+        "ttft_s": round(t_first, 3) if t_first is not None else None,
+        "total_s": round(total, 3),
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / gen, 2) if gen > 0 else None,
+        "cached": cached,
+        **(timings or {}),
+    }
+    global _calls_dropped
+    with _stats_lock:
+        if len(CALL_STATS) == CALL_STATS.maxlen:
+            _calls_dropped += 1
+        CALL_STATS.append(entry)
+    LLM_CALLS.inc(site=site, cached=cached)
+    if not cached:
+        LLM_TOKENS.inc(tokens, site=site)
+        if t_first is not None:
+            LLM_TTFT.observe(t_first, site=site)
+        for phase in ("load_s", "prompt_eval_s", "gen_s") if timings else ():
+            if phase != "load_s" or timings[phase]:
+                LLM_PHASE_SECONDS.observe(timings[phase], site=site, phase=phase[:-2])
+    if not cached:
+        print(f"🤖 LLM[{site}]: " + (f"ttft {entry['ttft_s']}s, " if entry["ttft_s"] is not None else "")
+              + f"{tokens} tok in {entry['total_s']}s"
+              + (f" ({entry['tokens_per_s']} tok/s)" if entry["tokens_per_s"] else "")
+              + (f" [load {timings['load_s']}s, prompt eval {timings['prompt_eval_s']}s"
+                 + (f" ({timings['reused_tokens']}/{timings['prompt_tokens']} prompt tok reused)"
+                    if timings.get("reused_tokens") is not None else "")
+                 + f", gen {timings['gen_s']}s]" if timings else ""))
+    return entry
+
+def describe_call_stats(stats=None) -> str:
+    """Over stats, or the buffered CALL_STATS (the newest LLM_CALL_STATS_MAX calls)."""
+    dropped = 0
+    if stats is None:
+        with _stats_lock:
+            stats, dropped = list(CALL_STATS), _calls_dropped
+    stats = [s for s in stats if not s["cached"]]
+    if not stats:
+        return "no model calls"
+    ttfts = sorted(s["ttft_s"] for s in stats if s["ttft_s"] is not None)
+    rates = [s["tokens_per_s"] for s in stats if s["tokens_per_s"]]
+    out = f"{len(stats)} call(s)" + (f" (+{dropped} older, not kept)" if dropped else "")
+    if ttfts:
+        out += f", median TTFT {ttfts[len(ttfts) // 2]}s"
+    if rates:
+        out += f", avg {sum(rates) / len(rates):.1f} tok/s"
+    local = [s for s in stats if "prompt_eval_s" in s]
+    if local:
+        out += (f"; in-process: load {sum(s['load_s'] for s in local):.1f}s, "
+                f"prompt eval {sum(s['prompt_eval_s'] for s in local):.1f}s, "
+                f"gen {sum(s['gen_s'] for s in local):.1f}s")
+    return out
+
+_record_lock = threading.Lock()
+
+def _record_prompt(site, payload):
+    line = json.dumps({"site": site, "prompt": payload["messages"][0]["content"],
+                       "max_tokens": payload["max_tokens"], "temperature": payload["temperature"]})
+    with _record_lock, open(LLM_RECORD_PROMPTS, "a") as f:
+        f.write(line + "\n")
+
+class _LineForwarder:
+    """Coalesces streamed deltas into lines for /ws/logs (queued; live_log batches the sends)."""
+    def __init__(self, site):
+        self.prefix = f"🤖 [{site}] "
+        self.buf = ""
+
+    def feed(self, delta: str):
+        self.buf += delta
+        while "\n" in self.buf:
+            line, self.buf = self.buf.split("\n", 1)
+            self._push(line)
+
+    def close(self):
+        if self.buf:
+            self._push(self.buf)
+            self.buf = ""
+
+    def _push(self, line):
+        push_live_log(self.prefix + line)
+
+# -------------------------------------------------------------------------
+# Async client (one per event loop)
+# -------------------------------------------------------------------------
+class AsyncLLMClient:
+    def __init__(self, endpoint=None, model=LLM_MODEL, max_concurrency=None, timeout=LLM_TIMEOUT):
+        self.endpoint = endpoint or LLM_ENDPOINT
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency or LLM_MAX_CONCURRENCY)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency))
+
+    async def _complete(self, payload: dict, site="default", backend=None):
+        """Returns (ok, text). Failures are reported as text but never cached."""
+        t0 = time.perf_counter()
+        try:
+            async with self._sem:
+                with span("llm request", "llm", site=site, queued_s=round(time.perf_counter() - t0, 3)):
+                    if backend is not None:
+                        return await self._complete_local(backend, payload, site, t0)
+                    if payload.get("stream"):
+                        return await self._complete_stream(payload, site, t0)
+                    r = await self._http.post(self.endpoint, json=payload)
+            r.raise_for_status()
+            data = r.json()
+            if "choices" in data and len(data["choices"]) > 0:
+                text = data["choices"][0]["message"]["content"]
+                tokens = (data.get("usage") or {}).get("completion_tokens", 0)
+                _record(site, t0, None, tokens)
+                return True, text
+            return False, f"(no response from model: {json.dumps(data)})"
+        except Exception as e:
+            return False, f"LLM call failed: {e}"
+
+    async def _complete_stream(self, payload: dict, site, t0):
+        # A chunk may carry several tokens: the count comes from the final
+        # chunk's usage when the server sends it, else one per content chunk.
+        parts, chunks, usage, t_first = [], 0, None, None
+        fwd = _LineForwarder(site)
+        payload = {**payload, "stream_options": {"include_usage": True}}
+        async with self._http.stream("POST", self.endpoint, json=payload) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if not delta:
+                    continue
+                if t_first is None:
+                    t_first = time.perf_counter() - t0
+                chunks += 1
+                parts.append(delta)
+                fwd.feed(delta)
+        fwd.close()
+        _record(site, t0, t_first, (usage or {}).get("completion_tokens") or chunks)
+        if not parts:
+            return False, "(no response from model: empty stream)"
+        return True, "".join(parts)
+
+    async def _complete_local(self, backend, payload: dict, site, t0):
+        fwd = _LineForwarder(site) if payload.get("stream") else None
+        c = await asyncio.to_thread(backend.complete, payload["messages"][0]["content"], payload["max_tokens"],
+                                    payload["temperature"], fwd.feed if fwd else None)
+        if fwd:
+            fwd.close()
+        total = time.perf_counter() - t0
+        _record(site, t0, total - c.gen_s if c.tokens else None, c.tokens, timings=c.timings())
+        if not c.text:
+            return False, f"(no response from {backend.name} backend)"
+        return True, c.text
+
+    async def query(self, prompt: str, max_tokens=800, temperature=0.2, cache=True, site="default"):
+        backend = llm_backends.get_backend()
+        payload = {
+            "model": backend.model if backend is not None else self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": LLM_STREAM
+        }
+        use_cache = cache and llm_cache.enabled_for(site)
+        if use_cache:
+            key = llm_cache.cache_key(payload["model"], prompt, max_tokens, temperature)
+            hit = await asyncio.to_thread(llm_cache.get_cache().get, key)
+            if hit is not None:
+                _record(site, time.perf_counter(), 0.0, 0, cached=True)
+                return hit
+
+        if LLM_RECORD_PROMPTS:
+            await asyncio.to_thread(_record_prompt, site, payload)
+        ok, text = await self._complete(payload, site, backend)
+        if ok and use_cache:
+            await asyncio.to_thread(llm_cache.get_cache().put, key, text)
+        return text
+
+    async def query_many(self, prompts, max_tokens=800, temperature=0.2, cache=True, site="default"):
+        """gather-style batch; results are in prompt order, concurrency is still bounded."""
+        return await asyncio.gather(*(self.query(p, max_tokens, temperature, cache, site) for p in prompts))
+
+    async def aclose(self):
+        await self._http.aclose()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_async_client() -> AsyncLLMClient:
+    """Client bound to the running event loop (connections are reused across calls)."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = AsyncLLMClient()
+        return client
+
+async def aquery_llm(prompt: str, max_tokens=800, temperature=0.2, cache=True, site="default"):
+    return await get_async_client().query(prompt, max_tokens, temperature, cache, site)
+
+async def aquery_llm_batch(prompts, max_tokens=800, temperature=0.2, cache=True, site="default"):
+    return await get_async_client().query_many(prompts, max_tokens, temperature, cache, site)
+
+# -------------------------------------------------------------------------
+# Sync wrappers: every thread shares one background loop, so the pool and
+# the concurrency limit are process-wide.
+# -------------------------------------------------------------------------
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+            _loop = loop
+        return _loop
+
+def _run(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+def query_llm(prompt: str, max_tokens=800, temperature=0.2, cache=True, site="default"):
     """
     Send a chat completion request to the local Phi-4 server (OpenAI-compatible endpoint).
     Returns model's text response.
+
+    Identical (model, prompt, max_tokens, temperature) requests are answered
+    from llm_cache unless cache=False or the call site is opted out.
     """
-    payload = {
-        "model": "Phi-4-mini-instruct-Q3_K_S.gguf",
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": max_tokens,
-        "temperature": temperature
-    }
-    try:
-        r = requests.post(LLM_ENDPOINT, json=payload, timeout=180)
-        r.raise_for_status()
-        data = r.json()
-        if "choices" in data and len(data["choices"]) > 0:
-            return data["choices"][0]["message"]["content"]
-        return f"(no response from model: {json.dumps(data)})"
-    except Exception as e:
-        return f"LLM call failed: {e}"
+    with span(f"llm {site}", "llm"):
+        return _run(aquery_llm(prompt, max_tokens, temperature, cache, site))
+
+def query_llm_batch(prompts, max_tokens=800, temperature=0.2, cache=True, site="default"):
+    """Runs independent prompts together (bounded by LLM_MAX_CONCURRENCY); returns texts in order."""
+    prompts = list(prompts)
+    with span(f"llm {site} (batch)", "llm", prompts=len(prompts)):
+        return _run(aquery_llm_batch(prompts, max_tokens, temperature, cache, site))
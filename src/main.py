@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
 # AI Upgrade Orchestrator – Production v21 (Rule Decay + Project Type + Confidence)
 
-import re, json, sys, shutil, tempfile, pathlib, datetime, traceback, os
-from rule_loader import load_rules, match_rules
+import re, json, sys, time, pathlib, datetime, traceback, os
+from concurrent.futures import ThreadPoolExecutor
+from rule_engine import RuleEngine, load_rule_engine
 from dynamic_rules import generate_dynamic_rules
 from code_scanner import scan_code_patterns
-from autofix_engine import run_autofix_pipeline, validate_build
+import code_scanner
+from autofix_engine import run_autofix_pipeline, validate_build, BATCH_MODES
 from verifier import verify_and_retry
-from utils import run_cmd, list_csprojs, extract_error_codes, has_build_success
-from learning_db import log_rule_result
+from utils import run_cmd, list_csprojs, extract_error_codes, log_text, file_text, write_text
+import build_executor
+from learning_db import log_rule_results
 from project_type import detect_project_type
-from llm_client import query_llm
+from llm_client import query_llm, describe_call_stats
+import llm_cache
+from diag_compress import compress_diagnostics, fit_budget, DIAG_BUDGET_SUMMARY
+from scan_index import get_index, describe_stats
+import workspace
+import tracing
+from tracing import span
+import metrics
+from scheduler import build_project_graph, describe_plan, estimate_weights, run_dag, critical_path
 
 # -------------------------------------------------------------------------
 # Arguments
@@ -22,50 +33,14 @@ SAFE_MODE = "--safe-mode" in args
 INPUT     = pathlib.Path(next((a.split("=",1)[1] for a in args if a.startswith("--input=")), "."))
 OUTPUT    = pathlib.Path(next((a.split("=",1)[1] for a in args if a.startswith("--output=")), "./reports"))
 TARGET_TFM = next((a.split("=",1)[1] for a in args if a.startswith("--target=")), "net9.0")
+AUTOFIX_BATCH = next((a.split("=",1)[1] for a in args if a.startswith("--autofix-batch=")), "file")
+SCAN_INDEX = "--no-scan-index" not in args
+NO_LLM_CACHE = next((a.split("=",1)[1] if "=" in a else "*" for a in args if a.startswith("--no-llm-cache")), "")
+RULES     = pathlib.Path(next((a.split("=",1)[1] for a in args if a.startswith("--rules=")),
+                            "/opt/oss-migrate/upgrade-poc/rules/dotnet_upgrade_rules.json"))
+JOBS      = max(1, int(next((a.split("=",1)[1] for a in args if a.startswith("--jobs=")), "1")))
 
-print(f"🧱 Input: {INPUT}")
-print(f"📦 Output: {OUTPUT}")
-print(f"🎯 Target: {TARGET_TFM}")
-print(f"🧪 Flags: dry_run={DRY_RUN}, safe_mode={SAFE_MODE}")
-
-OUTPUT.mkdir(parents=True, exist_ok=True)
-
-# -------------------------------------------------------------------------
-# Discover .csproj files
-# -------------------------------------------------------------------------
-csproj_files = list_csprojs(INPUT)
-if not csproj_files:
-    raise FileNotFoundError(f"No .csproj files under {INPUT}")
-
-print(f"🧩 Found {len(csproj_files)} project(s):")
-for f in csproj_files:
-    print(f"   • {f}")
-
-# -------------------------------------------------------------------------
-# Dependency ordering
-# -------------------------------------------------------------------------
-def sort_by_dependencies(files):
-    dep_map = {}
-    for proj in files:
-        txt = pathlib.Path(proj).read_text(errors="ignore")
-        refs = re.findall(r'<ProjectReference Include="(.*?)"', txt)
-        deps = [str((pathlib.Path(proj).parent / r).resolve()) for r in refs]
-        dep_map[str(proj)] = deps
-
-    order, seen = [], set()
-
-    def dfs(node):
-        if node in seen: return
-        for dep in dep_map.get(node, []):
-            if dep in dep_map:
-                dfs(dep)
-        seen.add(node)
-        order.append(node)
-
-    for f in map(str, files):
-        dfs(f)
-
-    return [pathlib.Path(p) for p in order if pathlib.Path(p) in files] or files
+STATIC_RULES = None   # loaded by main()
 
 # -------------------------------------------------------------------------
 # Analyze csproj
@@ -80,34 +55,50 @@ def analyze_csproj(path):
 # Retarget + initial build
 # -------------------------------------------------------------------------
 def retarget_and_build(csproj_path, target_tfm=TARGET_TFM):
-    tmp = pathlib.Path(tempfile.mkdtemp(prefix="upgrade_poc_"))
+    """
+    Restores the retargeted workspace once; the build reuses that restore and
+    the outdated-package scan starts in the background on the workspace
+    once the build is done. Returns (diag, tmp, outdated future).
+    """
+    tmp, ws_stats = workspace.create_workspace(csproj_path.parent)
     proj_dir = tmp / "proj"
-    shutil.copytree(csproj_path.parent, proj_dir)
+    print(f"📂 Workspace: {workspace.describe_stats(ws_stats)}")
 
     f = proj_dir / csproj_path.name
-    txt = f.read_text()
+    txt = file_text(f)
     txt = re.sub(r"<TargetFramework>.*?</TargetFramework>",
                  f"<TargetFramework>{target_tfm}</TargetFramework>", txt)
-    f.write_text(txt)
+    write_text(f, txt)
 
-    run_cmd(["dotnet","restore"], cwd=proj_dir)
-    diag = run_cmd(["dotnet","build","--nologo","-v","m"], cwd=proj_dir)
-    return diag, tmp
+    build_executor.restore(proj_dir)
+    _, diag = build_executor.build(proj_dir, phase="initial")
+    outdated = OUTDATED_POOL.submit(tracing.bind(run_outdated_scan), f)
+    return diag, tmp, outdated
 
 # -------------------------------------------------------------------------
-# Outdated scan
+# Outdated scan (background; reads the workspace restore, never restores)
+#
+# It lists the packages of the retargeted workspace project (the only tree
+# that is restored), not of the original: transitive versions can differ
+# from an original-tree restore. `dotnet list package` reads the project
+# file and obj/project.assets.json and may restore when they disagree, so it
+# starts only after the initial build (nothing else uses obj/ until
+# autofix) and process_project joins it before autofix starts editing.
 # -------------------------------------------------------------------------
+OUTDATED_POOL = None   # created by main() once the flags are parsed
+
 def run_outdated_scan(csproj_path):
-    run_cmd(["dotnet","restore",str(csproj_path)])
-    return run_cmd(["dotnet","list",str(csproj_path),"package",
-                    "--outdated","--include-transitive","--format","json"])
+    with span("outdated scan", "background"):
+        return run_cmd([build_executor.DOTNET_EXE,"list",str(csproj_path),"package",
+                        "--outdated","--include-transitive","--format","json"])
 
 # -------------------------------------------------------------------------
 # Write final report
 # -------------------------------------------------------------------------
 def write_report(report_path, summary_txt, project, diag, matched,
                  dynamic_rules, patterns, outdated_json,
-                 fixes, post_ok, post_log, project_type):
+                 fixes, post_ok, post_log, project_type, scan_stats=None, build_stats="",
+                 timings=""):
     report_path.parent.mkdir(parents=True, exist_ok=True)
     with open(report_path, "w") as f:
         f.write("# Upgrade Report – Production v21\n\n")
@@ -129,110 +120,230 @@ def write_report(report_path, summary_txt, project, diag, matched,
         f.write("## Code Patterns\n```json\n")
         f.write(json.dumps(patterns, indent=2))
         f.write("\n```\n\n")
+        if scan_stats:
+            f.write(f"- Scan index: {describe_stats(scan_stats)}\n\n")
 
         f.write("## Outdated Packages\n```\n")
         f.write((outdated_json or "")[:3000])
         f.write("\n```\n\n")
 
         f.write("## Initial Diagnostics\n```\n")
-        f.write((diag or "")[:2000])
+        f.write(log_text(diag)[:2000])
         f.write("\n```\n\n")
 
         f.write("## Autofix Results\n")
         f.write(f"- Rules auto-fixed: {len(fixes)} → {fixes}\n")
-        f.write(f"- Post-fix build: {'✅ SUCCESS' if post_ok else '❌ FAILED'}\n\n")
+        f.write(f"- Post-fix build: {'✅ SUCCESS' if post_ok else '❌ FAILED'}\n")
+        if build_stats:
+            f.write(f"- Builds: {build_stats}\n")
+        f.write("\n")
 
         f.write("### Post-Fix Build Log\n```\n")
-        f.write((post_log or "")[:2000])
+        f.write(log_text(post_log)[:2000])
         f.write("\n```\n\n")
 
+        if "*" not in llm_cache.DISABLED_SITES:
+            f.write(f"- LLM cache (process-wide so far): {llm_cache.describe_stats(llm_cache.get_cache().stats)}\n")
+        f.write(f"- LLM calls (process-wide so far): {describe_call_stats()}\n\n")
+
+        if timings:
+            f.write("## Timings\n")
+            f.write("Spans finished before this report was written (CPU = orchestrator thread only).\n\n")
+            f.write(timings)
+            f.write("\n\n")
+
         f.write("## AI Summary\n")
         f.write(summary_txt)
         f.write("\n")
 
 # -------------------------------------------------------------------------
-# Process each project
+# Process one project (runs inside a scheduler worker: own temp dir, own report)
+# -------------------------------------------------------------------------
+def process_project(sample):
+    tmpdir = outdated = None
+    with tracing.context(project=sample.stem), tracing.span(sample.stem, "project"):
+        try:
+            print(f"\n🚀 Processing project: {sample.name}")
+            REPORT = OUTPUT / f"{sample.stem}_upgrade_summary.md"
+
+            index = get_index() if SCAN_INDEX else None
+
+            # 1. Detect project type
+            with span("1. detect project type"):
+                project_type = detect_project_type(sample, index=index)
+            print(f"📌 Project Type: {project_type}")
+
+            # 2. Analyze project
+            with span("2. analyze csproj"):
+                project = analyze_csproj(sample)
+
+            # 3. Retarget + initial build (outdated scan starts in the background)
+            with span("3. retarget + initial build"):
+                diag, tmpdir, outdated = retarget_and_build(sample, TARGET_TFM)
+
+            # 4. Code patterns
+            scan_stats = {}
+            with span("4. code patterns"):
+                patterns = scan_code_patterns(sample.parent, index=index, stats=scan_stats)
+            print(f"🧩 Code patterns found: {len(patterns)}")
+            if index is not None:
+                print(f"🗂️ Scan index: {describe_stats(scan_stats)}")
+
+            # 5. AI + memory dynamic rules
+            with span("5. dynamic rules"):
+                dynamic_rules = generate_dynamic_rules(
+                    json.dumps(project, indent=2),
+                    diag,
+                    patterns,
+                    csproj_path=sample,
+                    project_type=project_type
+                )
+            print(f"🧠 Dynamic rules: {len(dynamic_rules)}")
+
+            # 6. Static + dynamic rule matching
+            with span("6. rule matching"):
+                dynamic_engine = RuleEngine(dynamic_rules, source=f"{sample.stem} dynamic rules")
+                dynamic_engine.report_problems()
+                matched = STATIC_RULES.match(project["packages"], dynamic_engine)
+
+            # 7. Autofix pipeline (edits the project file: the outdated scan must be done)
+            with span("outdated scan (join)"):
+                outdated_json = outdated.result()
+            print("🔧 Running autofix pipeline…")
+            with span("7. autofix"):
+                fixes = run_autofix_pipeline(tmpdir/"proj", dynamic_rules, batch=AUTOFIX_BATCH)
+
+            # 8. Post fix build
+            with span("8. post-fix build + verifier"):
+                post_ok, post_log = validate_build(tmpdir/"proj", phase="post-fix")
+                if not post_ok:
+                    print("🔍 Running verifier…")
+                    post_ok, post_log = verify_and_retry(tmpdir/"proj", log=post_log)
+
+            # 9. Log-learning to SQLite (one transaction per project)
+            with span("9. learning db"):
+                post_errors = extract_error_codes(post_log)
+                log_rule_results(
+                    (r.get("id"), r.get("pattern"), r.get("recommendation"),
+                     sample.stem, post_errors, post_ok, r.get("confidence", 1.0))
+                    for r in dynamic_rules
+                )
+
+            # 10. AI summary
+            with span("10. ai summary"):
+                half = fit_budget(DIAG_BUDGET_SUMMARY, 450, "Summarize migration actions and issues:") // 2
+                summary = query_llm(
+                    "Summarize migration actions and issues:\n"
+                    f"Initial build:\n{compress_diagnostics(diag, half)}\n"
+                    f"After autofix:\n{compress_diagnostics(post_log, half)}",
+                    max_tokens=450, temperature=0.2, site="summary"
+                ) or "—"
+
+            # 11. Report
+            with span("11. report"):
+                write_report(
+                    REPORT, summary, project, diag, matched,
+                    dynamic_rules, patterns, outdated_json,
+                    fixes, post_ok, post_log, project_type, scan_stats,
+                    build_executor.describe_savings(tmpdir/"proj"),
+                    tracing.markdown_table(project=sample.stem)
+                )
+
+            print(f"✅ Done: {REPORT}")
+            metrics.PROJECTS.inc(status="ok" if post_ok else "build-failed")
+
+        except Exception as e:
+            crash = OUTPUT / f"crash_{sample.stem}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+            with open(crash, "w") as f:
+                f.write(traceback.format_exc())
+            print(f"❌ Error: {e}\n📄 Crash log saved: {crash}")
+            metrics.PROJECTS.inc(status="crashed")
+
+        finally:
+            if outdated is not None and not outdated.cancel():
+                try:
+                    outdated.result()
+                except Exception:
+                    pass
+            if tmpdir:
+                build_executor.forget(tmpdir/"proj")
+                workspace.remove_workspace(tmpdir)
+    metrics.push()
+
+# -------------------------------------------------------------------------
+# Run: setup, then schedule projects over the ProjectReference DAG
 # -------------------------------------------------------------------------
-for sample in sort_by_dependencies(csproj_files):
-    tmpdir = None
-    try:
-        print(f"\n🚀 Processing project: {sample.name}")
-        REPORT = OUTPUT / f"{sample.stem}_upgrade_summary.md"
-
-        # 1. Detect project type
-        project_type = detect_project_type(sample)
-        print(f"📌 Project Type: {project_type}")
-
-        # 2. Analyze project
-        project = analyze_csproj(sample)
-
-        # 3. Retarget + initial build
-        diag, tmpdir = retarget_and_build(sample, TARGET_TFM)
-
-        # 4. Code patterns
-        patterns = scan_code_patterns(sample.parent)
-        print(f"🧩 Code patterns found: {len(patterns)}")
-
-        # 5. AI + memory dynamic rules
-        dynamic_rules = generate_dynamic_rules(
-            json.dumps(project, indent=2),
-            diag,
-            patterns,
-            csproj_path=sample
-        )
-        print(f"🧠 Dynamic rules: {len(dynamic_rules)}")
-
-        # 6. Static rules
-        static_rules = load_rules("/opt/oss-migrate/upgrade-poc/rules/dotnet_upgrade_rules.json")
-        matched = match_rules(project["packages"], static_rules + dynamic_rules)
-
-        # 7. Outdated packages
-        outdated_json = run_outdated_scan(sample)
-
-        # 8. Autofix pipeline
-        print("🔧 Running autofix pipeline…")
-        fixes = run_autofix_pipeline(tmpdir/"proj", dynamic_rules)
-
-        # 9. Post fix build
-        post_ok, post_log = validate_build(tmpdir/"proj")
-        if not post_ok:
-            print("🔍 Running verifier…")
-            post_ok, post_log = verify_and_retry(tmpdir/"proj")
-
-        # 10. Log-learning to SQLite
-        for r in dynamic_rules:
-            log_rule_result(
-                r.get("id"),
-                r.get("pattern"),
-                r.get("recommendation"),
-                sample.stem,
-                extract_error_codes(post_log),
-                post_ok,
-                r.get("confidence", 1.0)
-            )
-
-        # 11. AI summary
-        combined = (diag or "") + "\n" + (post_log or "")
-        summary = query_llm(
-            f"Summarize migration actions and issues:\n{combined[:4000]}",
-            max_tokens=450, temperature=0.2
-        ) or "—"
-
-        # 12. Report
-        write_report(
-            REPORT, summary, project, diag, matched,
-            dynamic_rules, patterns, outdated_json,
-            fixes, post_ok, post_log, project_type
-        )
-
-        print(f"✅ Done: {REPORT}")
-
-    except Exception as e:
-        crash = OUTPUT / f"crash_{sample.stem}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        with open(crash, "w") as f:
-            f.write(traceback.format_exc())
-        print(f"❌ Error: {e}\n📄 Crash log saved: {crash}")
-
-    finally:
-        if tmpdir:
-            shutil.rmtree(tmpdir, ignore_errors=True)
+def main():
+    global STATIC_RULES, OUTDATED_POOL
+    print(f"🧱 Input: {INPUT}")
+    print(f"📦 Output: {OUTPUT}")
+    print(f"🎯 Target: {TARGET_TFM}")
+    print(f"🧪 Flags: dry_run={DRY_RUN}, safe_mode={SAFE_MODE}, jobs={JOBS}, autofix_batch={AUTOFIX_BATCH}")
+
+    if AUTOFIX_BATCH not in BATCH_MODES:
+        raise ValueError(f"--autofix-batch must be one of {', '.join(BATCH_MODES)}")
+
+    OUTPUT.mkdir(parents=True, exist_ok=True)
+
+    # One NuGet package folder for every workspace (restores extract each package once).
+    nuget_packages = pathlib.Path(os.getenv("NUGET_PACKAGES", "/opt/oss-migrate/upgrade-poc/nuget-packages"))
+    nuget_packages.mkdir(parents=True, exist_ok=True)
+    os.environ["NUGET_PACKAGES"] = str(nuget_packages)
+
+    llm_cache.DISABLED_SITES.update(s for s in NO_LLM_CACHE.split(",") if s)
+
+    if SCAN_INDEX and "--rebuild-scan-index" in args:
+        get_index().invalidate()
+
+    # One scanner process pool for the run, shared by the --jobs workers,
+    # and one thread per worker for background outdated scans
+    code_scanner.configure_pool(jobs=JOBS)
+    OUTDATED_POOL = ThreadPoolExecutor(max_workers=JOBS, thread_name_prefix="outdated")
+
+    # Static rules: validated and compiled once for the whole run
+    STATIC_RULES = load_rule_engine(RULES)
+    print(f"📜 Static rules: {len(STATIC_RULES)} from {RULES}")
+
+    # Discover .csproj files
+    csproj_files = list_csprojs(INPUT)
+    if not csproj_files:
+        raise FileNotFoundError(f"No .csproj files under {INPUT}")
+
+    print(f"🧩 Found {len(csproj_files)} project(s):")
+    for f in csproj_files:
+        print(f"   • {f}")
+
+    run_t0 = time.perf_counter()
+    metrics.push(input=str(INPUT), target=TARGET_TFM, jobs=JOBS, autofix_batch=AUTOFIX_BATCH,
+                 projects=len(csproj_files))
+
+    # Schedule projects over the ProjectReference DAG
+    nodes, deps = build_project_graph(csproj_files)
+    weights = estimate_weights(nodes)
+    levels = describe_plan(nodes, deps, JOBS, weights)
+    durations = run_dag(nodes, deps, process_project, jobs=JOBS, weights=weights)
+
+    path, total = critical_path(deps, levels, durations)
+    if path:
+        print(f"⏱️ Measured critical path ({total:.1f}s of {sum(durations.values()):.1f}s total work): "
+              + " → ".join(f"{nodes[n].stem} ({durations[n]:.1f}s)" for n in path))
+
+    metrics.push(final=True, wall_s=round(time.perf_counter() - run_t0, 2),
+                 critical_path_s=round(total, 2) if path else None)
+
+    code_scanner.shutdown_pool()
+    OUTDATED_POOL.shutdown()
+    if os.getenv("UPGRADE_BUILD_SERVER_KEEP", "0") != "1":
+        build_executor.shutdown()
+
+    if tracing.TRACE_ENABLED:
+        trace_path = OUTPUT / f"trace_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        n = tracing.export_chrome_trace(trace_path)
+        print(f"🧭 Trace: {n} span(s) → {trace_path} (open in ui.perfetto.dev or chrome://tracing)")
+        if tracing.dropped():
+            print(f"⚠️ Trace: {tracing.dropped()} older span(s) dropped (UPGRADE_TRACE_MAX_EVENTS={tracing.TRACE_MAX_EVENTS})")
+
+# Worker processes (code_scanner's pool) import this module; only the
+# script run itself migrates anything.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# metrics.py – v1 (counters + histograms for the run, pushed to the dashboard's /metrics and run history)
+
+import os, bisect, socket, threading, datetime
+import requests
+import tracing
+
+DASHBOARD_URL = os.getenv("UPGRADE_DASHBOARD_URL", "http://127.0.0.1:8899")
+PUSH_TIMEOUT = float(os.getenv("UPGRADE_METRICS_PUSH_TIMEOUT", "2"))
+
+# Seconds; from sub-millisecond DB calls up to cold builds.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _key(labels: dict):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [{"labels": dict(k), "value": v} for k, v in self._values.items()]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}        # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        k = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            h = self._values.get(k)
+            if h is None:
+                h = self._values[k] = [[0] * (len(self.buckets) + 1), 0.0]
+            h[0][i] += 1
+            h[1] += value
+
+    def samples(self):
+        """Cumulative bucket counts, as in the Prometheus exposition format."""
+        out = []
+        with self._lock:
+            for k, (counts, total) in self._values.items():
+                cum, acc = [], 0
+                for le, c in zip(list(self.buckets) + ["+Inf"], counts):
+                    acc += c
+                    cum.append([le, acc])
+                out.append({"labels": dict(k), "buckets": cum, "sum": round(total, 6), "count": acc})
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help, **kw)
+            return m
+
+    def counter(self, name, help="") -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def collector(self, fn):
+        """fn() -> [(name, help, labels, value)] counters read at snapshot time (e.g. cache stats)."""
+        self._collectors.append(fn)
+        return fn
+
+    def snapshot(self) -> dict:
+        """{name: {type, help, samples}}, JSON-serialisable."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = {m.name: {"type": m.kind, "help": m.help, "samples": m.samples()} for m in metrics}
+        for fn in self._collectors:
+            for name, help, labels, value in fn():
+                out.setdefault(name, {"type": "counter", "help": help, "samples": []})["samples"].append(
+                    {"labels": labels, "value": value})
+        return out
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+collector = REGISTRY.collector
+
+# -------------------------------------------------------------------------
+# Spans → histograms (phases, subprocesses, LLM requests, DB calls)
+# -------------------------------------------------------------------------
+PHASE_SECONDS = histogram("upgrade_phase_duration_seconds", "Wall time of each numbered orchestrator phase")
+SUBPROCESS_SECONDS = histogram("upgrade_subprocess_duration_seconds", "Wall time of external commands")
+LLM_REQUEST_SECONDS = histogram("upgrade_llm_request_duration_seconds", "Model request latency (uncached)")
+DB_SECONDS = histogram("upgrade_db_call_duration_seconds", "Learning DB and LLM cache call time")
+PROJECTS = counter("upgrade_projects_total", "Projects processed")
+
+def _on_span(e):
+    cat = e["cat"]
+    if cat == "phase":
+        PHASE_SECONDS.observe(e["wall"], phase=e["name"])
+    elif cat == "subprocess":
+        SUBPROCESS_SECONDS.observe(e["wall"], command=e["name"])
+    elif cat == "llm" and e["name"] == "llm request":
+        LLM_REQUEST_SECONDS.observe(e["wall"], site=e["args"].get("site", "default"))
+    elif cat == "db":
+        DB_SECONDS.observe(e["wall"], call=e["name"])
+
+tracing.add_listener(_on_span)
+
+# -------------------------------------------------------------------------
+# Push to the dashboard (cumulative per run, so re-pushing is idempotent)
+# -------------------------------------------------------------------------
+RUN = {
+    "run_id": f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{socket.gethostname()}_{os.getpid()}",
+    "started": datetime.datetime.now().isoformat(timespec="seconds"),
+}
+_push_failed = False
+
+def push(final=False, **info) -> bool:
+    """Sends this run's snapshot to the dashboard; never raises."""
+    global _push_failed
+    RUN.update(info)
+    payload = dict(RUN, finished=final, metrics=REGISTRY.snapshot())
+    if final:
+        payload["ended"] = datetime.datetime.now().isoformat(timespec="seconds")
+    try:
+        requests.post(f"{DASHBOARD_URL}/push-metrics", json=payload, timeout=PUSH_TIMEOUT).raise_for_status()
+        return True
+    except Exception as e:
+        if not _push_failed or final:
+            print(f"📉 Metrics not pushed to {DASHBOARD_URL}: {e}")
+        _push_failed = True
+        return False
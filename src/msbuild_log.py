@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# msbuild_log.py – v1 (streaming MSBuild output → structured diagnostics)
+
+import re, subprocess, threading
+from collections import deque
+from typing import NamedTuple, Optional
+from tracing import subprocess_span
+
+DIAG_RE = re.compile(
+    r"^\s*(?P<file>(?:[A-Za-z]:)?[^:]*?)(?:\((?P<line>\d+)(?:,(?P<col>\d+))?(?:,\d+)*\))?\s*:\s*"
+    r"(?P<sev>error|warning)\s+(?P<code>[A-Za-z]+\d+)\s*:\s*(?P<msg>.*?)"
+    r"(?:\s+\[(?P<proj>[^\]]+)\])?\s*$", re.IGNORECASE)
+SUCCESS_MARKERS = ("build succeeded", " 0 error(s)")
+
+KEEP_HEAD = 64 * 1024
+KEEP_TAIL = 64 * 1024
+
+class Diagnostic(NamedTuple):
+    code: str
+    severity: str           # "error" | "warning"
+    file: str
+    line: Optional[int]
+    column: Optional[int]
+    project: Optional[str]
+    message: str
+
+    def render(self) -> str:
+        where = self.file
+        if self.line is not None:
+            where += f"({self.line},{self.column})" if self.column is not None else f"({self.line})"
+        return f"{where}: {self.severity} {self.code}: {self.message}"
+
+def parse_line(line: str) -> Optional[Diagnostic]:
+    m = DIAG_RE.match(line)
+    if not m:
+        return None
+    return Diagnostic(
+        code=m.group("code").upper(),
+        severity=m.group("sev").lower(),
+        file=m.group("file").strip(),
+        line=int(m.group("line")) if m.group("line") else None,
+        column=int(m.group("col")) if m.group("col") else None,
+        project=m.group("proj"),
+        message=m.group("msg"),
+    )
+
+class BuildResult:
+    """
+    Incrementally fed build output. Keeps de-duplicated diagnostics (MSBuild
+    repeats every one of them in its closing summary), the success verdict
+    and a bounded head/tail of the raw text for reports.
+    """
+    def __init__(self, keep_head=KEEP_HEAD, keep_tail=KEEP_TAIL):
+        self.diagnostics = []
+        self._seen = set()
+        self.success_marker = False
+        self.returncode = None
+        self.lines = 0
+        self._keep_head, self._keep_tail = keep_head, keep_tail
+        self._head, self._head_len = [], 0
+        self._tail, self._tail_len = deque(), 0
+        self.truncated = False
+
+    def feed(self, line: str):
+        line = line.rstrip("\r\n")
+        self.lines += 1
+        self._keep(line)
+        low = line.lower()
+        if not self.success_marker and any(m in low for m in SUCCESS_MARKERS):
+            self.success_marker = True
+        if ": error " in low or ": warning " in low or " error " in low or " warning " in low:
+            d = parse_line(line)
+            if d is not None and d not in self._seen:
+                self._seen.add(d)
+                self.diagnostics.append(d)
+
+    def _keep(self, line):
+        if self._head_len < self._keep_head:
+            self._head.append(line)
+            self._head_len += len(line) + 1
+            return
+        self._tail.append(line)
+        self._tail_len += len(line) + 1
+        while self._tail_len > self._keep_tail and len(self._tail) > 1:
+            self._tail_len -= len(self._tail.popleft()) + 1
+            self.truncated = True
+
+    def finish(self, returncode=None):
+        self.returncode = returncode
+        return self
+
+    # ---------------------------------------------------------------------
+    @property
+    def ok(self) -> bool:
+        """
+        Marker and a zero exit code: a killed or crashed build that already
+        printed the marker is a failure. Parsed text (parse_text/parse_file)
+        has no exit code and is judged by the marker alone.
+        """
+        if self.returncode is None:
+            return self.success_marker
+        return self.returncode == 0 and self.success_marker
+
+    @property
+    def errors(self):
+        return [d for d in self.diagnostics if d.severity == "error"]
+
+    @property
+    def warnings(self):
+        return [d for d in self.diagnostics if d.severity == "warning"]
+
+    def error_codes(self):
+        return [d.code for d in self.errors]
+
+    def by_code(self):
+        """{code: {file: [Diagnostic, ...]}} over errors."""
+        idx = {}
+        for d in self.errors:
+            idx.setdefault(d.code, {}).setdefault(d.file, []).append(d)
+        return idx
+
+    @property
+    def text(self) -> str:
+        head = "\n".join(self._head)
+        if not self._tail:
+            return head
+        gap = "\n… (log truncated) …\n" if self.truncated else "\n"
+        return head + gap + "\n".join(self._tail)
+
+    def __str__(self):
+        return self.text
+
+    def __bool__(self):
+        return self.lines > 0
+
+def parse_text(text: str) -> BuildResult:
+    r = BuildResult()
+    for line in (text or "").splitlines():
+        r.feed(line)
+    return r.finish()
+
+def parse_file(path) -> BuildResult:
+    """For `-flp:logfile=...` output: read line by line, never the whole file at once."""
+    r = BuildResult()
+    with open(path, errors="ignore") as f:
+        for line in f:
+            r.feed(line)
+    return r.finish()
+
+def run_build(cmd, cwd=None, timeout=None, env=None) -> BuildResult:
+    """Runs cmd and parses its combined stdout/stderr as it is produced."""
+    r = BuildResult()
+    timed_out = threading.Event()
+    with subprocess_span(cmd):
+        p = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             text=True, errors="replace", bufsize=1)
+        def expire():
+            timed_out.set()
+            p.kill()
+        watchdog = threading.Timer(timeout, expire) if timeout else None
+        if watchdog:
+            watchdog.start()
+        try:
+            with p.stdout:
+                for line in p.stdout:
+                    r.feed(line)
+            p.wait()
+        finally:
+            if watchdog:
+                watchdog.cancel()
+    if timed_out.is_set():
+        r.feed(f"Build FAILED: timed out after {timeout}s")
+    return r.finish(p.returncode)
@@ -1,17 +1,88 @@
-import os, uvicorn
-from llama_cpp.server.app import create_app
-from llama_cpp.server.settings import Settings
+import os, sys, shutil, uvicorn
 
-def main():
-    model_path = os.getenv("MODEL_PATH", "/opt/oss-migrate/llm-planner-ai/models/Phi-4-mini-instruct-Q3_K_S.gguf")
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", "18081"))
-    n_ctx = int(os.getenv("N_CTX", "8192"))
-    n_threads = int(os.getenv("N_THREADS", "4"))
+# Serving profiles (PHI4_PROFILE):
+#   latency    – llama-cpp-python server, one request at a time (the original setup)
+#   throughput – native llama.cpp `llama-server` with PARALLEL slots and continuous
+#                batching; concurrent completions share each decode step.
+# Set LLM_MAX_CONCURRENCY on the orchestrator to the slot count.
+PROFILE = os.getenv("PHI4_PROFILE", "latency")
+
+def _env_bool(name, default):
+    return os.getenv(name, "1" if default else "0") == "1"
+
+def settings_from_env():
+    return {
+        "model": os.getenv("MODEL_PATH", "/opt/oss-migrate/llm-planner-ai/models/Phi-4-mini-instruct-Q3_K_S.gguf"),
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "18081")),
+        "n_ctx": int(os.getenv("N_CTX", "8192")),                 # per slot
+        "n_threads": int(os.getenv("N_THREADS", "4")),            # generation
+        "n_threads_batch": int(os.getenv("N_THREADS_BATCH", os.getenv("N_THREADS", "4"))),  # prompt eval
+        "n_batch": int(os.getenv("N_BATCH", "512")),
+        "parallel": int(os.getenv("PARALLEL", "4" if PROFILE == "throughput" else "1")),
+        "prompt_cache_mb": int(os.getenv("PROMPT_CACHE_MB", "1024")),   # 0 = off
+        "mlock": _env_bool("MLOCK", False),                       # pin weights in RAM (needs memlock ulimit)
+        "mmap": _env_bool("MMAP", True),
+        "cpus": os.getenv("CPU_AFFINITY", ""),                    # e.g. "0-7" or "0,2,4,6"
+        "llama_server": os.getenv("LLAMA_SERVER_BIN", "llama-server"),
+    }
+
+def parse_cpus(spec: str):
+    cpus = set()
+    for part in filter(None, spec.replace(" ", "").split(",")):
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+def pin_cpus(spec: str):
+    """Restricts this process (and the llama-server it execs) to the given CPUs."""
+    if spec and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, parse_cpus(spec))
+        print(f"📌 CPU affinity: {sorted(os.sched_getaffinity(0))}")
 
-    settings = Settings(model=model_path, n_ctx=n_ctx, n_threads=n_threads)
+def llama_server_argv(s: dict):
+    argv = [s["llama_server"], "-m", s["model"], "--host", s["host"], "--port", str(s["port"]),
+            "-c", str(s["n_ctx"] * s["parallel"]), "-np", str(s["parallel"]), "-cb",
+            "-t", str(s["n_threads"]), "-tb", str(s["n_threads_batch"]), "-b", str(s["n_batch"]),
+            "--metrics"]
+    if s["prompt_cache_mb"] > 0:
+        argv += ["--cache-reuse", "256"]          # reuse KV chunks of a slot's previous prompt
+    if s["mlock"]:
+        argv.append("--mlock")
+    if not s["mmap"]:
+        argv.append("--no-mmap")
+    return argv
+
+def serve_native(s: dict):
+    exe = shutil.which(s["llama_server"])
+    if exe is None:
+        sys.exit("PHI4_PROFILE=throughput needs llama.cpp's llama-server on PATH (or LLAMA_SERVER_BIN)")
+    argv = llama_server_argv(s)
+    print("🚀 " + " ".join(argv))
+    os.execv(exe, argv)
+
+def serve_python(s: dict):
+    from llama_cpp.server.app import create_app
+    from llama_cpp.server.settings import Settings
+    if s["parallel"] > 1:
+        print(f"⚠️ PARALLEL={s['parallel']} ignored: the llama-cpp-python server has a single slot "
+              "(use PHI4_PROFILE=throughput)")
+    settings = Settings(model=s["model"], host=s["host"], port=s["port"], n_ctx=s["n_ctx"],
+                        n_threads=s["n_threads"], n_threads_batch=s["n_threads_batch"], n_batch=s["n_batch"],
+                        use_mlock=s["mlock"], use_mmap=s["mmap"],
+                        cache=s["prompt_cache_mb"] > 0, cache_type="ram", cache_size=s["prompt_cache_mb"] << 20)
     app = create_app(settings)
-    uvicorn.run(app, host=host, port=port)
+    uvicorn.run(app, host=s["host"], port=s["port"])
+
+def main():
+    s = settings_from_env()
+    pin_cpus(s["cpus"])
+    if PROFILE == "throughput":
+        serve_native(s)
+    elif PROFILE == "latency":
+        serve_python(s)
+    else:
+        sys.exit(f"PHI4_PROFILE must be latency or throughput (got {PROFILE!r})")
 
 if __name__ == "__main__":
     main()
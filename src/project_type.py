@@ -3,7 +3,16 @@
 
 import pathlib, re
 
-def detect_project_type(csproj_path: pathlib.Path):
+def _program_uses_web_app(code_dir: pathlib.Path, index=None) -> bool:
+    program = next(code_dir.rglob("Program.cs"), None)
+    if program is None:
+        return False
+    if index is not None:
+        return "WebApplication" in index.markers(program)
+    return "WebApplication" in program.read_text(errors="ignore")
+
+def detect_project_type(csproj_path: pathlib.Path, index=None):
+    """index: optional scan_index.ScanIndex used to answer content checks from cache."""
     text = csproj_path.read_text(errors="ignore")
     code_dir = csproj_path.parent
 
@@ -19,10 +28,8 @@ def detect_project_type(csproj_path: pathlib.Path):
         return "worker-service"
 
     if "<Project Sdk=\"Microsoft.NET.Sdk" in text:
-        if any("Program.cs" in str(p) for p in code_dir.rglob("*")):
-            content = open(next(code_dir.rglob("Program.cs")), "r").read()
-            if "WebApplication" in content:
-                return "minimal-api"
+        if _program_uses_web_app(code_dir, index):
+            return "minimal-api"
         return "console-or-library"
 
     return "unknown"
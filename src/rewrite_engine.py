@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# rewrite_engine.py – v1 (one walk, one read per file, all text rules in a single pass)
+
+import os, re, pathlib
+from utils import file_text
+from workspace import EXCLUDE_DIRS
+
+def walk_sources(proj_dir: pathlib.Path, suffix=".cs"):
+    """Source files in a stable order; build output (obj/ generated .cs) is never rewritten."""
+    out = []
+    for root, dirs, files in os.walk(proj_dir):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDE_DIRS)
+        out.extend(pathlib.Path(root) / f for f in sorted(files) if f.endswith(suffix))
+    return out
+
+def _overlap(a: str, b: str) -> bool:
+    """True if occurrences of a and b can share characters (containment or suffix/prefix overlap)."""
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
+class TextRules:
+    """
+    Literal (pattern → recommendation) rules, applied like sequential
+    str.replace calls in rule order. When no pattern can overlap another and
+    no replacement can form a later rule's pattern, that is the same as one
+    regex substitution over the alternation of all patterns (independent=True).
+    """
+    def __init__(self, rules):
+        self.rules = []
+        for r in rules:
+            patt = r.get("pattern","")
+            if patt:
+                self.rules.append((r.get("id","AUTO-RXXX"), patt, r.get("recommendation","")))
+        self.slot = {}
+        for i, (_, patt, _) in enumerate(self.rules):
+            self.slot.setdefault(patt, i)
+        pats = sorted(self.slot, key=len, reverse=True)
+        self.any_rx = re.compile("|".join(map(re.escape, pats))) if pats else None
+        self.independent = len(self.slot) == len(self.rules) and self._independent()
+
+    def _independent(self) -> bool:
+        pats = [p for _, p, _ in self.rules]
+        for i, a in enumerate(pats):
+            if any(_overlap(a, b) for b in pats[i+1:]):
+                return False
+            for _, b, _ in self.rules[i+1:]:
+                rec = self.rules[i][2]
+                if (not rec and len(b) > 1) or (rec and _overlap(rec, b)):
+                    return False
+        return True
+
+    def apply(self, text: str):
+        """Returns (new text, [rule index, ...] that changed it, in rule order)."""
+        if self.any_rx is None or not self.any_rx.search(text):
+            return text, []
+        if self.independent:
+            fired = set()
+            def repl(m):
+                i = self.slot[m.group(0)]
+                fired.add(i)
+                return self.rules[i][2]
+            return self.any_rx.sub(repl, text), sorted(fired)
+        fired = []
+        for i, (_, patt, rec) in enumerate(self.rules):
+            if patt in text:
+                text = text.replace(patt, rec)
+                fired.append(i)
+        return text, fired
+
+class RewritePlan:
+    """
+    originals: {file: text} for every file at least one rule touches
+    rewritten: {file: text} with all rules applied
+    edits:     [(rule id, file, pattern, recommendation)] in rule order, then file order
+    """
+    def __init__(self, originals, rewritten, edits, scanned):
+        self.originals, self.rewritten, self.edits, self.scanned = originals, rewritten, edits, scanned
+
+def plan_rewrites(proj_dir: pathlib.Path, rules: list) -> RewritePlan:
+    text_rules = TextRules(rules)
+    originals, rewritten, fired_by_file = {}, {}, []
+    files = walk_sources(proj_dir) if text_rules.rules else []
+    for cs in files:
+        text = file_text(cs)
+        new, fired = text_rules.apply(text)
+        if fired:
+            originals[cs], rewritten[cs] = text, new
+            fired_by_file.append((cs, fired))
+    edits = sorted(((i, n, text_rules.rules[i][0], cs, text_rules.rules[i][1], text_rules.rules[i][2])
+                    for n, (cs, fired) in enumerate(fired_by_file) for i in fired))
+    return RewritePlan(originals, rewritten, [e[2:] for e in edits], len(files))
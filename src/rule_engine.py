@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# rule_engine.py – v1 (validated, precompiled rule set: literal automaton + regex alternation prefilter)
+
+import re, json, pathlib, threading
+from collections import deque
+from rule_loader import load_rules
+
+try:
+    from re import _parser as _sre_parse       # 3.11+
+except ImportError:                            # pragma: no cover
+    import sre_parse as _sre_parse
+
+def required_literal(pattern: str) -> str:
+    """
+    Longest run of consecutive top-level literal characters: any string the
+    pattern matches must contain it. "" when there is none (alternation at
+    the top, only classes/repeats, empty pattern).
+    """
+    best, run = "", []
+    for op, arg in _sre_parse.parse(pattern):
+        if str(op) == "LITERAL":
+            run.append(chr(arg))
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+    if len(run) > len(best):
+        best = "".join(run)
+    return best
+
+def has_group_refs(pattern: str) -> bool:
+    """
+    True when the pattern refers to its own groups ((.)\\1, (?P=name),
+    (?(1)...)): inside a combined alternation those numbers would point at
+    another pattern's groups.
+    """
+    def walk(node):
+        if isinstance(node, _sre_parse.SubPattern):
+            return any(walk(item) for item in node)
+        if isinstance(node, (tuple, list)):
+            if node and str(node[0]) in ("GROUPREF", "GROUPREF_EXISTS"):
+                return True
+            return any(walk(x) for x in node)
+        return False
+    return walk(_sre_parse.parse(pattern))
+
+class Automaton:
+    """Aho-Corasick over lowercased ASCII keys; search() yields each key id found in a text."""
+    def __init__(self, keys):
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for kid, key in enumerate(keys):
+            node = 0
+            for ch in key:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                node = nxt
+            self.out[node].append(kid)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self, text: str):
+        found, node = set(), 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                found.update(self.out[node])
+        return found
+
+class RuleEngine:
+    """
+    Rules are validated and compiled once. A package is only tested against
+    rules whose required literal occurs in its name (one automaton pass) plus
+    literal-free rules, and those only if their combined alternation matches
+    (literal-free rules with group references are always tested). Matches are
+    exactly those of re.search(pattern, package, re.IGNORECASE).
+
+    The automaton compares ASCII-lowercased text, which agrees with re's
+    case-insensitive matching only between ASCII characters ('K' also
+    matches KELVIN SIGN, 's' LONG S, ...). Rules whose literal is not ASCII
+    count as literal-free, and packages with non-ASCII names are tested
+    against every rule.
+    """
+    def __init__(self, rules, source="rules"):
+        self.source = source
+        self.rules, self.regexes, self.problems = [], [], []
+        keys, self.key_rules, self.residual, self.solo = {}, [], [], []
+        for i, r in enumerate(rules or []):
+            if not isinstance(r, dict):
+                self.problems.append((i, None, "rule is not an object"))
+                continue
+            pat = r.get("pattern", "")
+            if not isinstance(pat, str):
+                self.problems.append((i, r.get("id"), f"pattern is {type(pat).__name__}, not a string"))
+                continue
+            try:
+                rx = re.compile(pat, re.IGNORECASE)
+            except re.error as e:
+                self.problems.append((i, r.get("id"), f"bad pattern {pat!r}: {e}"))
+                continue
+            slot = len(self.rules)
+            self.rules.append(r)
+            self.regexes.append(rx)
+            lit = required_literal(pat)
+            lit = lit.lower() if lit.isascii() else ""
+            if lit:
+                kid = keys.setdefault(lit, len(keys))
+                if kid == len(self.key_rules):
+                    self.key_rules.append([])
+                self.key_rules[kid].append(slot)
+            elif has_group_refs(pat):
+                self.solo.append(slot)
+            else:
+                self.residual.append(slot)
+        self.automaton = Automaton(list(keys))
+        self.residual_rx = None
+        if self.residual:
+            try:
+                self.residual_rx = re.compile("|".join(f"(?:{self.rules[s].get('pattern', '')})"
+                                                       for s in self.residual), re.IGNORECASE)
+            except re.error:
+                pass    # e.g. inline flags / repeated group names don't combine; test them one by one
+
+    def __len__(self):
+        return len(self.rules)
+
+    def candidates(self, pkg: str):
+        if not pkg.isascii():
+            return range(len(self.rules))
+        slots = [s for kid in self.automaton.search(pkg.lower()) for s in self.key_rules[kid]]
+        if self.residual and (self.residual_rx is None or self.residual_rx.search(pkg)):
+            slots.extend(self.residual)
+        return sorted(slots + self.solo)
+
+    def matching_rules(self, pkg: str):
+        return [self.rules[s] for s in self.candidates(pkg) if self.regexes[s].search(pkg)]
+
+    def match(self, packages, extra=None):
+        """
+        Same output and order as the nested loop it replaces: per package,
+        this engine's rules first, then the extra (e.g. per-project dynamic) engine's.
+        """
+        matched = []
+        for pkg, version in packages:
+            hits = self.matching_rules(pkg) + (extra.matching_rules(pkg) if extra is not None else [])
+            for r in hits:
+                matched.append({
+                    "id": r.get("id","RULE"),
+                    "package": pkg,
+                    "currentVersion": version,
+                    "issue": r.get("issue"),
+                    "recommendation": r.get("recommendation"),
+                    "autofix": r.get("autofix", False)
+                })
+        return matched
+
+    def report_problems(self):
+        if not self.problems:
+            return
+        print(f"⚠️ {self.source}: {len(self.problems)} rule(s) skipped:")
+        for i, rid, why in self.problems:
+            print(f"   • #{i}{' ' + str(rid) if rid else ''}: {why}")
+
+# -------------------------------------------------------------------------
+# Static rule set: loaded, validated and compiled once per file version
+# -------------------------------------------------------------------------
+_engines = {}
+_engines_lock = threading.Lock()
+
+def load_rule_engine(rule_path) -> RuleEngine:
+    rule_path = pathlib.Path(rule_path)
+    try:
+        st = rule_path.stat()
+        version = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        version = None
+    with _engines_lock:
+        cached = _engines.get(str(rule_path))
+        if cached and cached[0] == version:
+            return cached[1]
+        engine = RuleEngine(load_rules(rule_path), source=rule_path.name)
+        if version is None:
+            print(f"⚠️ Rules file not found: {rule_path}")
+        elif not len(engine):
+            try:
+                json.loads(rule_path.read_text())
+            except ValueError as e:
+                engine.problems.append((0, None, f"unreadable JSON: {e}"))
+        engine.report_problems()
+        _engines[str(rule_path)] = (version, engine)
+        return engine
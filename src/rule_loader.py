@@ -1,4 +1,4 @@
-import json, pathlib, re
+import json, pathlib
 
 def load_rules(rule_path):
     rule_path = pathlib.Path(rule_path)
@@ -18,20 +18,6 @@ def load_static_rules(rule_path):
     return load_rules(rule_path)
 
 def match_rules(packages, rules):
-    matched = []
-    for pkg, version in packages:
-        for r in rules:
-            pat = r.get("pattern", "")
-            try:
-                if re.search(pat, pkg, re.IGNORECASE):
-                    matched.append({
-                        "id": r.get("id","RULE"),
-                        "package": pkg,
-                        "currentVersion": version,
-                        "issue": r.get("issue"),
-                        "recommendation": r.get("recommendation"),
-                        "autofix": r.get("autofix", False)
-                    })
-            except re.error:
-                continue
-    return matched
+    """Kept for callers with ad-hoc rule lists; see rule_engine.RuleEngine."""
+    from rule_engine import RuleEngine
+    return RuleEngine(rules).match(packages)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# scan_index.py – v1 (persistent per-file pattern index keyed by path/mtime/size/hash)
+
+import os, json, time, pathlib, sqlite3, hashlib, threading
+import code_scanner
+import metrics
+from code_scanner import iter_chunked, patterns_in_text
+
+SCAN_INDEX_PATH = pathlib.Path(os.getenv("UPGRADE_SCAN_INDEX", "/opt/oss-migrate/upgrade-poc/scan_index.db"))
+
+# Substrings recorded per file so project_type can answer without re-reading.
+MARKERS = ("WebApplication",)
+RACY_NS = 2_000_000_000
+
+def scanner_fingerprint() -> str:
+    """Changes whenever the scanner patterns or markers change → index is invalidated."""
+    h = hashlib.sha1()
+    h.update(code_scanner.TOKEN_RE.pattern.encode())
+    for p in code_scanner.CODE_PATTERNS:
+        h.update(b"\0" + p.pattern.encode())
+    h.update(b"\0" + json.dumps(MARKERS).encode())
+    return h.hexdigest()
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _index_chunk(items):
+    """
+    items: [(path, cached digest or None)]. Reads each file once; if the
+    content still matches the cached digest only the stat is refreshed
+    (patterns=None), otherwise the file is parsed.
+    """
+    out = []
+    for path, known in items:
+        try:
+            st = os.stat(path)
+            data = pathlib.Path(path).read_bytes()
+        except OSError:
+            continue
+        digest = _digest(data)
+        if digest == known:
+            out.append((path, st.st_mtime_ns, st.st_size, digest, None, None))
+            continue
+        text = data.decode("utf-8", errors="ignore")
+        out.append((path, st.st_mtime_ns, st.st_size, digest,
+                    sorted(patterns_in_text(text)), [m for m in MARKERS if m in text]))
+    return out
+
+class ScanIndex:
+    def __init__(self, path=SCAN_INDEX_PATH):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            digest TEXT,
+            patterns TEXT,
+            markers TEXT
+        );
+        """)
+        self.stats = {"hits": 0, "rehashed": 0, "misses": 0, "removed": 0}
+        row = self._conn.execute("SELECT value FROM meta WHERE key='fingerprint'").fetchone()
+        if not row or row[0] != scanner_fingerprint():
+            if row:
+                print("🗂️ Scanner patterns changed – invalidating scan index")
+            self.invalidate()
+
+    def invalidate(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("INSERT OR REPLACE INTO meta(key,value) VALUES('fingerprint',?)",
+                               (scanner_fingerprint(),))
+
+    def _rows_under(self, root: str):
+        prefix = root.rstrip(os.sep) + os.sep
+        cur = self._conn.execute(
+            "SELECT path, mtime_ns, size, digest, patterns, markers FROM files WHERE path >= ? AND path < ?",
+            (prefix, prefix + "\uffff"))
+        return {r[0]: r[1:] for r in cur}
+
+    def _refresh(self, files, jobs=None):
+        """
+        Brings the given files up to date and returns {path: (patterns, markers)}.
+        Unchanged stat → cache hit; changed stat but same digest → rehash hit.
+        """
+        files = [str(pathlib.Path(f).resolve()) for f in files]
+        with self._lock:
+            cached = {}
+            for f in files:
+                r = self._conn.execute(
+                    "SELECT mtime_ns, size, digest, patterns, markers FROM files WHERE path=?", (f,)).fetchone()
+                if r:
+                    cached[f] = r
+        return self._merge(files, cached, jobs)
+
+    def _merge(self, files, cached, jobs, stats=None):
+        stats = stats if stats is not None else {}
+        for k in self.stats:
+            stats.setdefault(k, 0)
+        # Files touched in the last RACY_NS may change again within the same
+        # mtime tick, so their stat alone is not trusted.
+        racy_after = time.time_ns() - RACY_NS
+        result, todo = {}, []
+        for f in files:
+            row = cached.get(f)
+            try:
+                st = os.stat(f)
+            except OSError:
+                continue
+            if row and row[0] == st.st_mtime_ns and row[1] == st.st_size and st.st_mtime_ns < racy_after:
+                result[f] = (json.loads(row[3]), json.loads(row[4]))
+                stats["hits"] += 1
+            else:
+                todo.append((f, row[2] if row else None))
+
+        updates = []
+        for path, mtime, size, digest, patterns, markers in iter_chunked(todo, _index_chunk, jobs):
+            if patterns is None:
+                row = cached[path]
+                patterns, markers = json.loads(row[3]), json.loads(row[4])
+                stats["rehashed"] += 1
+            else:
+                stats["misses"] += 1
+            result[path] = (patterns, markers)
+            updates.append((path, mtime, size, digest, json.dumps(patterns), json.dumps(markers)))
+
+        with self._lock, self._conn:
+            if updates:
+                self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?)", updates)
+            for k in ("hits", "rehashed", "misses"):
+                self.stats[k] += stats[k]
+        return result
+
+    def scan(self, source_dir, jobs=None, stats=None):
+        """
+        Same output as code_scanner.extract_code_sentences, reusing cached
+        files. stats (optional dict) receives this call's hit/miss counts.
+        """
+        stats = stats if stats is not None else {}
+        root = str(pathlib.Path(source_dir).resolve())
+        files = [str(p) for p in pathlib.Path(root).rglob("*.cs")]
+        with self._lock:
+            cached = self._rows_under(root)
+        result = self._merge(files, cached, jobs, stats)
+
+        gone = set(cached) - set(files)
+        stats["removed"] = len(gone)
+        if gone:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM files WHERE path=?", [(p,) for p in gone])
+                self.stats["removed"] += len(gone)
+
+        found = set()
+        for patterns, _ in result.values():
+            found.update(patterns)
+        return sorted(found)
+
+    def markers(self, path) -> set:
+        info = self._refresh([path]).get(str(pathlib.Path(path).resolve()))
+        return set(info[1]) if info else set()
+
+def hit_rate(stats: dict) -> float:
+    hits = stats.get("hits", 0) + stats.get("rehashed", 0)
+    total = hits + stats.get("misses", 0)
+    return hits / total if total else 0.0
+
+def describe_stats(stats: dict) -> str:
+    return (f"{stats.get('hits', 0)} hit(s), {stats.get('rehashed', 0)} rehash hit(s), "
+            f"{stats.get('misses', 0)} miss(es), {stats.get('removed', 0)} removed – "
+            f"hit rate {hit_rate(stats):.1%}")
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_index(path=SCAN_INDEX_PATH) -> ScanIndex:
+    """Process-wide index shared by all scheduler workers."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = ScanIndex(path)
+        return _INDEX
+
+@metrics.collector
+def _index_metrics():
+    if _INDEX is None:
+        return []
+    return [("upgrade_scan_index_files_total", "Source files served from / rescanned into the scan index", {"result": k}, v)
+            for k, v in _INDEX.stats.items()]
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# scheduler.py – v1 (ProjectReference DAG → levels + bounded parallel workers)
+
+import re, pathlib, time, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+PROJECT_REF_RE = re.compile(r'<ProjectReference Include="(.*?)"')
+
+# -------------------------------------------------------------------------
+# Graph
+# -------------------------------------------------------------------------
+def build_project_graph(files):
+    """
+    Returns (nodes, deps) where nodes maps a resolved csproj key to its Path
+    and deps maps each key to the in-solution projects it references.
+    """
+    nodes = {str(pathlib.Path(f).resolve()): pathlib.Path(f) for f in files}
+    deps = {}
+    for key, proj in nodes.items():
+        txt = proj.read_text(errors="ignore")
+        refs = []
+        for r in PROJECT_REF_RE.findall(txt):
+            dep = str((proj.parent / r.replace("\\", "/")).resolve())
+            if dep in nodes and dep != key and dep not in refs:
+                refs.append(dep)
+        deps[key] = refs
+    return nodes, deps
+
+def compute_levels(deps):
+    """
+    Level 0 = projects without in-solution references, level N = projects whose
+    deepest reference sits on level N-1. Cycles are reported and flattened into
+    one trailing level so nothing is dropped.
+    """
+    level, pending = {}, set(deps)
+    while pending:
+        ready = [n for n in pending if all(d in level for d in deps[n])]
+        if not ready:
+            print(f"⚠️ ProjectReference cycle between {len(pending)} project(s); scheduling them last")
+            top = max(level.values(), default=-1) + 1
+            for n in pending:
+                level[n] = top
+            break
+        for n in ready:
+            level[n] = 1 + max((level[d] for d in deps[n]), default=-1)
+        pending.difference_update(ready)
+
+    levels = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for n in sorted(level):
+        levels[level[n]].append(n)
+    return levels
+
+def critical_path(deps, levels, weights=None):
+    """
+    Longest weighted dependency chain. weights maps node → cost (default 1);
+    returns (path from root to leaf, total cost).
+    """
+    weights = weights or {}
+    best, prev = {}, {}
+    for lvl in levels:
+        for n in lvl:
+            head = max((d for d in deps[n] if d in best), key=lambda d: best[d], default=None)
+            best[n] = weights.get(n, 1) + (best[head] if head else 0)
+            prev[n] = head
+    if not best:
+        return [], 0
+    node = max(best, key=best.get)
+    total, path = best[node], []
+    while node:
+        path.append(node)
+        node = prev[node]
+    return path[::-1], total
+
+def estimate_weights(nodes):
+    """Rough per-project cost before anything has run: 1 + number of .cs files."""
+    return {k: 1 + sum(1 for _ in p.parent.rglob("*.cs")) for k, p in nodes.items()}
+
+def _remaining_cost(deps, levels, weights):
+    """Cost of the longest chain starting at each node (used as run priority)."""
+    dependents = {n: [] for n in deps}
+    for n, ds in deps.items():
+        for d in ds:
+            dependents[d].append(n)
+    tail = {}
+    for lvl in reversed(levels):
+        for n in lvl:
+            tail[n] = weights.get(n, 1) + max((tail[c] for c in dependents[n] if c in tail), default=0)
+    return tail
+
+# -------------------------------------------------------------------------
+# Execution
+# -------------------------------------------------------------------------
+def run_dag(nodes, deps, worker, jobs=1, weights=None):
+    """
+    Runs worker(path) for every node once all of its references finished,
+    with at most `jobs` workers in flight. Ready projects on the longest
+    remaining chain start first. A failing dependency does not block its
+    dependents (each project still gets its own report / crash log).
+    Returns {node: elapsed_seconds}.
+    """
+    jobs = max(1, int(jobs))
+    levels = compute_levels(deps)
+    priority = _remaining_cost(deps, levels, weights or {})
+    done, running, durations = set(), {}, {}
+    lock = threading.Lock()
+
+    def _run(node):
+        t0 = time.time()
+        try:
+            worker(nodes[node])
+        except Exception as e:
+            print(f"❌ Worker for {nodes[node].name} raised: {e}")
+        finally:
+            with lock:
+                durations[node] = time.time() - t0
+
+    # Cycle members are placed on the last level; treat deps onto same-or-later
+    # levels as satisfied so they cannot deadlock.
+    level_of = {n: i for i, lvl in enumerate(levels) for n in lvl}
+    blocking = {n: [d for d in deps[n] if level_of[d] < level_of[n]] for n in deps}
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="proj") as pool:
+        waiting = set(nodes)
+        while waiting or running:
+            ready = sorted((n for n in waiting if all(d in done for d in blocking[n])),
+                           key=lambda n: (-priority[n], n))
+            for n in ready[:jobs - len(running)]:
+                waiting.discard(n)
+                running[pool.submit(_run, n)] = n
+            if not running:
+                break
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done.add(running.pop(fut))
+    return durations
+
+def describe_plan(nodes, deps, jobs, weights=None):
+    """Prints levels and the predicted critical path; returns levels."""
+    levels = compute_levels(deps)
+    print(f"🗺️ Build graph: {len(nodes)} project(s) in {len(levels)} level(s), jobs={jobs}")
+    for i, lvl in enumerate(levels):
+        print(f"   L{i}: " + ", ".join(nodes[n].stem for n in lvl))
+    path, cost = critical_path(deps, levels, weights)
+    if path:
+        print(f"🧵 Critical path ({len(path)} project(s)): " + " → ".join(nodes[n].stem for n in path))
+    return levels
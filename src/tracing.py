@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# tracing.py – v1 (lightweight spans: wall / thread CPU / peak RSS, Chrome-trace export, report tables)
+
+import os, json, time, asyncio, threading, functools, contextlib, contextvars
+from collections import deque
+try:
+    import resource
+except ImportError:                 # not on Windows
+    resource = None
+
+TRACE_ENABLED = os.getenv("UPGRADE_TRACE", "1") == "1"
+# UPGRADE_TRACE=0 turns off the span buffer, CPU/RSS sampling and the export;
+# span listeners (metrics.py) are still fed.
+# Finished spans kept for the run's export and report tables; a ring buffer,
+# so a long run keeps only the newest ones (the export counts the dropped).
+TRACE_MAX_EVENTS = int(os.getenv("UPGRADE_TRACE_MAX_EVENTS", "200000"))
+
+_t0 = time.perf_counter()
+_events = deque(maxlen=TRACE_MAX_EVENTS)
+_dropped = 0
+_events_lock = threading.Lock()
+# Context tags live in a ContextVar so they follow asyncio tasks and
+# asyncio.to_thread (the LLM client's loop); plain pools need bind().
+_tags = contextvars.ContextVar("trace_tags", default={})
+_listeners = []
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)   # KiB on Linux
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+@contextlib.contextmanager
+def context(**tags):
+    """Tags (e.g. project=...) attached to every span opened inside the block."""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+def add_listener(fn):
+    """fn(event) is called for every finished span (e.g. metrics.py turns them into histograms)."""
+    _listeners.append(fn)
+
+def bind(fn):
+    """Carries the caller's context tags into fn when it runs on another thread (pools)."""
+    tags = _tags.get()
+    @functools.wraps(fn)
+    def run(*a, **kw):
+        with context(**tags):
+            return fn(*a, **kw)
+    return run
+
+@contextlib.contextmanager
+def span(name: str, cat: str = "phase", **args):
+    """
+    Records one complete event: wall time, CPU time of the calling thread
+    (children and other threads are not included) and the process's peak RSS
+    when the span ends. Inside an event loop the thread's CPU is shared by
+    every task, so async spans record none.
+
+    With UPGRADE_TRACE=0 nothing is buffered, but listeners (metrics.py)
+    still get the span's wall time.
+    """
+    if not TRACE_ENABLED:
+        if not _listeners:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            event = {"name": name, "cat": cat, "start": start - _t0, "wall": time.perf_counter() - start,
+                     "cpu": None, "rss_peak_mb": None, "tid": threading.get_ident(),
+                     "thread": threading.current_thread().name, "tags": _tags.get(), "args": args}
+            for fn in _listeners:
+                fn(event)
+        return
+    start = time.perf_counter()
+    cpu0 = None if _in_event_loop() else time.thread_time()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        event = {
+            "name": name, "cat": cat, "start": start - _t0, "wall": end - start,
+            "cpu": None if cpu0 is None else time.thread_time() - cpu0, "rss_peak_mb": _peak_rss_mb(),
+            "tid": threading.get_ident(), "thread": threading.current_thread().name,
+            "tags": _tags.get(), "args": args,
+        }
+        global _dropped
+        with _events_lock:
+            if len(_events) == _events.maxlen:
+                _dropped += 1
+            _events.append(event)
+        for fn in _listeners:
+            fn(event)
+
+def traced(name=None, cat="call"):
+    """Decorator form of span()."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+        @functools.wraps(fn)
+        def run(*a, **kw):
+            with span(label, cat):
+                return fn(*a, **kw)
+        return run
+    return wrap
+
+def subprocess_span(cmd):
+    """span() named after the tool and its verb, e.g. "dotnet build"."""
+    argv = [str(c) for c in cmd]
+    tool = os.path.basename(argv[0]) if argv else "?"
+    verb = next((a for a in argv[1:] if not a.startswith("-")), "")
+    return span(f"{tool} {verb}".strip(), "subprocess", argv=" ".join(argv)[:300])
+
+def events(**tags):
+    with _events_lock:
+        evs = list(_events)
+    return [e for e in evs if all(e["tags"].get(k) == v for k, v in tags.items())]
+
+# -------------------------------------------------------------------------
+# Export
+# -------------------------------------------------------------------------
+def dropped() -> int:
+    """Spans pushed out of the ring buffer so far."""
+    with _events_lock:
+        return _dropped
+
+def export_chrome_trace(path) -> int:
+    """
+    Writes a Chrome / Perfetto trace (complete "X" events, µs) of the spans
+    still buffered (at most TRACE_MAX_EVENTS); returns the event count.
+    """
+    evs = events()
+    pid = os.getpid()
+    out = [{"name": "process_name", "ph": "M", "pid": pid,
+            "args": {"name": "upgrade-orchestrator", "dropped_spans": dropped()}}]
+    for tid, tname in {e["tid"]: e["thread"] for e in evs}.items():
+        out.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}})
+    for e in evs:
+        out.append({
+            "name": e["name"], "cat": e["cat"], "ph": "X", "pid": pid, "tid": e["tid"],
+            "ts": round(e["start"] * 1e6, 1), "dur": round(e["wall"] * 1e6, 1),
+            "args": {**e["tags"], **{k: str(v) for k, v in e["args"].items()},
+                     "cpu_ms": None if e["cpu"] is None else round(e["cpu"] * 1000, 2),
+                     "rss_peak_mb": e["rss_peak_mb"]},
+        })
+    with open(path, "w") as f:
+        json.dump({"traceEvents": out, "displayTimeUnit": "ms"}, f)
+    return len(evs)
+
+def summarize(evs):
+    """[(cat, name, count, wall_s, cpu_s or None, peak_rss_mb)] ordered by first start."""
+    rows = {}
+    for e in sorted(evs, key=lambda e: e["start"]):
+        r = rows.setdefault((e["cat"], e["name"]), [0, 0.0, None, None])
+        r[0] += 1
+        r[1] += e["wall"]
+        if e["cpu"] is not None:
+            r[2] = (r[2] or 0.0) + e["cpu"]
+        if e["rss_peak_mb"] is not None:
+            r[3] = max(r[3] or 0, e["rss_peak_mb"])
+    return [(cat, name, n, wall, cpu, rss) for (cat, name), (n, wall, cpu, rss) in rows.items()]
+
+def markdown_table(**tags) -> str:
+    rows = summarize(events(**tags))
+    if not rows:
+        return ""
+    lines = ["| Span | Kind | Count | Wall (s) | CPU (s) | Peak RSS (MB) |",
+             "|---|---|---:|---:|---:|---:|"]
+    for cat, name, n, wall, cpu, rss in rows:
+        cpu = f"{cpu:.3f}" if cpu is not None else "–"
+        lines.append(f"| {name} | {cat} | {n} | {wall:.3f} | {cpu} | {rss if rss is not None else '–'} |")
+    return "\n".join(lines)
@@ -1,42 +1,89 @@
 #!/usr/bin/env python3
-import subprocess, pathlib, shutil, json, re, os
+import subprocess, pathlib, re, os, threading
+from msbuild_log import BuildResult
+from tracing import subprocess_span
+import live_log
 
 def run_cmd(cmd, cwd=None, timeout=None):
-    p = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd, timeout=timeout)
+    with subprocess_span(cmd):
+        p = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd, timeout=timeout)
     return (p.stdout or "") + (p.stderr or "")
 
 def file_text(path: pathlib.Path) -> str:
     return pathlib.Path(path).read_text(errors="ignore")
 
+def _unshare(path: pathlib.Path):
+    """
+    Workspace files may be hardlinks into the input tree (see workspace.py):
+    the link is dropped before the first write so the original stays untouched.
+    Returns the mode to restore on the new file, or None.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    if st.st_nlink > 1:
+        path.unlink()
+        return st.st_mode & 0o7777
+    return None
+
 def write_text(path: pathlib.Path, text: str):
-    pathlib.Path(path).write_text(text)
+    path = pathlib.Path(path)
+    mode = _unshare(path)
+    path.write_text(text)
+    if mode is not None:
+        os.chmod(path, mode)
+
+# In-memory rollback journal (replaces <file>.bak copies in the workspace)
+_journal = {}
+_journal_lock = threading.Lock()
 
 def backup_file(path: pathlib.Path) -> pathlib.Path:
-    backup = pathlib.Path(str(path) + ".bak")
-    shutil.copyfile(path, backup)
-    return backup
+    path = pathlib.Path(path)
+    data = path.read_bytes()
+    with _journal_lock:
+        _journal[path.resolve()] = data
+    return path
 
 def restore_backup(path: pathlib.Path):
-    bak = pathlib.Path(str(path) + ".bak")
-    if bak.exists():
-        shutil.copyfile(bak, path)
+    path = pathlib.Path(path)
+    with _journal_lock:
+        data = _journal.get(path.resolve())
+    if data is not None:
+        mode = _unshare(path)
+        path.write_bytes(data)
+        if mode is not None:
+            os.chmod(path, mode)
+
+def discard_backups(root: pathlib.Path):
+    """Drops journal entries under root (called when a workspace is removed)."""
+    root = pathlib.Path(root).resolve()
+    with _journal_lock:
+        for key in [k for k in _journal if k == root or root in k.parents]:
+            del _journal[key]
 
 def ensure_dir(p: pathlib.Path):
     p.mkdir(parents=True, exist_ok=True)
 
-def extract_error_codes(log: str):
+def extract_error_codes(log):
+    """log: raw text or a msbuild_log.BuildResult (uses its parsed records)."""
+    if isinstance(log, BuildResult):
+        return log.error_codes()
     return re.findall(r"error\s+([A-Z]+\d{3,5})", log or "")
 
-def has_build_success(log: str) -> bool:
+def has_build_success(log) -> bool:
+    if isinstance(log, BuildResult):
+        return log.ok
+    log = log or ""
     return ("Build succeeded" in log) or (" 0 Error(s)" in log) or ("build succeeded" in log.lower())
 
+def log_text(log) -> str:
+    """Raw text of a log that may be a string, a BuildResult or None."""
+    return str(log) if log else ""
+
 def list_csprojs(root: pathlib.Path):
     return list(root.rglob("*.csproj"))
 
-import requests
-
 def push_live_log(line: str):
-    try:
-        requests.post("http://127.0.0.1:8899/push-log", json={"message": line})
-    except:
-        pass
+    """Queues a line for the dashboard's live log; never blocks on the network (see live_log.py)."""
+    live_log.push(line)
@@ -1,56 +1,243 @@
 #!/usr/bin/env python3
-# Layer 4 Verifier v3
-import re, pathlib, time
-from utils import run_cmd, file_text, write_text, backup_file, restore_backup, has_build_success
-from llm_client import query_llm
+# Layer 4 Verifier v4 (error-code index, fixer registry, concurrent AI micro-fixes, one build per round)
+import os, re, json, pathlib
+from utils import file_text, write_text, backup_file, restore_backup
+from llm_client import query_llm_batch
+from autofix_engine import _ensure_packages
+from diag_compress import message_template
+import build_executor
+
+# Distinct errors sent to the model per round (requests run concurrently).
+MICRO_FIXES_PER_ROUND = int(os.getenv("UPGRADE_VERIFIER_MICRO_FIXES", "4"))
+SNIPPET_LINES = 3
 
 def _build(proj_dir: pathlib.Path):
-    log = run_cmd(["dotnet","build","--nologo","-v","m","--no-incremental"], cwd=proj_dir)
-    return has_build_success(log), log
-
-def _ensure_pkg(csproj: pathlib.Path, pkg: str):
-    text = file_text(csproj)
-    if pkg in text: return False
-    line = f'  <PackageReference Include="{pkg}" Version="9.0.0" />\n'
-    text = text.replace("</Project>", f"<ItemGroup>\n{line}</ItemGroup>\n</Project>")
-    write_text(csproj, text)
-    print(f"📦 Ensured {pkg}")
-    return True
-
-def _deterministic_pass(proj_dir: pathlib.Path, log: str) -> bool:
-    csproj = next(proj_dir.rglob("*.csproj"))
+    """Returns (ok, msbuild_log.BuildResult)."""
+    return build_executor.build(proj_dir, phase="verifier")
+
+def _source(proj_dir: pathlib.Path, diag_file: str):
+    """
+    Workspace file a diagnostic points at (MSBuild paths are absolute, but be
+    lenient). Files outside proj_dir (SDK .targets, NuGet cache) are never returned.
+    """
+    root = proj_dir.resolve()
+    p = pathlib.Path(diag_file)
+    if p.is_absolute() or p.is_file():
+        p = p.resolve()
+        return p if p.is_file() and p.is_relative_to(root) else None
+    name = p.name
+    return next((c.resolve() for c in root.rglob(name) if "obj" not in c.parts and "bin" not in c.parts), None) if name else None
+
+def _diag_path(d) -> pathlib.Path:
+    """Resolved path a diagnostic points at (for matching against edited files)."""
+    return pathlib.Path(d.file).resolve()
+
+# -------------------------------------------------------------------------
+# Deterministic fixers, keyed by error code
+# fixer(proj_dir, csproj, by_file) -> bool; by_file = {file: [Diagnostic, ...]}
+# -------------------------------------------------------------------------
+FIXERS = {}
+
+def fixer(*codes):
+    def register(fn):
+        for code in codes:
+            FIXERS.setdefault(code, []).append(fn)
+        return fn
+    return register
+
+# type / name not found → the package that provides it
+MISSING_TYPE_PACKAGES = {
+    "SqlConnection": ["Microsoft.Data.SqlClient"],
+    "ConfigurationManager": ["Microsoft.Extensions.Configuration",
+                             "Microsoft.Extensions.Configuration.Json",
+                             "Microsoft.Extensions.Configuration.Binder"],
+}
+
+@fixer("CS0246", "CS0103", "CS0234", "CS0012")
+def _missing_package(proj_dir, csproj, by_file):
+    messages = " ".join(d.message for ds in by_file.values() for d in ds)
+    needed = [(pkg, "9.0.0") for name, pkgs in MISSING_TYPE_PACKAGES.items() if name in messages for pkg in pkgs]
+    return bool(_ensure_packages(csproj, needed))
+
+@fixer("CS0117", "CS0120", "CS0246", "CS0103")
+def _legacy_http_context(proj_dir, csproj, by_file):
     fixed = False
-    if "SqlConnection" in log:
-        fixed |= _ensure_pkg(csproj, "Microsoft.Data.SqlClient")
-    if "ConfigurationManager" in log:
-        for pkg in ["Microsoft.Extensions.Configuration","Microsoft.Extensions.Configuration.Json","Microsoft.Extensions.Configuration.Binder"]:
-            fixed |= _ensure_pkg(csproj, pkg)
-    if "HttpContext" in log:
-        for cs in proj_dir.rglob("*.cs"):
-            t = file_text(cs)
-            if "HttpContext.Current" in t:
-                backup_file(cs)
-                write_text(cs, t.replace("HttpContext.Current", "/* Inject IHttpContextAccessor */"))
-                fixed = True
+    for f, ds in by_file.items():
+        if not any("HttpContext" in d.message for d in ds):
+            continue
+        cs = _source(proj_dir, f)
+        t = file_text(cs) if cs else ""
+        if "HttpContext.Current" in t:
+            backup_file(cs)
+            write_text(cs, t.replace("HttpContext.Current", "/* Inject IHttpContextAccessor */"))
+            fixed = True
     return fixed
 
-def verify_and_retry(tmp_proj_dir: str, max_retries: int = 3):
+def _deterministic_pass(proj_dir: pathlib.Path, index: dict) -> set:
+    """Runs every registered fixer for the codes present; returns the codes something was done for."""
+    csproj = next(proj_dir.rglob("*.csproj"))
+    handled = set()
+    for code, by_file in index.items():
+        for fn in FIXERS.get(code, []):
+            if fn(proj_dir, csproj, by_file):
+                handled.add(code)
+    return handled
+
+# -------------------------------------------------------------------------
+# AI micro-fixes: one request per distinct error, all sent together
+# -------------------------------------------------------------------------
+MICRO_FIX_PROMPT = """You fix one C# compile error with the smallest possible edit.
+Reply with JSON only: {{"find": "<exact text copied from the snippet>", "replace": "<replacement>"}}
+
+Error:
+{error}
+
+{file}, lines {first}-{last}:
+{snippet}
+"""
+
+def _error_key(d):
+    return (d.code, pathlib.Path(d.file).name, message_template(d.message))
+
+def _distinct_errors(index: dict, skip_codes: set, limit: int, rejected=()):
+    """One representative per (code, file, message template) with a line in a .cs file; codes with most errors first."""
+    picked, seen = [], set(rejected)
+    for code, by_file in sorted(index.items(), key=lambda kv: -sum(len(v) for v in kv[1].values())):
+        if code in skip_codes:
+            continue
+        for f, ds in by_file.items():
+            for d in ds:
+                key = _error_key(d)
+                if key not in seen and d.line is not None and d.file.endswith(".cs"):
+                    seen.add(key)
+                    picked.append(d)
+    return picked[:limit]
+
+def _micro_fix_prompt(proj_dir, d):
+    cs = _source(proj_dir, d.file)
+    if cs is None:
+        return None, None
+    lines = file_text(cs).splitlines()
+    first, last = max(1, d.line - SNIPPET_LINES), min(len(lines), d.line + SNIPPET_LINES)
+    snippet = "\n".join(lines[first-1:last])
+    return cs, MICRO_FIX_PROMPT.format(error=d.render(), file=cs.name, first=first, last=last, snippet=snippet)
+
+def _parse_micro_fix(reply: str):
+    m = re.search(r"\{.*\}", reply or "", re.S)
+    if not m:
+        return None
+    try:
+        fix = json.loads(m.group(0))
+    except ValueError:
+        return None
+    find, repl = fix.get("find"), fix.get("replace")
+    if not isinstance(find, str) or not find.strip() or not isinstance(repl, str) or find == repl:
+        return None
+    return find, repl
+
+def _apply_near(text: str, find: str, repl: str, line: int):
+    """Replaces the occurrence of find closest to the error line; None if absent."""
+    starts = [m.start() for m in re.finditer(re.escape(find), text)]
+    if not starts:
+        return None
+    best = min(starts, key=lambda s: abs(text.count("\n", 0, s) + 1 - line))
+    return text[:best] + repl + text[best + len(find):]
+
+def _ai_micro_fixes(proj_dir: pathlib.Path, errors: list) -> dict:
+    """
+    Asks for all fixes concurrently and applies the usable ones.
+    Returns {file: [(error key, line, find, replace), ...]} in application order.
+    """
+    jobs = [(d,) + _micro_fix_prompt(proj_dir, d) for d in errors if d.file.endswith(".cs")]
+    jobs = [j for j in jobs if j[2]]
+    if not jobs:
+        return {}
+    replies = query_llm_batch([p for _, _, p in jobs], max_tokens=200, site="verifier")
+    touched = {}
+    for (d, cs, _), reply in zip(jobs, replies):
+        fix = _parse_micro_fix(reply)
+        if fix is None:
+            print(f"🤖 No usable micro-fix for {d.code} in {cs.name}: {(reply or '')[:80]}")
+            continue
+        new = _apply_near(file_text(cs), fix[0], fix[1], d.line)
+        if new is None:
+            print(f"🤖 Micro-fix for {d.code} in {cs.name} did not match the source")
+            continue
+        if cs not in touched:
+            backup_file(cs)
+        touched.setdefault(cs, []).append((_error_key(d), d.line) + fix)
+        write_text(cs, new)
+        print(f"🤖 AI micro-fix {d.code} in {cs.name}:{d.line}: '{fix[0][:40]}' → '{fix[1][:40]}'")
+    return touched
+
+def _signature(result) -> set:
+    return {_error_key(d) for d in result.errors}
+
+def _roll_back(touched: dict, result, before: set) -> set:
+    """
+    For every file with new errors, drops the AI edit nearest to each new
+    error and re-applies the others on the pre-AI text. Returns the error
+    keys whose fixes were dropped.
+    """
+    new_by_file = {}
+    for d in result.errors:
+        if _error_key(d) not in before:
+            new_by_file.setdefault(_diag_path(d), []).append(d.line or 0)
+    dropped = set()
+    for cs, edits in touched.items():
+        lines = new_by_file.get(cs)
+        if lines is None:
+            continue
+        bad = {min(range(len(edits)), key=lambda i: abs(edits[i][1] - ln)) for ln in lines}
+        restore_backup(cs)
+        text = file_text(cs)
+        for i, (key, line, find, repl) in enumerate(edits):
+            if i in bad:
+                dropped.add(key)
+                continue
+            text = _apply_near(text, find, repl, line) or text
+        write_text(cs, text)
+        print(f"↩️ Rolled back {len(bad)} AI micro-fix(es) in {cs.name}: they introduced new errors")
+    if not dropped:      # new errors outside the edited files: undo this round's AI edits entirely
+        for cs, edits in touched.items():
+            restore_backup(cs)
+            dropped.update(key for key, *_ in edits)
+        print(f"↩️ Rolled back AI micro-fixes in {len(touched)} file(s): they introduced new errors")
+    return dropped
+
+def verify_and_retry(tmp_proj_dir: str, max_retries: int = 3, log=None):
+    """
+    Each round: index errors by code/file, run the registered fixers, send the
+    remaining distinct errors to the model together, apply the replies, then
+    build once. AI edits in files that gained new errors are rolled back and
+    not asked for again. log: the caller's latest BuildResult, saves the first build.
+    """
     proj_dir = pathlib.Path(tmp_proj_dir)
-    for attempt in range(1, max_retries+1):
+    builds, rejected = 0, set()
+    if log is None:
         ok, log = _build(proj_dir)
+        builds += 1
+    else:
+        ok = log.ok
+    for attempt in range(1, max_retries+1):
         if ok:
-            print(f"✅ Build succeeded after {attempt-1} retries.")
+            print(f"✅ Build succeeded after {attempt-1} verifier round(s), {builds} build(s).")
             return True, log
-        print(f"🔍 Verifier pass {attempt}: scanning deterministic fixes…")
-        if _deterministic_pass(proj_dir, log):
-            ok2, log2 = _build(proj_dir)
-            if ok2:
-                print("✅ Build recovered deterministically.")
-                return True, log2
-            log = log2
-        err_line = next((l for l in log.splitlines() if "error " in l), "")
-        if err_line:
-            reply = query_llm(f"Suggest a minimal C# fix for:\n{err_line}", max_tokens=200)
-            print(f"🤖 AI micro-fix suggestion: {reply[:120]}")
-        time.sleep(1)
-    return _build(proj_dir)
+        index = log.by_code()
+        print(f"🔍 Verifier pass {attempt}: {len(log.errors)} error(s) across {len(index)} code(s)")
+        handled = _deterministic_pass(proj_dir, index)
+        touched = _ai_micro_fixes(proj_dir, _distinct_errors(index, handled, MICRO_FIXES_PER_ROUND, rejected))
+        if not handled and not touched:
+            print("🛑 Verifier: no further fixes to try.")
+            break
+
+        before = _signature(log)
+        ok, log = _build(proj_dir)
+        builds += 1
+        if touched and _signature(log) - before:
+            rejected |= _roll_back(touched, log, before)
+            ok, log = _build(proj_dir)
+            builds += 1
+    if ok:
+        print(f"✅ Build succeeded after {max_retries} verifier round(s), {builds} build(s).")
+    return ok, log
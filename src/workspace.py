@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# workspace.py – v2 (copy-free project workspaces: reflink → copy, opt-in hardlinks for inert files)
+
+import os, errno, time, shutil, pathlib, tempfile
+from utils import discard_backups
+
+# Never provisioned: build output, VCS/IDE state, test runs. packages/ stays:
+# packages.config projects point <HintPath> into it.
+EXCLUDE_DIRS = set(os.getenv("UPGRADE_WORKSPACE_EXCLUDE",
+                             "bin,obj,.git,.vs,.idea,TestResults,node_modules").split(","))
+# auto = reflink, else copy; or force one of reflink|hardlink|copy
+WORKSPACE_LINK = os.getenv("UPGRADE_WORKSPACE_LINK", "auto")
+# A hardlink shares the inode with the input: dotnet/NuGet writes outside
+# bin/obj (packages.lock.json, ...) or an in-place truncate would change the
+# original. hardlink mode therefore links only binary assets nothing in the
+# pipeline rewrites; every other file is copied.
+HARDLINK_SUFFIXES = set(os.getenv("UPGRADE_WORKSPACE_HARDLINK_EXT",
+                                  ".dll,.exe,.pdb,.nupkg,.snupkg,.zip,.png,.jpg,.jpeg,.gif,.ico,"
+                                  ".bmp,.woff,.woff2,.ttf,.eot,.otf,.mp3,.mp4,.pdf").split(","))
+# Hardlinks/reflinks need the workspace on the same filesystem as the input.
+WORKSPACE_DIR = os.getenv("UPGRADE_WORKSPACE_DIR") or None
+
+FICLONE = 0x40049409        # linux/fs.h _IOW(0x94, 9, int)
+_LINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP,
+                     errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY, errno.ENOSYS}
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close(); os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+def _copy(src, dst):
+    shutil.copy2(src, dst)
+
+METHODS = {"reflink": _reflink, "hardlink": _hardlink, "copy": _copy}
+
+def _ladder(link):
+    if link == "auto":
+        return ["reflink", "copy"] if os.name == "posix" else ["copy"]
+    if link not in METHODS:
+        raise ValueError(f"UPGRADE_WORKSPACE_LINK must be auto or one of {', '.join(METHODS)}")
+    return [link] if link == "copy" else [link, "copy"]
+
+def provision(src_dir: pathlib.Path, dst_dir: pathlib.Path, link=None, exclude=None) -> dict:
+    """
+    Mirrors src_dir into dst_dir without build artifacts. Files are
+    reflinked (copy-on-write, so no writer can reach the input) rather than
+    copied where the filesystem allows it; in hardlink mode only
+    HARDLINK_SUFFIXES files are linked. A method that fails for filesystem
+    reasons is dropped for the rest of the tree.
+    """
+    t0 = time.perf_counter()
+    exclude = EXCLUDE_DIRS if exclude is None else exclude
+    ladder = _ladder(link or WORKSPACE_LINK)
+    stats = {m: 0 for m in METHODS}
+    stats["skipped_dirs"] = 0
+
+    src_dir = pathlib.Path(src_dir)
+    for root, dirs, files in os.walk(src_dir):
+        kept = [d for d in dirs if d not in exclude]
+        stats["skipped_dirs"] += len(dirs) - len(kept)
+        dirs[:] = kept
+        out = pathlib.Path(dst_dir) / os.path.relpath(root, src_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src, dst = os.path.join(root, name), str(out / name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dst)
+                continue
+            shareable = os.path.splitext(name)[1].lower() in HARDLINK_SUFFIXES
+            for method in [m for m in ladder if m != "hardlink" or shareable]:
+                try:
+                    METHODS[method](src, dst)
+                    stats[method] += 1
+                    break
+                except OSError as e:
+                    if method == "copy" or e.errno not in _LINK_UNSUPPORTED:
+                        raise
+                    ladder.remove(method)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+def create_workspace(src_dir: pathlib.Path, prefix="upgrade_poc_"):
+    """New temp dir with the project provisioned under <tmp>/proj. Returns (tmp, stats)."""
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix=prefix, dir=WORKSPACE_DIR))
+    stats = provision(src_dir, tmp / "proj")
+    return tmp, stats
+
+def remove_workspace(tmp: pathlib.Path):
+    discard_backups(tmp)
+    shutil.rmtree(tmp, ignore_errors=True)
+
+def describe_stats(stats: dict) -> str:
+    files = sum(stats.get(m, 0) for m in METHODS)
+    return (f"{files} file(s) in {stats.get('seconds', 0)}s – {stats.get('reflink', 0)} reflinked, "
+            f"{stats.get('hardlink', 0)} hardlinked, {stats.get('copy', 0)} copied; "
+            f"{stats.get('skipped_dirs', 0)} artifact dir(s) skipped")
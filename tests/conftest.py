@@ -0,0 +1,6 @@
+import sys, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+for d in (ROOT / "src", ROOT / "bench", ROOT):         # ROOT: web_ui.app
+    if str(d) not in sys.path:
+        sys.path.insert(0, str(d))
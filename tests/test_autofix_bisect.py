@@ -0,0 +1,72 @@
+# Batched autofix must keep exactly the edits the one-build-per-edit loop would keep.
+
+import pathlib, types
+import pytest
+
+import autofix_engine
+from autofix_engine import _BatchBuilder, _run_batched
+
+def _diag(cs, token):
+    return types.SimpleNamespace(file=str(cs), code="CS0000", message=f"{token} does not compile")
+
+@pytest.fixture
+def compiler(monkeypatch):
+    """Fake build: every 'BAD<n>' / 'OLD' token on disk is a compile error."""
+    state = {"files": [], "builds": 0}
+    def validate_build(proj_dir, phase="autofix"):
+        state["builds"] += 1
+        errors = [_diag(cs, tok) for cs in state["files"] for tok in cs.read_text().split()
+                  if tok.startswith("BAD") or tok == "OLD"]
+        return not errors, types.SimpleNamespace(errors=errors)
+    monkeypatch.setattr(autofix_engine, "validate_build", validate_build)
+    return state
+
+def _project(tmp_path, compiler, texts):
+    originals = {}
+    for name, text in texts.items():
+        cs = tmp_path / name
+        cs.write_text(text)
+        originals[cs] = text
+    compiler["files"] = list(originals)
+    return originals
+
+def _edits(originals, spec):
+    """spec: [(rule id, file name, pattern, recommendation)]"""
+    by_name = {cs.name: cs for cs in originals}
+    return [(rid, by_name[f], patt, rec) for rid, f, patt, rec in spec]
+
+@pytest.mark.parametrize("bad", [set(), {3}, {0, 7}, {1, 2, 5}, set(range(8))])
+def test_bisect_keeps_only_clean_edits(tmp_path, compiler, bad):
+    originals = _project(tmp_path, compiler, {"A.cs": " ".join(f"t{i}" for i in range(8)) + "\n"})
+    spec = [(f"R{i}", "A.cs", f"t{i}", f"BAD{i}" if i in bad else f"ok{i}") for i in range(8)]
+    edits = _edits(originals, spec)
+    builder = _BatchBuilder(tmp_path, originals)
+    kept = builder.bisect([], edits)
+    assert [e[0] for e in kept] == [f"R{i}" for i in range(8) if i not in bad]
+    if not bad:
+        assert builder.builds == 1
+
+def test_known_bad_skips_the_redundant_build(tmp_path, compiler):
+    originals = _project(tmp_path, compiler, {"A.cs": "t0 t1\n"})
+    edits = _edits(originals, [("R0", "A.cs", "t0", "ok0"), ("R1", "A.cs", "t1", "BAD1")])
+    builder = _BatchBuilder(tmp_path, originals)
+    assert [e[0] for e in builder.bisect([], edits, known_bad=True)] == ["R0"]
+    # left half is built, right half is known to be the culprit
+    assert builder.builds == 1
+
+def test_preexisting_errors_do_not_block_edits(tmp_path, compiler):
+    originals = _project(tmp_path, compiler, {"A.cs": "OLD t0\n", "B.cs": "t1 t2\n"})
+    edits = _edits(originals, [("R0", "A.cs", "t0", "ok0"), ("R1", "B.cs", "t1", "BAD1"),
+                               ("R2", "B.cs", "t2", "ok2")])
+    builder = _BatchBuilder(tmp_path, originals)
+    assert [e[0] for e in builder.bisect([], edits)] == ["R0", "R2"]
+
+@pytest.mark.parametrize("mode", ["rule", "all"])
+def test_run_batched_writes_the_accepted_set(tmp_path, compiler, mode):
+    originals = _project(tmp_path, compiler, {"A.cs": "t0 t1\n", "B.cs": "t0 t2\n"})
+    edits = _edits(originals, [("R0", "A.cs", "t0", "ok0"), ("R0", "B.cs", "t0", "ok0"),
+                               ("R1", "A.cs", "t1", "BAD1"), ("R2", "B.cs", "t2", "ok2")])
+    plan = types.SimpleNamespace(originals=originals, edits=edits)
+    assert _run_batched(tmp_path, plan, mode) == ["R0", "R0", "R2"]
+    assert (tmp_path / "A.cs").read_text() == "ok0 t1\n"
+    assert (tmp_path / "B.cs").read_text() == "ok0 ok2\n"
@@ -0,0 +1,110 @@
+# Offline tests for build_executor against bench/fake_dotnet.py.
+
+import pathlib, types
+import pytest
+
+import build_executor
+import msbuild_log
+
+FAKE_DOTNET = pathlib.Path(__file__).resolve().parent.parent / "bench" / "fake_dotnet.py"
+
+CSPROJ = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup><TargetFramework>net9.0</TargetFramework></PropertyGroup>
+</Project>
+"""
+
+@pytest.fixture
+def proj(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_executor, "DOTNET_EXE", str(FAKE_DOTNET))
+    monkeypatch.setenv("FAKE_DOTNET_STATE", str(tmp_path / "fake_state"))
+    monkeypatch.setenv("FAKE_DOTNET_STARTUP_S", "0")
+    monkeypatch.setenv("FAKE_DOTNET_WARM_S", "0")
+    monkeypatch.setenv("FAKE_DOTNET_RESTORE_S", "0")
+    monkeypatch.setenv("FAKE_DOTNET_COMPILE_MS", "0")
+    d = tmp_path / "proj"
+    d.mkdir()
+    (d / "App.csproj").write_text(CSPROJ)
+    (d / "Program.cs").write_text("class Program { static void Main() {} }\n")
+    yield d
+    build_executor.forget(d)
+
+@pytest.fixture
+def commands(monkeypatch):
+    """Records every build command line build_executor runs."""
+    seen = []
+    def run_build(cmd, **kw):
+        seen.append(cmd)
+        return msbuild_log.run_build(cmd, **kw)
+    monkeypatch.setattr(build_executor, "run_build", run_build)
+    return seen
+
+def _touch_project(proj):
+    csproj = proj / "App.csproj"
+    csproj.write_text(csproj.read_text() + "<!-- edited -->\n")
+
+def test_restore_skipped_until_project_files_change(proj, commands):
+    build_executor.restore(proj)
+    ok, _ = build_executor.build(proj)
+    assert ok
+    assert "--no-restore" in commands[-1]
+
+    ok, _ = build_executor.build(proj)
+    assert "--no-restore" in commands[-1]
+
+    _touch_project(proj)
+    ok, _ = build_executor.build(proj)
+    assert ok
+    assert "--no-restore" not in commands[-1]
+    ok, _ = build_executor.build(proj)
+    assert "--no-restore" in commands[-1]
+
+def test_missing_assets_falls_back_to_clean_restore(proj, commands):
+    build_executor.restore(proj)
+    (proj / "obj" / "project.assets.json").unlink()
+    ok, result = build_executor.build(proj, phase="initial")
+    assert ok
+    assert len(commands) == 2
+    assert "--no-incremental" in commands[1] and "--no-restore" not in commands[1]
+    assert build_executor.phase_stats(proj)["initial"]["fallbacks"] == 1
+
+def test_clean_fallback_at_most_once_per_fingerprint(proj, commands):
+    (proj / "Program.cs").write_text("class Program {} // fake-error MSB3027: Could not copy file\n")
+    build_executor.restore(proj)
+
+    ok, result = build_executor.build(proj, phase="autofix")
+    assert not ok and build_executor.is_stale(result)
+    assert len(commands) == 2
+
+    ok, _ = build_executor.build(proj, phase="autofix")
+    assert not ok
+    assert len(commands) == 3                       # same project files: no second fallback
+    assert build_executor.phase_stats(proj)["autofix"]["fallbacks"] == 1
+
+    _touch_project(proj)
+    build_executor.build(proj, phase="autofix")
+    assert len(commands) == 5                       # new fingerprint: one more fallback
+    assert build_executor.phase_stats(proj)["autofix"]["fallbacks"] == 2
+
+def test_code_errors_are_not_stale(proj, commands):
+    (proj / "Program.cs").write_text("class Program {} // fake-error CS0006: Metadata file could not be found\n")
+    build_executor.restore(proj)
+    ok, result = build_executor.build(proj)
+    assert not ok and not build_executor.is_stale(result)
+    assert len(commands) == 1
+
+def test_savings_measured_against_first_build(proj, monkeypatch):
+    ticks = iter([0.0, 10.0,        # cold initial build: 10s
+                  20.0, 22.0,       # warm post-fix builds: 2s and 3s
+                  30.0, 33.0])
+    monkeypatch.setattr(build_executor, "time", types.SimpleNamespace(perf_counter=lambda: next(ticks)))
+    build_executor.restore(proj)
+    build_executor.build(proj, phase="initial")
+    build_executor.build(proj, phase="post-fix")
+    build_executor.build(proj, phase="post-fix")
+
+    stats = build_executor.phase_stats(proj)
+    assert stats["initial"] == {"builds": 1, "seconds": 10.0, "fallbacks": 0, "saved_s": 0.0}
+    assert stats["post-fix"] == {"builds": 2, "seconds": 5.0, "fallbacks": 0, "saved_s": 15.0}
+    text = build_executor.describe_savings(proj)
+    assert text.startswith("cold build 10.0s;")
+    assert "post-fix: 2 build(s) in 5.0s, ~15.0s saved" in text
@@ -0,0 +1,35 @@
+# The tokenised scanner must return exactly what the legacy 3×findall scanner did.
+
+import random
+
+import code_scanner
+from bench_code_scanner import legacy_extract_code_sentences, generate_tree
+
+ALPHABET = "aAzZ09_.(( \n;Using.xX"
+SNIPPETS = ["using System.Data.SqlClient;", "a.b.c(", "Foo.Bar.Baz.Qux(", "usingFoo.Bar(",
+            "X.y", "Abcd.e", "Ab.cd.ef.gh", "call_1(", "..A.b..C.d(", "Html.Raw((x))"]
+
+def _write(tmp_path, texts):
+    for i, text in enumerate(texts):
+        (tmp_path / f"F{i}.cs").write_text(text)
+
+def test_known_snippets(tmp_path):
+    _write(tmp_path, SNIPPETS)
+    assert code_scanner.extract_code_sentences(tmp_path, jobs=1) == legacy_extract_code_sentences(tmp_path)
+
+def test_fuzz_against_legacy(tmp_path):
+    rnd = random.Random(3)
+    texts = ["".join(rnd.choice(ALPHABET + "".join(SNIPPETS)) for _ in range(rnd.randint(0, 400)))
+             for _ in range(60)]
+    _write(tmp_path, texts)
+    code_scanner._TOKEN_CACHE.clear()
+    assert code_scanner.extract_code_sentences(tmp_path, jobs=1) == legacy_extract_code_sentences(tmp_path)
+
+def test_pool_matches_in_process(tmp_path):
+    generate_tree(tmp_path, files=code_scanner.PARALLEL_MIN_FILES + 10, lines=8)
+    code_scanner.configure_pool(jobs=1, workers=2)
+    try:
+        parallel = code_scanner.extract_code_sentences(tmp_path, jobs=2)
+    finally:
+        code_scanner.shutdown_pool()
+    assert parallel == code_scanner.extract_code_sentences(tmp_path, jobs=1) == legacy_extract_code_sentences(tmp_path)
@@ -0,0 +1,52 @@
+# diag_compress: clustering, the token budget and round-robin over error codes.
+
+import pytest
+
+from diag_compress import compress_diagnostics, cluster_diagnostics, count_tokens, message_template
+from msbuild_log import parse_text
+
+def _log(spec):
+    """spec: [(severity, code, file, line, message)]"""
+    return "\n".join(f"/src/App/{f}({line},1): {sev} {code}: {msg} [/src/App/App.csproj]"
+                     for sev, code, f, line, msg in spec)
+
+MANY = _log([("error", "CS0103", "A.cs", i, f"The name 'v{i}' does not exist in the current context")
+             for i in range(1, 40)]
+            + [("error", "CS0246", f"B{i}.cs", 1, f"The type or namespace name 'T{i}' could not be found")
+               for i in range(6)]
+            + [("error", "CS1061", "C.cs", 9, "'Foo' does not contain a definition for 'Bar'"),
+               ("warning", "CS8618", "D.cs", 2, "Non-nullable property 'X' must contain a non-null value")]
+            + [("error", "CS0103", "E.cs", 4, "The name 'w' does not exist in the current context")])
+
+def test_message_template():
+    assert message_template("The name 'Foo' does not exist at 12") == message_template("The name \"Bar\" does not exist at 7")
+
+def test_clusters_fold_repeats():
+    clusters = cluster_diagnostics(parse_text(MANY).diagnostics)
+    a = clusters[0]
+    assert (a["code"], a["file"], a["count"], a["lines"][:3]) == ("CS0103", "A.cs", 39, ["1", "2", "3"])
+    assert [c["code"] for c in clusters].count("CS0246") == 6
+    assert len(clusters) == 10
+
+@pytest.mark.parametrize("budget", [20, 40, 60, 100, 200, 1000])
+def test_output_fits_the_budget(budget):
+    out = compress_diagnostics(MANY, budget)
+    assert sum(count_tokens(l) + 1 for l in out.splitlines()) - 1 <= budget
+
+def test_every_code_before_any_second_cluster():
+    lines = compress_diagnostics(MANY, 1000).splitlines()
+    assert "CS0103, CS0246, CS1061, CS8618" in lines[0]
+    codes = [l.split(": ")[1].split()[1] for l in lines[1:]]
+    # errors round-robin by total count, then warnings
+    assert codes[:3] == ["CS0103", "CS0246", "CS1061"]
+    assert codes[3:5] == ["CS0103", "CS0246"] and codes[-1] == "CS8618"
+    assert "[x39, lines 1,2,3,4,5,6,7,8]" in lines[1]
+
+def test_small_budget_keeps_distinct_codes_and_reports_the_rest():
+    lines = compress_diagnostics(MANY, 90).splitlines()
+    assert lines[-1].startswith("... ") and lines[-1].endswith("more group(s) omitted")
+    assert {l.split(": ")[1].split()[1] for l in lines[1:-1]} >= {"CS0103", "CS0246"}
+
+def test_plain_text_fallback_and_empty():
+    assert compress_diagnostics("boom\nboom\n  \nbang", 100) == "boom\nbang"
+    assert compress_diagnostics("", 100) == "" and compress_diagnostics(MANY, 0) == ""
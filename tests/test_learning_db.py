@@ -0,0 +1,76 @@
+# learning_db: the rank index, the bulk lookup and SubstringIndex must agree with
+# the plain SQL they replace.
+
+import random, sqlite3
+import pytest
+
+import learning_db
+from learning_db import SubstringIndex, RANK_DECAY
+
+WORDS = ["System", "Web", "Json", "Newtonsoft", "Sql", "Data", "Http", "Client", "a_b", "x%y", "Ünï"]
+
+def _pattern(rnd):
+    return ".".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 3)))
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(learning_db, "DB_PATH", tmp_path / "memory.db")
+    learning_db.init_db()
+    rnd = random.Random(7)
+    rows = [(f"R{i}", _pattern(rnd), rnd.choice(["fix A", "fix B", "fix C"]), "P", "[]",
+             rnd.random() < 0.7, round(rnd.random(), 3), f"-{i * 37 % 900} hours")
+            for i in range(400)]
+    conn = learning_db.get_conn()
+    with conn:
+        conn.executemany("""INSERT INTO ai_rules_log(rule_id,pattern,recommendation,project,error_codes,
+                            build_success,confidence,created_at) VALUES (?,?,?,?,?,?,?,datetime('now', ?))""", rows)
+    learning_db.rebuild_rule_stats()
+    yield conn
+    learning_db._drop_snapshot()
+
+def _expected(conn, where, params, limit, decay=RANK_DECAY):
+    """Reference: score every matching rule_stats row and sort, as before the rank index."""
+    rows = conn.execute(learning_db.SCORED_STATS_SQL + f" WHERE {where}", params).fetchall()
+    scored = sorted(learning_db._score(rows, decay), key=lambda x: (-x[2], x[3]))
+    return [(p, rec, s) for p, rec, s, _ in scored[:limit]]
+
+def _same(got, want):
+    assert [(p, rec) for p, rec, _ in got] == [(p, rec) for p, rec, _ in want]
+    assert [s for *_, s in got] == pytest.approx([s for *_, s in want], rel=1e-4)
+
+QUERIES = ["", "json", "JSON", "Sql.Data", "a_b", "x%y", "ünï", "Ünï", "Missing", "Web.W"]
+
+@pytest.mark.parametrize("q", QUERIES)
+def test_rank_index_matches_full_scoring(db, q):
+    _same(learning_db.query_successful_scored(q, limit=7), _expected(db, "pattern LIKE ?", (f"%{q}%",), 7))
+    _same(learning_db.query_successful_scored(q, limit=7, decay_weight=0.5),
+          _expected(db, "pattern LIKE ?", (f"%{q}%",), 7, 0.5))
+
+def test_top_rules_exact_pattern(db):
+    for (pattern,) in db.execute("SELECT DISTINCT pattern FROM rule_stats LIMIT 20"):
+        _same(learning_db.query_top_rules(pattern, limit=2), _expected(db, "pattern = ?", (pattern,), 2))
+
+def test_bulk_matches_per_pattern(db):
+    bulk = learning_db.query_successful_scored_bulk(QUERIES, limit=5)
+    assert list(bulk) == QUERIES
+    for q in QUERIES:
+        _same(bulk[q], learning_db.query_successful_scored(q, limit=5))
+
+def test_bulk_snapshot_sees_new_results(db):
+    learning_db.query_successful_scored_bulk(["Brand.New"])
+    learning_db.log_rule_result("R-new", "Brand.New", "fix N", "P", [], True, 0.9)
+    assert [rec for _, rec, _ in learning_db.query_successful_scored_bulk(["brand.new"])["brand.new"]] == ["fix N"]
+    _same(learning_db.query_successful_scored_bulk(["Json"])["Json"], learning_db.query_successful_scored("Json"))
+
+def test_substring_index_matches_sqlite_like():
+    rnd = random.Random(6)
+    alphabet = "abAB_%.xÜü"
+    values = ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8))) for _ in range(300)]
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (i INTEGER, v TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?,?)", enumerate(values))
+    index = SubstringIndex(values)
+    for _ in range(300):
+        q = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 4)))
+        want = {i for (i,) in conn.execute("SELECT i FROM t WHERE v LIKE ?", (f"%{q}%",))}
+        assert set(index.search(q)) == want, q
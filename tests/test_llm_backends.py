@@ -0,0 +1,183 @@
+# Offline tests for llm_backends, llm_agent.LocalLLM and llm_client's in-process path.
+
+import threading, time
+import pytest
+
+import llm_backends
+from llm_backends import Completion, LlamaCppBackend, MockBackend
+
+class FakeLlama:
+    """Stands in for llama_cpp.Llama: streams a canned chat completion, tracks overlap."""
+    def __init__(self, reply="use IConfiguration instead", delay=0.01):
+        self.reply, self.delay = reply, delay
+        self.calls, self.active, self.max_active = [], 0, 0
+        self.n_tokens = 0
+        self._count = threading.Lock()
+
+    def create_chat_completion(self, messages, max_tokens, temperature, stream):
+        self.calls.append({"messages": messages, "max_tokens": max_tokens,
+                           "temperature": temperature, "stream": stream})
+        return self._stream(messages[0]["content"], chat=True)
+
+    def create_completion(self, prompt, max_tokens, temperature, stream):
+        self.calls.append({"prompt": prompt, "max_tokens": max_tokens,
+                           "temperature": temperature, "stream": stream})
+        return self._stream(prompt, chat=False)
+
+    def _stream(self, prompt, chat):
+        with self._count:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if chat:
+                yield {"choices": [{"delta": {"role": "assistant"}}]}
+            words = self.reply.split(" ")
+            for i, w in enumerate(words):
+                time.sleep(self.delay)
+                piece = w + (" " if i < len(words) - 1 else "")
+                yield {"choices": [{"delta": {"content": piece}} if chat else {"text": piece}]}
+            self.n_tokens = len(prompt.split()) + len(words)
+        finally:
+            with self._count:
+                self.active -= 1
+
+@pytest.fixture
+def fake_llama(monkeypatch):
+    """LlamaCppBackend._load returns one FakeLlama; loads are counted."""
+    fake, loads = FakeLlama(), []
+    def load(self):
+        loads.append(self)
+        self.load_s = 0.5
+        return fake
+    monkeypatch.setattr(LlamaCppBackend, "_load", load)
+    monkeypatch.setattr(llm_backends, "_LLAMA", {})
+    fake.loads = loads
+    return fake
+
+@pytest.fixture
+def backend_setting(monkeypatch):
+    monkeypatch.setattr(llm_backends, "LLM_BACKEND", llm_backends.LLM_BACKEND)
+    monkeypatch.setattr(llm_backends, "_BACKEND", None)
+    def select(name):
+        monkeypatch.setattr(llm_backends, "LLM_BACKEND", name)
+        monkeypatch.setattr(llm_backends, "_BACKEND", None)
+    return select
+
+# -------------------------------------------------------------------------
+# Selection
+# -------------------------------------------------------------------------
+def test_http_backend_is_handled_by_llm_client(backend_setting):
+    backend_setting("http")
+    assert llm_backends.get_backend() is None
+
+def test_in_process_backends_are_created_once(backend_setting, fake_llama):
+    backend_setting("mock")
+    b = llm_backends.get_backend()
+    assert isinstance(b, MockBackend) and llm_backends.get_backend() is b
+
+    backend_setting("llama_cpp")
+    b = llm_backends.get_backend()
+    assert isinstance(b, LlamaCppBackend) and llm_backends.get_backend() is b
+    assert fake_llama.loads == []                   # the model loads on first completion
+
+def test_unknown_backend_is_rejected(backend_setting):
+    backend_setting("vllm")
+    with pytest.raises(ValueError, match="LLM_BACKEND"):
+        llm_backends.get_backend()
+
+def test_set_backend(backend_setting):
+    mock = MockBackend()
+    llm_backends.set_backend(mock)
+    assert llm_backends.get_backend() is mock and llm_backends.LLM_BACKEND == "mock"
+    llm_backends.set_backend(None)
+    assert llm_backends.get_backend() is None and llm_backends.LLM_BACKEND == "http"
+
+# -------------------------------------------------------------------------
+# Completions and serialisation
+# -------------------------------------------------------------------------
+def test_llama_cpp_streams_chat_completion(fake_llama):
+    b = LlamaCppBackend(model_path="/models/phi.gguf")
+    deltas = []
+    c = b.complete("fix CS0246", max_tokens=64, temperature=0.1, on_delta=deltas.append)
+    assert isinstance(c, Completion)
+    assert c.text == "use IConfiguration instead" and "".join(deltas) == c.text
+    assert c.tokens == 3 and c.load_s == 0.5 and c.prompt_tokens == 2
+    assert fake_llama.calls == [{"messages": [{"role": "user", "content": "fix CS0246"}],
+                                 "max_tokens": 64, "temperature": 0.1, "stream": True}]
+    assert b.complete("again").load_s == 0.0        # load is paid by the first call only
+    assert b.model == "phi.gguf"
+
+def test_llama_cpp_serialises_concurrent_calls(fake_llama):
+    b = LlamaCppBackend(model_path="/models/phi.gguf")
+    threads = [threading.Thread(target=b.complete, args=(f"prompt {i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(fake_llama.loads) == 1
+    assert len(fake_llama.calls) == 4 and fake_llama.max_active == 1
+
+def test_mock_reuses_prompt_prefix():
+    b = MockBackend(reply=lambda p: "ok done")
+    first = b.complete("HEADER line one project A")
+    second = b.complete("HEADER line one project B", max_tokens=1)
+    assert first.reused_tokens == 0 and first.prompt_tokens == 5
+    assert second.reused_tokens == 4
+    assert second.text == "ok" and second.tokens == 1
+
+def test_mock_serialises_concurrent_calls():
+    active, peak, lock = [0], [0], threading.Lock()
+    def reply(prompt):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return "x"
+    b = MockBackend(reply=reply)
+    threads = [threading.Thread(target=b.complete, args=(str(i),)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 1
+
+# -------------------------------------------------------------------------
+# Callers
+# -------------------------------------------------------------------------
+def test_local_llm_summarize_uses_text_completion(fake_llama):
+    from llm_agent import LocalLLM
+    agent = LocalLLM("/models/phi.gguf", ctx=2048, threads=2)
+    assert agent.backend.n_ctx == 2048 and agent.backend.n_threads == 2
+    out = agent.summarize("App.csproj net6.0", "error CS0246", ["R1"])
+    assert out == "use IConfiguration instead"
+    [call] = fake_llama.calls
+    assert "messages" not in call                   # raw prompt, as Llama(prompt) took it
+    assert call["max_tokens"] == 400 and call["temperature"] == 0.2
+    assert call["prompt"].lstrip().startswith("You are an offline .NET")
+    assert "App.csproj net6.0" in call["prompt"] and "error CS0246" in call["prompt"]
+
+def test_local_llm_shares_the_loaded_model(backend_setting, fake_llama):
+    from llm_agent import LocalLLM
+    a, b = LocalLLM("/models/phi.gguf"), LocalLLM("/models/phi.gguf", ctx=1024)
+    assert a.backend is b.backend
+    assert LocalLLM("/models/phi.gguf", ctx=4096).backend is not a.backend    # needs a bigger context
+    a.summarize("p", "d", [])
+    b.summarize("p", "d", [])
+    assert len(fake_llama.loads) == 1
+
+    backend_setting("llama_cpp")
+    assert LocalLLM(llm_backends.LLM_MODEL_PATH).backend is llm_backends.get_backend()
+
+def test_query_llm_goes_through_installed_backend(backend_setting, monkeypatch):
+    import llm_client
+    monkeypatch.setattr(llm_client, "LLM_STREAM", False)
+    prompts = []
+    llm_backends.set_backend(MockBackend(reply=lambda p: prompts.append(p) or "[]"))
+    try:
+        assert llm_client.query_llm("generate rules", cache=False, site="rules") == "[]"
+        assert llm_client.query_llm_batch(["a", "b"], cache=False) == ["[]", "[]"]
+    finally:
+        llm_backends.set_backend(None)
+    assert prompts[0] == "generate rules" and sorted(prompts[1:]) == ["a", "b"]
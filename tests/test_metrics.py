@@ -0,0 +1,30 @@
+# metrics: span-fed histograms with and without the tracing buffer.
+
+import pytest
+
+import metrics
+import tracing
+
+def _count(hist, **labels):
+    return sum(s["count"] for s in hist.samples() if all(s["labels"].get(k) == v for k, v in labels.items()))
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_phase_and_db_histograms_follow_spans(monkeypatch, enabled):
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", enabled)
+    before = len(tracing.events())
+    phase0 = _count(metrics.PHASE_SECONDS, phase="9. learning db")
+    db0 = _count(metrics.DB_SECONDS, call="learning_db.test")
+
+    with tracing.span("9. learning db"):
+        tracing.traced("learning_db.test", "db")(lambda: None)()
+
+    assert _count(metrics.PHASE_SECONDS, phase="9. learning db") == phase0 + 1
+    assert _count(metrics.DB_SECONDS, call="learning_db.test") == db0 + 1
+    assert len(tracing.events()) == before + (2 if enabled else 0)
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("t", "", buckets=(1, 5))
+    for v in (0.5, 2, 7, 7):
+        h.observe(v, site="x")
+    [s] = h.samples()
+    assert s["buckets"] == [[1, 1], [5, 2], ["+Inf", 4]] and s["count"] == 4 and s["sum"] == 16.5
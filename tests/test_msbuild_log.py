@@ -0,0 +1,76 @@
+# msbuild_log: diagnostic parsing, the success verdict and run_build's timeout handling.
+
+import sys
+import pytest
+
+from msbuild_log import BuildResult, parse_line, parse_text, run_build
+
+def test_parse_line_fields():
+    d = parse_line("/src/App/Program.cs(12,5): error CS0246: The type or namespace name 'Foo' "
+                   "could not be found [/src/App/App.csproj]")
+    assert (d.code, d.severity, d.file, d.line, d.column) == ("CS0246", "error", "/src/App/Program.cs", 12, 5)
+    assert d.project == "/src/App/App.csproj"
+    assert d.message == "The type or namespace name 'Foo' could not be found"
+    assert d.render() == "/src/App/Program.cs(12,5): error CS0246: " + d.message
+
+@pytest.mark.parametrize("line, expected", [
+    ("C:\\src\\App\\Startup.cs(3): warning CS8618: Non-nullable field", ("CS8618", "warning", "C:\\src\\App\\Startup.cs", 3, None)),
+    ("CSC : error CS2012: Cannot open 'obj/App.dll' for writing", ("CS2012", "error", "CSC", None, None)),
+    ("/usr/share/dotnet/sdk/X.targets(266,5): Error netsdk1004: Assets file not found",
+     ("NETSDK1004", "error", "/usr/share/dotnet/sdk/X.targets", 266, 5)),
+])
+def test_parse_line_variants(line, expected):
+    d = parse_line(line)
+    assert (d.code, d.severity, d.file, d.line, d.column) == expected
+
+@pytest.mark.parametrize("line", ["Build FAILED.", "    3 Error(s)", "  App -> /bin/App.dll", ""])
+def test_non_diagnostics(line):
+    assert parse_line(line) is None
+
+def test_summary_repeats_are_deduplicated():
+    err = "/src/A.cs(1,1): error CS0103: The name 'X' does not exist [/src/A.csproj]"
+    warn = "/src/B.cs(2,1): warning CS0168: unused [/src/A.csproj]"
+    r = parse_text("\n".join([err, warn, "", "Build FAILED.", "", err, warn, "    1 Warning(s)", "    1 Error(s)"]))
+    assert r.error_codes() == ["CS0103"]
+    assert [d.code for d in r.warnings] == ["CS0168"]
+    assert list(r.by_code()) == ["CS0103"] and list(r.by_code()["CS0103"]) == ["/src/A.cs"]
+    assert not r.ok
+
+def test_ok_needs_marker_and_zero_exit():
+    def result(code):
+        r = BuildResult()
+        r.feed("Build succeeded.")
+        return r.finish(code)
+    assert result(0).ok
+    assert not result(1).ok and not result(-9).ok
+    assert parse_text("Build succeeded.\n    0 Error(s)").ok      # no exit code: marker only
+    assert not BuildResult().finish(0).ok
+
+def test_head_and_tail_are_bounded():
+    r = BuildResult(keep_head=100, keep_tail=100)
+    for i in range(1000):
+        r.feed(f"line {i}")
+    assert r.truncated and r.lines == 1000
+    assert r.text.startswith("line 0") and r.text.endswith("line 999")
+    assert "(log truncated)" in r.text and len(r.text) < 400
+
+# -------------------------------------------------------------------------
+# run_build
+# -------------------------------------------------------------------------
+def _py(code):
+    return [sys.executable, "-c", code]
+
+def test_run_build_streams_and_keeps_exit_code():
+    r = run_build(_py("print('/s/A.cs(1,1): error CS0103: nope'); print('Build FAILED.'); raise SystemExit(1)"))
+    assert r.returncode == 1 and r.error_codes() == ["CS0103"] and not r.ok
+
+def test_run_build_timeout_is_reported():
+    r = run_build(_py("import time; print('Build succeeded.', flush=True); time.sleep(30)"), timeout=0.5)
+    assert r.returncode != 0 and not r.ok
+    assert "timed out after 0.5s" in r.text
+
+def test_signal_kill_is_not_a_timeout():
+    r = run_build(_py("import os, signal; print('Build succeeded.', flush=True); os.kill(os.getpid(), signal.SIGKILL)"),
+                  timeout=30)
+    assert r.returncode < 0 and not r.ok
+    assert "timed out" not in r.text
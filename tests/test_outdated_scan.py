@@ -0,0 +1,62 @@
+# main.retarget_and_build: one restore, then the outdated scan on the restored workspace.
+
+import json, pathlib
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+import build_executor
+import workspace
+import main
+
+FAKE_DOTNET = pathlib.Path(__file__).resolve().parent.parent / "bench" / "fake_dotnet.py"
+
+CSPROJ = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup><TargetFramework>net6.0</TargetFramework></PropertyGroup>
+  <ItemGroup><PackageReference Include="Newtonsoft.Json" Version="12.0.3" /></ItemGroup>
+</Project>
+"""
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_executor, "DOTNET_EXE", str(FAKE_DOTNET))
+    for var, value in (("FAKE_DOTNET_STATE", str(tmp_path / "fake_state")), ("FAKE_DOTNET_STARTUP_S", "0"),
+                       ("FAKE_DOTNET_WARM_S", "0"), ("FAKE_DOTNET_RESTORE_S", "0"), ("FAKE_DOTNET_COMPILE_MS", "0")):
+        monkeypatch.setenv(var, value)
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "App.csproj").write_text(CSPROJ)
+    (src / "Program.cs").write_text("class Program { static void Main() {} }\n")
+    return src / "App.csproj"
+
+def test_outdated_scan_reads_restored_workspace_after_build(project, monkeypatch):
+    order = []
+    build = build_executor.build
+    def traced_build(*a, **kw):
+        out = build(*a, **kw)
+        order.append("build")
+        return out
+    scan = main.run_outdated_scan
+    def traced_scan(csproj):
+        order.append(("scan", pathlib.Path(csproj)))
+        return scan(csproj)
+    monkeypatch.setattr(build_executor, "build", traced_build)
+    monkeypatch.setattr(main, "run_outdated_scan", traced_scan)
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(main, "OUTDATED_POOL", pool)
+
+    diag, tmp, outdated = main.retarget_and_build(project, "net9.0")
+    try:
+        listed = json.loads(outdated.result())
+        ws_csproj = tmp / "proj" / "App.csproj"
+        assert order == ["build", ("scan", ws_csproj)]
+        [proj] = listed["projects"]
+        assert proj["path"] == str(ws_csproj)
+        # fake_dotnet answers from obj/project.assets.json: the workspace restore of the retargeted project
+        assert proj["frameworks"][0]["framework"] == "net9.0"
+        assert proj["frameworks"][0]["topLevelPackages"][0]["id"] == "Newtonsoft.Json"
+        assert not (project.parent / "obj").exists()        # the input tree is never restored
+        assert "net6.0" in project.read_text()
+    finally:
+        build_executor.forget(tmp / "proj")
+        workspace.remove_workspace(tmp)
+        pool.shutdown()
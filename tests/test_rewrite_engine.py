@@ -0,0 +1,52 @@
+# TextRules must rewrite exactly like sequential str.replace calls in rule order.
+
+import random
+import pytest
+
+from rewrite_engine import TextRules, plan_rewrites, walk_sources
+
+def sequential(rules, text):
+    fired = []
+    for i, r in enumerate(rules):
+        if r["pattern"] and r["pattern"] in text:
+            text = text.replace(r["pattern"], r["recommendation"])
+            fired.append(i)
+    return text, fired
+
+def test_independence_detection():
+    assert TextRules([{"pattern": "Foo.Bar", "recommendation": "X"}, {"pattern": "Baz", "recommendation": "Y"}]).independent
+    assert not TextRules([{"pattern": "Foo", "recommendation": "X"}, {"pattern": "Foo.Bar", "recommendation": "Y"}]).independent
+    assert not TextRules([{"pattern": "ab", "recommendation": "X"}, {"pattern": "bc", "recommendation": "Y"}]).independent
+    assert not TextRules([{"pattern": "A", "recommendation": "Bc"}, {"pattern": "cD", "recommendation": "Y"}]).independent
+    assert not TextRules([{"pattern": "A", "recommendation": ""}, {"pattern": "xy", "recommendation": "Y"}]).independent
+    assert not TextRules([{"pattern": "A", "recommendation": "1"}, {"pattern": "A", "recommendation": "2"}]).independent
+
+@pytest.mark.parametrize("alphabet, words", [("abc", 2), ("abcdefghijklmnop", 4), ("ABCDEFGHIJKLMNOPQRSTUVWXYZ", 5)])
+def test_fuzz_against_sequential_replace(alphabet, words):
+    rnd = random.Random(len(alphabet))
+    independent = 0
+    for _ in range(400):
+        word = lambda lo, hi: "".join(rnd.choice(alphabet) for _ in range(rnd.randint(lo, hi)))
+        rules = [{"id": f"R{i}", "pattern": word(1, words), "recommendation": word(0, words)}
+                 for i in range(rnd.randint(1, 5))]
+        tr = TextRules(rules)
+        independent += tr.independent
+        for _ in range(5):
+            text = word(0, 40)
+            assert tr.apply(text) == sequential(rules, text), (rules, text)
+    if len(alphabet) > 3:
+        assert independent > 0
+
+def test_plan_rewrites(tmp_path):
+    (tmp_path / "obj").mkdir()
+    (tmp_path / "obj" / "Gen.cs").write_text("Old.Api()")
+    (tmp_path / "B.cs").write_text("Old.Api(); Other.Thing();")
+    (tmp_path / "A.cs").write_text("nothing here")
+    (tmp_path / "C.cs").write_text("Other.Thing();")
+    rules = [{"id": "R1", "pattern": "Old.Api", "recommendation": "New.Api"},
+             {"id": "R2", "pattern": "Other.Thing", "recommendation": "Better.Thing"}]
+    plan = plan_rewrites(tmp_path, rules)
+    assert [p.name for p in walk_sources(tmp_path)] == ["A.cs", "B.cs", "C.cs"] and plan.scanned == 3
+    assert [(rid, cs.name) for rid, cs, _, _ in plan.edits] == [("R1", "B.cs"), ("R2", "B.cs"), ("R2", "C.cs")]
+    assert plan.rewritten[tmp_path / "B.cs"] == "New.Api(); Better.Thing();"
+    assert plan.originals[tmp_path / "C.cs"] == "Other.Thing();"
@@ -0,0 +1,70 @@
+# RuleEngine must match exactly like re.search(pattern, package, re.IGNORECASE).
+
+import random, re
+import pytest
+
+from rule_engine import RuleEngine, required_literal, has_group_refs
+from rule_loader import match_rules
+
+def naive(rules, packages):
+    out = []
+    for pkg, version in packages:
+        for r in rules:
+            try:
+                hit = re.search(r["pattern"], pkg, re.IGNORECASE)
+            except (re.error, TypeError):
+                continue
+            if hit:
+                out.append((r["id"], pkg))
+    return out
+
+def engine_hits(rules, packages):
+    return [(m["id"], m["package"]) for m in RuleEngine(rules).match(packages)]
+
+@pytest.mark.parametrize("pattern, literal", [
+    ("Newtonsoft\\.Json", "Newtonsoft.Json"), ("^System\\.Web", "System.Web"),
+    ("Foo|Bar", ""), ("[A-Z]+", ""), ("ab*cd", "cd"), ("", ""),
+])
+def test_required_literal(pattern, literal):
+    assert required_literal(pattern) == literal
+
+def test_group_refs():
+    assert has_group_refs(r"(.)\1") and has_group_refs(r"(?P<a>x)(?P=a)") and has_group_refs(r"(a)?(?(1)b|c)")
+    assert not has_group_refs(r"(a|b)+")
+
+def test_static_shapes_and_order():
+    rules = [
+        {"id": "A", "pattern": "Newtonsoft"}, {"id": "B", "pattern": "^microsoft\\.aspnetcore"},
+        {"id": "C", "pattern": "Json$|Xml$"}, {"id": "D", "pattern": r"(.)\1"},
+        {"id": "E", "pattern": "(?i)swash"}, {"id": "F", "pattern": "[unclosed"}, {"id": "G", "pattern": 3},
+        "not a rule",
+    ]
+    pkgs = [("Newtonsoft.Json", "12"), ("Microsoft.AspNetCore.Mvc", "2.2"), ("Swashbuckle", "5"),
+            ("System.Xml", "4"), ("Moq", "4")]
+    engine = RuleEngine(rules)
+    assert len(engine) == 5 and len(engine.problems) == 3
+    assert engine_hits(rules, pkgs) == naive(rules, pkgs)
+    extra = RuleEngine([{"id": "X", "pattern": "json"}])
+    assert [m["id"] for m in RuleEngine(rules).match([("Newtonsoft.Json", "1")], extra)] == ["A", "C", "X"]
+    assert match_rules(pkgs, rules) == RuleEngine(rules).match(pkgs)
+
+@pytest.mark.parametrize("pattern, package", [
+    ("i", "İ"), ("İ", "i"), ("İ", "İnönü"), ("ß", "ẞ"), ("ss", "ß"), ("ß", "SS"),
+    ("k", "K"), ("K", "k"), ("s", "ſ"), ("ſ", "S"), ("µ", "μ"), ("ı", "I"),
+])
+def test_non_ascii_case_folding(pattern, package):
+    rules = [{"id": "R", "pattern": pattern}]
+    assert engine_hits(rules, [(package, "1")]) == naive(rules, [(package, "1")])
+
+ALPHABET = "abcKkSsiIıİßẞſµμ.-_1" + "K"
+PIECES = ["", "^", "$", ".", "a|b", "[a-z]", "(k)", "s+", "i?", "\\.", "(.)\\1", "(?:ss)"]
+
+def test_fuzz_against_re():
+    rnd = random.Random(16)
+    rules = []
+    for i in range(300):
+        body = "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(1, 4)))
+        pat = rnd.choice(PIECES) + body + rnd.choice(PIECES)
+        rules.append({"id": f"R{i}", "pattern": pat})
+    pkgs = [("".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(1, 12))), "1") for _ in range(400)]
+    assert engine_hits(rules, pkgs) == naive(rules, pkgs)
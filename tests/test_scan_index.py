@@ -0,0 +1,71 @@
+# ScanIndex must return the same as a full scan and re-parse exactly the files that changed.
+
+import os, time
+import pytest
+
+import code_scanner
+import scan_index
+from scan_index import ScanIndex
+
+OLD_NS = 1_000_000_000_000_000_000       # 2001: well outside the racy window
+
+@pytest.fixture
+def tree(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(3):
+        _write(src / f"F{i}.cs", f"var x = Helper{i}.Compute(Foo.Bar.Baz());\n")
+    return src
+
+def _write(path, text, mtime_ns=OLD_NS):
+    path.write_text(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def _scan(index, src):
+    stats = {}
+    found = index.scan(src, jobs=1, stats=stats)
+    assert found == code_scanner.extract_code_sentences(src, jobs=1)
+    return stats
+
+def _counts(stats):
+    return stats["hits"], stats["rehashed"], stats["misses"], stats["removed"]
+
+def test_unchanged_files_are_hits(tmp_path, tree):
+    index = ScanIndex(tmp_path / "idx.db")
+    assert _counts(_scan(index, tree)) == (0, 0, 3, 0)
+    assert _counts(_scan(index, tree)) == (3, 0, 0, 0)
+    assert _counts(_scan(ScanIndex(tmp_path / "idx.db"), tree)) == (3, 0, 0, 0)
+
+def test_mtime_size_and_digest_changes(tmp_path, tree):
+    index = ScanIndex(tmp_path / "idx.db")
+    _scan(index, tree)
+    f0, f1, f2 = (tree / f"F{i}.cs" for i in range(3))
+    os.utime(f0, ns=(OLD_NS + 1, OLD_NS + 1))                          # touched, same bytes
+    _write(f1, f1.read_text() + "Extra.Thing.Here();\n")              # new size
+    _write(f2, f2.read_text().replace("Compute", "Computx"), OLD_NS + 1)  # same size, new bytes
+    assert _counts(_scan(index, tree)) == (0, 1, 2, 0)
+    assert _counts(_scan(index, tree)) == (3, 0, 0, 0)
+
+def test_racy_mtime_is_not_trusted(tmp_path, tree):
+    index = ScanIndex(tmp_path / "idx.db")
+    f0 = tree / "F0.cs"
+    now = time.time_ns()
+    _write(f0, f0.read_text(), now)
+    _scan(index, tree)
+    # rewritten within the same mtime tick: stat is identical, content is not
+    _write(f0, f0.read_text().replace("Helper0", "Helpex0"), now)
+    stats = _scan(index, tree)
+    assert stats["misses"] == 1 and "Helpex0.Compute" in index.scan(tree, jobs=1)
+
+def test_removed_files_are_dropped(tmp_path, tree):
+    index = ScanIndex(tmp_path / "idx.db")
+    _scan(index, tree)
+    (tree / "F2.cs").unlink()
+    assert _counts(_scan(index, tree)) == (2, 0, 0, 1)
+
+def test_fingerprint_change_invalidates(tmp_path, tree, monkeypatch):
+    _scan(ScanIndex(tmp_path / "idx.db"), tree)
+    monkeypatch.setattr(scan_index, "MARKERS", scan_index.MARKERS + ("Program",))
+    index = ScanIndex(tmp_path / "idx.db")
+    assert _counts(_scan(index, tree)) == (0, 0, 3, 0)
+    assert _counts(_scan(index, tree)) == (3, 0, 0, 0)
@@ -0,0 +1,89 @@
+# verifier: source lookup stays inside the project; rollback drops only the AI edits that broke the build.
+
+import types
+import pytest
+
+import utils
+import verifier
+from msbuild_log import parse_line
+
+@pytest.fixture
+def proj(tmp_path):
+    d = tmp_path / "proj"
+    (d / "obj").mkdir(parents=True)
+    (d / "Web").mkdir()
+    (d / "App.csproj").write_text("<Project />")
+    (d / "Web" / "Home.cs").write_text("class Home {}\n")
+    (d / "obj" / "Gen.cs").write_text("// generated\n")
+    (tmp_path / "Sdk.targets").write_text("<Project />")
+    yield d
+    utils.discard_backups(tmp_path)
+
+def test_source_is_confined_to_the_project(proj, monkeypatch):
+    home = (proj / "Web" / "Home.cs").resolve()
+    assert verifier._source(proj, str(home)) == home
+    assert verifier._source(proj, "Home.cs") == home
+    assert verifier._source(proj, str(proj.parent / "Sdk.targets")) is None
+    assert verifier._source(proj, str(proj / "Missing.cs")) is None
+    assert verifier._source(proj, "Gen.cs") is None
+    assert verifier._source(proj, "") is None
+    monkeypatch.chdir(proj)
+    assert verifier._source(proj, "../Sdk.targets") is None
+    assert verifier._source(proj, "Web/Home.cs") == home
+
+def test_apply_near_picks_the_closest_occurrence():
+    text = "a = x;\nb = 1;\nc = x;\n"
+    assert verifier._apply_near(text, "x", "y", 3) == "a = x;\nb = 1;\nc = y;\n"
+    assert verifier._apply_near(text, "x", "y", 1) == "a = y;\nb = 1;\nc = x;\n"
+    assert verifier._apply_near(text, "z", "y", 1) is None
+
+def _result(*lines):
+    return types.SimpleNamespace(errors=[parse_line(l) for l in lines])
+
+def _edit(cs, line, find, repl):
+    key = ("CS0103", cs.name, f"e{line}")
+    return (key, line, find, repl)
+
+def _touch(files):
+    """files: {path: [(line, find, replace)]} – applies the edits like _ai_micro_fixes."""
+    touched = {}
+    for cs, edits in files.items():
+        utils.backup_file(cs)
+        text = cs.read_text()
+        for line, find, repl in edits:
+            text = verifier._apply_near(text, find, repl, line)
+            touched.setdefault(cs.resolve(), []).append(_edit(cs, line, find, repl))
+        utils.write_text(cs, text)
+    return touched
+
+def test_roll_back_drops_the_edit_nearest_a_new_error(proj):
+    cs = proj / "Web" / "Home.cs"
+    cs.write_text("one\ntwo\nthree\nfour\nfive\n")
+    touched = _touch({cs: [(1, "one", "ONE"), (5, "five", "FIVE")]})
+    before = set()
+    result = _result(f"{cs.resolve()}(4,1): error CS1002: ; expected")
+    dropped = verifier._roll_back(touched, result, before)
+    assert dropped == {_edit(cs, 5, "five", "FIVE")[0]}
+    assert cs.read_text() == "ONE\ntwo\nthree\nfour\nfive\n"
+
+def test_roll_back_everything_when_new_errors_are_elsewhere(proj):
+    cs = proj / "Web" / "Home.cs"
+    other = proj / "Other.cs"
+    cs.write_text("one\ntwo\n")
+    other.write_text("x\n")
+    touched = _touch({cs: [(1, "one", "ONE"), (2, "two", "TWO")]})
+    dropped = verifier._roll_back(touched, _result(f"{other.resolve()}(1,1): error CS0116: bad"), set())
+    assert dropped == {k for k, *_ in touched[cs.resolve()]}
+    assert cs.read_text() == "one\ntwo\n"
+
+def test_verify_keeps_a_micro_fix_that_turns_the_build_green(proj, monkeypatch):
+    cs = proj / "Web" / "Home.cs"
+    cs.write_text("var v = Foo();\n")
+    err = parse_line(f"{cs.resolve()}(1,9): error CS0103: The name 'Foo' does not exist in the current context")
+    builds = iter([(False, types.SimpleNamespace(ok=False, errors=[err], by_code=lambda: {"CS0103": {err.file: [err]}})),
+                   (True, types.SimpleNamespace(ok=True, errors=[]))])
+    monkeypatch.setattr(verifier, "_build", lambda proj_dir: next(builds))
+    monkeypatch.setattr(verifier, "query_llm_batch",
+                        lambda prompts, **kw: ['{"find": "Foo()", "replace": "Bar()"}'] * len(prompts))
+    ok, _ = verifier.verify_and_retry(str(proj), max_retries=2)
+    assert ok and cs.read_text() == "var v = Bar();\n"
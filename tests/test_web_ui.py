@@ -0,0 +1,99 @@
+# Dashboard: bounded run history.
+
+import json, sqlite3, threading
+from collections import OrderedDict
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+import web_ui.app as app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "RUN_HISTORY", tmp_path / "run_history.jsonl")
+    monkeypatch.setattr(app, "RUNS", OrderedDict())
+    monkeypatch.setattr(app, "HISTORY_RUNS", 3)
+    monkeypatch.setattr(app, "_history_lines", 0)
+    return TestClient(app.app)
+
+def _run(i, finished=True):
+    return {"run_id": f"run{i}", "finished": finished, "wall_s": float(i),
+            "metrics": {"upgrade_projects_total": {"type": "counter", "help": "",
+                                                   "samples": [{"labels": {"status": "ok"}, "value": 1}]}}}
+
+def test_run_history_is_capped(client):
+    for i in range(10):
+        client.post("/push-metrics", json=_run(i, finished=False))
+        client.post("/push-metrics", json=_run(i))
+    assert list(app.RUNS) == ["run7", "run8", "run9"]
+    lines = app.RUN_HISTORY.read_text().splitlines()
+    assert len(lines) <= 2 * app.HISTORY_RUNS
+    assert [json.loads(l)["run_id"] for l in lines][-1] == "run9"
+
+    text = client.get("/metrics").text
+    assert "upgrade_runs_total 3" in text
+    assert 'upgrade_projects_total{status="ok"} 3' in text
+
+    app.RUNS.clear()
+    app._load_history()
+    assert list(app.RUNS) == ["run7", "run8", "run9"]
+
+# Learned rules: keyset pagination over (created_at, id).
+
+@pytest.fixture
+def rules_db(tmp_path, monkeypatch):
+    path = tmp_path / "memory.db"
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE ai_rules_log (id INTEGER PRIMARY KEY AUTOINCREMENT, rule_id TEXT, pattern TEXT,
+                    recommendation TEXT, project TEXT, error_codes TEXT, build_success INTEGER,
+                    confidence REAL, created_at TIMESTAMP)""")
+    # three rows per second, so created_at alone does not order a page boundary
+    conn.executemany("INSERT INTO ai_rules_log(rule_id, pattern, recommendation, build_success, confidence, created_at) "
+                     "VALUES (?,?,?,?,?,datetime('2026-01-01', ?))",
+                     [(f"R{i}", "Json" if i % 2 else "Sql", "fix", i % 3 != 0, 1.0, f"+{i // 3} seconds")
+                      for i in range(40)])
+    conn.commit(); conn.close()
+    monkeypatch.setattr(app, "DB_PATH", path)
+    monkeypatch.setattr(app, "_db_local", threading.local())
+    return path
+
+def _all_pages(limit, **filters):
+    args = dict(pattern="", success="", since="", until="", before="")
+    args.update(filters)
+    rows, pages = [], 0
+    while True:
+        page, cursor = app._query_rules(**args, limit=limit)
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+        args["before"] = cursor
+
+def _ids(rows):
+    return [r[6] for r in rows]
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 40, 100])
+def test_rules_pages_cover_every_row_once(rules_db, limit):
+    rows, pages = _all_pages(limit)
+    assert _ids(rows) == list(range(40, 0, -1))
+    assert pages == max(1, -(-40 // limit))
+
+def test_rules_filters_apply_across_pages(rules_db):
+    rows, _ = _all_pages(4, pattern="json", success="1")
+    assert _ids(rows) == [i + 1 for i in range(39, -1, -1) if i % 2 and i % 3 != 0]
+    rows, _ = _all_pages(5, since="2026-01-01 00:00:05", until="2026-01-01")
+    assert _ids(rows) == list(range(40, 15, -1))
+
+def test_rules_page_links_the_next_page(rules_db, client, monkeypatch):
+    seen = {}
+    def render(name, context):
+        seen.update(context)
+        return app.HTMLResponse("")
+    monkeypatch.setattr(app.templates, "TemplateResponse", render)
+    client.get("/rules", params={"pattern": "Sql", "limit": 15})
+    assert [r[0] for r in seen["rules"]][:2] == ["R38", "R36"] and len(seen["rules"]) == 15
+    assert seen["next_url"] == "/rules?pattern=Sql&limit=15&before=2026-01-01+00%3A00%3A03%7C11"
+    assert seen["first_url"] is None
+    client.get("/rules", params={"pattern": "Sql", "limit": 15, "before": "2026-01-01 00:00:03|11"})
+    assert [r[0] for r in seen["rules"]] == ["R8", "R6", "R4", "R2", "R0"]
+    assert seen["next_url"] is None and seen["first_url"] == "/rules?pattern=Sql&limit=15"
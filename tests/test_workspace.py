@@ -0,0 +1,52 @@
+# Workspaces must never write through to the input tree.
+
+import os, stat
+
+import utils
+import workspace
+
+def _tree(root):
+    (root / "obj").mkdir(parents=True)
+    (root / "obj" / "stale.dll").write_bytes(b"old")
+    (root / "Program.cs").write_text("class P {}\n")
+    (root / "lib.dll").write_bytes(b"MZ")
+    os.chmod(root / "lib.dll", 0o751)
+    os.symlink("Program.cs", root / "Link.cs")
+
+def test_provision_copy_skips_artifacts(tmp_path):
+    _tree(tmp_path / "in")
+    stats = workspace.provision(tmp_path / "in", tmp_path / "out", link="copy")
+    assert (stats["copy"], stats["skipped_dirs"]) == (2, 1)
+    assert not (tmp_path / "out" / "obj").exists()
+    assert os.readlink(tmp_path / "out" / "Link.cs") == "Program.cs"
+
+def test_hardlink_mode_links_only_binaries(tmp_path):
+    _tree(tmp_path / "in")
+    stats = workspace.provision(tmp_path / "in", tmp_path / "out", link="hardlink")
+    assert (stats["hardlink"], stats["copy"]) == (1, 1)
+    assert os.stat(tmp_path / "out" / "lib.dll").st_nlink == 2
+    assert os.stat(tmp_path / "out" / "Program.cs").st_nlink == 1
+
+def test_writes_break_the_hardlink(tmp_path):
+    _tree(tmp_path / "in")
+    workspace.provision(tmp_path / "in", tmp_path / "out", link="hardlink")
+    original, linked = tmp_path / "in" / "lib.dll", tmp_path / "out" / "lib.dll"
+
+    utils.backup_file(linked)
+    utils.write_text(linked, "patched")
+    assert original.read_bytes() == b"MZ" and linked.read_text() == "patched"
+    assert stat.S_IMODE(os.stat(linked).st_mode) == 0o751 and os.stat(original).st_nlink == 1
+
+    os.link(original, tmp_path / "out" / "again.dll")
+    utils.backup_file(tmp_path / "out" / "again.dll")
+    utils.restore_backup(tmp_path / "out" / "again.dll")
+    utils.restore_backup(linked)
+    assert linked.read_bytes() == b"MZ" and os.stat(original).st_nlink == 1
+    utils.discard_backups(tmp_path)
+
+def test_plain_files_are_written_in_place(tmp_path):
+    f = tmp_path / "A.cs"
+    f.write_text("a")
+    inode = os.stat(f).st_ino
+    utils.write_text(f, "b")
+    assert f.read_text() == "b" and os.stat(f).st_ino == inode
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
-# Web Dashboard with Live Logs + Rule Viewer + Reports
+# Web Dashboard with Live Logs + Rule Viewer + Reports + Run Metrics
 
-import asyncio, json, pathlib, sqlite3
+import asyncio, json, os, html, stat, pathlib, sqlite3, threading
+from collections import OrderedDict
+from urllib.parse import urlencode
 from fastapi import FastAPI, WebSocket, Request
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 DB_PATH = pathlib.Path("/opt/oss-migrate/upgrade-poc/upgrade_memory.db")
 REPORT_DIR = pathlib.Path("/opt/oss-migrate/upgrade-poc/reports")
+RUN_HISTORY = pathlib.Path("/opt/oss-migrate/upgrade-poc/run_history.jsonl")
 
 app = FastAPI(title="AI Upgrade Dashboard")
 BASE_DIR = pathlib.Path(__file__).resolve().parent
@@ -16,32 +20,64 @@ BASE_DIR = pathlib.Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=f"{BASE_DIR}/static"), name="static")
 templates = Jinja2Templates(directory=f"{BASE_DIR}/templates")
 
-connected_websockets = set()
-
 # ---------------------------------------------------------------
 # WebSocket: Live log streaming
+# Every client has its own bounded buffer and sender task, so a slow
+# browser only delays itself; one that falls CLIENT_BUFFER lines
+# behind is disconnected.
 # ---------------------------------------------------------------
+CLIENT_BUFFER = 2000
+CLIENT_FRAME_LINES = 200         # lines coalesced into one WebSocket frame
+
+class LogClient:
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.queue = asyncio.Queue(maxsize=CLIENT_BUFFER)
+        self.evicted = False
+
+    async def sender(self):
+        while True:
+            lines = [await self.queue.get()]
+            while len(lines) < CLIENT_FRAME_LINES and not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            await self.ws.send_text("\n".join(lines))
+
+    async def receiver(self):
+        """Returns when the browser disconnects (nothing is expected from it)."""
+        while (await self.ws.receive())["type"] != "websocket.disconnect":
+            pass
+
+connected_clients = set()
+
 @app.websocket("/ws/logs")
 async def log_socket(ws: WebSocket):
     await ws.accept()
-    connected_websockets.add(ws)
+    client = LogClient(ws)
+    connected_clients.add(client)
+    tasks = [asyncio.create_task(client.sender()), asyncio.create_task(client.receiver())]
     try:
-        while True:
-            await asyncio.sleep(1)
-    except:
-        pass
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
     finally:
-        connected_websockets.remove(ws)
+        connected_clients.discard(client)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-async def broadcast_log(text: str):
-    dead = []
-    for ws in connected_websockets:
+def broadcast_log(*lines: str):
+    """Never awaits: queues the lines for every client and evicts the ones that are full."""
+    for client in list(connected_clients):
         try:
-            await ws.send_text(text)
-        except:
-            dead.append(ws)
-    for ws in dead:
-        connected_websockets.remove(ws)
+            for line in lines:
+                client.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            _evict(client)
+
+def _evict(client: LogClient):
+    connected_clients.discard(client)
+    if not client.evicted:
+        client.evicted = True
+        asyncio.get_running_loop().create_task(
+            client.ws.close(code=1013, reason="live log client too slow"))
 
 
 # ---------------------------------------------------------------
@@ -53,50 +89,138 @@ async def dashboard(request: Request):
 
 
 # ---------------------------------------------------------------
-# Learned Rules Viewer
+# Learned Rules Viewer (keyset pagination: newest first, ?before=<created_at>|<id>)
 # ---------------------------------------------------------------
+RULES_PAGE = 200
+RULES_PAGE_MAX = 1000
+
+_db_local = threading.local()
+
+def _db():
+    """Read-only connection per worker thread; the dashboard never writes the learning DB."""
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=30)
+        _db_local.conn = conn
+    return conn
+
+def _query_rules(pattern, success, since, until, before, limit):
+    where, params = [], []
+    if pattern:
+        where.append("pattern LIKE ?")
+        params.append(f"%{pattern}%")
+    if success in ("0", "1"):
+        where.append("build_success = ?")
+        params.append(int(success))
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < date(?, '+1 day')")
+        params.append(until)
+    if before:
+        created_at, _, rid = before.rpartition("|")
+        where.append("(created_at, id) < (?, ?)")
+        params += [created_at, int(rid or 0)]
+    sql = ("SELECT rule_id, pattern, recommendation, build_success, confidence, created_at, id "
+           "FROM ai_rules_log" + (" WHERE " + " AND ".join(where) if where else "")
+           + " ORDER BY created_at DESC, id DESC LIMIT ?")
+    rows = _db().execute(sql, params + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = f"{rows[-1][5]}|{rows[-1][6]}" if more else None
+    return rows, cursor
+
 @app.get("/rules", response_class=HTMLResponse)
-async def rules_page(request: Request):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.execute("""
-        SELECT rule_id, pattern, recommendation, build_success, confidence, created_at
-        FROM ai_rules_log ORDER BY created_at DESC LIMIT 200
-    """)
-    rows = cursor.fetchall()
-    conn.close()
+async def rules_page(request: Request, pattern: str = "", success: str = "", since: str = "",
+                     until: str = "", before: str = "", limit: int = RULES_PAGE):
+    limit = max(1, min(limit, RULES_PAGE_MAX))
+    try:
+        rows, cursor = await run_in_threadpool(_query_rules, pattern, success, since, until, before, limit)
+    except (sqlite3.Error, ValueError) as e:
+        rows, cursor = [], None
+        print(f"⚠️ /rules query failed: {e}")
 
+    filters = {k: v for k, v in {"pattern": pattern, "success": success, "since": since,
+                                 "until": until, "limit": limit if limit != RULES_PAGE else ""}.items() if v}
     return templates.TemplateResponse("rules.html", {
         "request": request,
-        "rules": rows
+        "rules": rows,
+        "filters": filters,
+        "next_url": f"/rules?{urlencode({**filters, 'before': cursor})}" if cursor else None,
+        "first_url": f"/rules?{urlencode(filters)}" if before else None,
     })
 
 
 # ---------------------------------------------------------------
-# Reports Viewer
+# Reports Viewer (listing cached on the directory's mtime; files streamed with ETags)
 # ---------------------------------------------------------------
+REPORT_CHUNK = 64 * 1024
+_report_listing = {"key": None, "reports": []}
+
+def _list_reports():
+    """Report names, re-read only when the directory changes (a report is added or removed)."""
+    try:
+        key = REPORT_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _report_listing["key"] != key:
+        reports = []
+        with os.scandir(REPORT_DIR) as it:
+            for e in it:
+                if e.name.endswith("_upgrade_summary.md") and e.is_file():
+                    reports.append(e.name)
+        _report_listing.update(key=key, reports=sorted(reports))
+    return _report_listing["reports"]
+
 @app.get("/reports", response_class=HTMLResponse)
 async def reports_page(request: Request):
-    reports = sorted(REPORT_DIR.glob("*_upgrade_summary.md"))
+    reports = await run_in_threadpool(_list_reports)
     return templates.TemplateResponse("reports.html", {
         "request": request,
-        "reports": [r.name for r in reports]
+        "reports": reports
     })
 
+def _report_stat(name: str):
+    if "/" in name or "\\" in name or name.startswith("."):
+        return None
+    try:
+        st = (REPORT_DIR / name).stat()
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+def _read_chunks(path: pathlib.Path):
+    with open(path, errors="ignore") as f:
+        while True:
+            chunk = f.read(REPORT_CHUNK)
+            if not chunk:
+                return
+            yield html.escape(chunk, quote=False)
 
 @app.get("/reports/{name}", response_class=HTMLResponse)
 async def read_report(name: str, request: Request):
-    path = REPORT_DIR / name
-    if not path.exists():
+    st = await run_in_threadpool(_report_stat, name)
+    if st is None:
         return HTMLResponse("Report not found", status_code=404)
 
-    text = path.read_text(errors="ignore")
-    escaped = text.replace("<","&lt;").replace(">","&gt;")
+    etag = f'W/"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
 
-    return templates.TemplateResponse("report_view.html", {
-        "request": request,
-        "name": name,
-        "text": escaped
-    })
+    # The page shell is rendered once; the report body streams through it, escaped per chunk.
+    marker = "\x00REPORT\x00"
+    head, _, tail = templates.get_template("report_view.html").render(
+        request=request, name=name, text=marker).partition(marker)
+
+    async def body():
+        yield head
+        async for chunk in iterate_in_threadpool(_read_chunks(REPORT_DIR / name)):
+            yield chunk
+        yield tail
+
+    return StreamingResponse(body(), media_type="text/html; charset=utf-8", headers=headers)
 
 
 # ---------------------------------------------------------------
@@ -105,6 +229,195 @@ async def read_report(name: str, request: Request):
 @app.post("/push-log")
 async def push_log(payload: dict):
     msg = payload.get("message","")
-    await broadcast_log(msg)
+    broadcast_log(msg)
+    return {"ok": True}
+
+@app.post("/push-logs")
+async def push_logs(payload: dict):
+    """Batched form used by src/live_log.py: {"messages": [...]}."""
+    messages = [str(m) for m in payload.get("messages", [])]
+    broadcast_log(*messages)
+    return {"ok": True, "lines": len(messages)}
+
+
+# ---------------------------------------------------------------
+# Run metrics: pushed by main.py (src/metrics.py), one cumulative
+# snapshot per run; finished runs are appended to RUN_HISTORY
+# ---------------------------------------------------------------
+RUNS = OrderedDict()
+HISTORY_RUNS = 50          # runs kept (in memory and in RUN_HISTORY), compared on /runs
+_history_lock = threading.Lock()
+_history_lines = 0
+
+def _keep_recent():
+    while len(RUNS) > HISTORY_RUNS:
+        RUNS.popitem(last=False)
+
+def _load_history():
+    global _history_lines
+    if not RUN_HISTORY.exists():
+        return
+    with open(RUN_HISTORY, errors="ignore") as f:
+        for line in f:
+            _history_lines += 1
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue
+            RUNS[run["run_id"]] = run
+            _keep_recent()
+
+_load_history()
+
+def _append_history(run: dict):
+    """Appends a finished run; past 2 x HISTORY_RUNS lines the file is rewritten with the kept runs."""
+    global _history_lines
+    RUN_HISTORY.parent.mkdir(parents=True, exist_ok=True)
+    with _history_lock:
+        with open(RUN_HISTORY, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        _history_lines += 1
+        if _history_lines <= 2 * HISTORY_RUNS:
+            return
+        kept = [r for r in list(RUNS.values()) if r.get("finished")]
+        tmp = RUN_HISTORY.with_suffix(".jsonl.tmp")
+        with open(tmp, "w") as f:
+            for r in kept:
+                f.write(json.dumps(r) + "\n")
+        os.replace(tmp, RUN_HISTORY)
+        _history_lines = len(kept)
+
+@app.post("/push-metrics")
+async def push_metrics(payload: dict):
+    run_id = payload.get("run_id")
+    if not run_id:
+        return {"ok": False}
+    was_finished = RUNS.get(run_id, {}).get("finished")
+    RUNS[run_id] = payload
+    _keep_recent()
+    if payload.get("finished") and not was_finished:
+        await run_in_threadpool(_append_history, payload)
     return {"ok": True}
 
+def _label_key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+def _merge_metrics(snapshots):
+    """Sums counters and histogram buckets with equal labels across runs."""
+    merged = {}
+    for snap in snapshots:
+        for name, m in snap.items():
+            out = merged.setdefault(name, {"type": m["type"], "help": m.get("help", ""), "samples": {}})
+            for s in m["samples"]:
+                k = _label_key(s["labels"])
+                cur = out["samples"].get(k)
+                if cur is None:
+                    out["samples"][k] = json.loads(json.dumps(s))
+                elif m["type"] == "histogram":
+                    cur["sum"] += s["sum"]
+                    cur["count"] += s["count"]
+                    for b, (_, n) in zip(cur["buckets"], s["buckets"]):
+                        b[1] += n
+                else:
+                    cur["value"] += s["value"]
+    return merged
+
+def _labels(labels: dict, **extra) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items.items()) + "}"
+
+def render_prometheus(merged: dict, runs: list) -> str:
+    lines = []
+    for name, m in sorted(merged.items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['type']}")
+        for s in m["samples"].values():
+            if m["type"] == "histogram":
+                for le, n in s["buckets"]:
+                    lines.append(f"{name}_bucket{_labels(s['labels'], le=le)} {n}")
+                lines.append(f"{name}_sum{_labels(s['labels'])} {s['sum']}")
+                lines.append(f"{name}_count{_labels(s['labels'])} {s['count']}")
+            else:
+                lines.append(f"{name}{_labels(s['labels'])} {s['value']}")
+    finished = [r for r in runs if r.get("finished")]
+    lines += ["# HELP upgrade_runs_total Orchestrator runs finished", "# TYPE upgrade_runs_total counter",
+              f"upgrade_runs_total {len(finished)}",
+              "# HELP upgrade_runs_in_progress Orchestrator runs still pushing", "# TYPE upgrade_runs_in_progress gauge",
+              f"upgrade_runs_in_progress {len(runs) - len(finished)}"]
+    if finished and finished[-1].get("wall_s") is not None:
+        lines += ["# HELP upgrade_last_run_wall_seconds Wall time of the last finished run",
+                  "# TYPE upgrade_last_run_wall_seconds gauge",
+                  f"upgrade_last_run_wall_seconds {finished[-1]['wall_s']}"]
+    return "\n".join(lines) + "\n"
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    runs = list(RUNS.values())
+    text = render_prometheus(_merge_metrics(r.get("metrics", {}) for r in runs), runs)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+def _total(metrics: dict, name: str, field="value", **match):
+    m = metrics.get(name)
+    if not m:
+        return 0
+    return sum(s.get(field, 0) for s in m["samples"]
+               if all(str(s["labels"].get(k)) == str(v) for k, v in match.items()))
+
+def _quantile(metrics: dict, name: str, q: float):
+    """Upper bucket bound holding the q-quantile, across all label sets."""
+    m = metrics.get(name)
+    if not m or not m["samples"]:
+        return None
+    buckets = {}
+    for s in m["samples"]:
+        for le, n in s["buckets"]:
+            buckets[le] = buckets.get(le, 0) + n
+    total = buckets.get("+Inf", 0)
+    if not total:
+        return None
+    return next((le for le, n in buckets.items() if n >= q * total), "+Inf")
+
+def summarize_run(run: dict) -> dict:
+    m = run.get("metrics", {})
+    llm_n = _total(m, "upgrade_llm_request_duration_seconds", "count")
+    hits = sum(_total(m, "upgrade_llm_cache_events_total", event=e) for e in ("mem_hits", "disk_hits"))
+    lookups = hits + _total(m, "upgrade_llm_cache_events_total", event="misses")
+    phases = {}
+    for s in m.get("upgrade_phase_duration_seconds", {}).get("samples", []):
+        phases[s["labels"]["phase"]] = s["sum"] / s["count"] if s["count"] else 0.0
+    return {
+        "run_id": run["run_id"], "started": run.get("started"), "finished": run.get("finished"),
+        "input": run.get("input"), "jobs": run.get("jobs"), "wall_s": run.get("wall_s"),
+        "projects": int(_total(m, "upgrade_projects_total")), "projects_planned": run.get("projects"),
+        "failed": int(_total(m, "upgrade_projects_total") - _total(m, "upgrade_projects_total", status="ok")),
+        "builds": int(_total(m, "upgrade_builds_total")),
+        "build_s": round(_total(m, "upgrade_build_duration_seconds", "sum"), 2),
+        "llm_calls": int(llm_n),
+        "llm_mean_s": round(_total(m, "upgrade_llm_request_duration_seconds", "sum") / llm_n, 2) if llm_n else None,
+        "llm_p95_s": _quantile(m, "upgrade_llm_request_duration_seconds", 0.95),
+        "tokens": int(_total(m, "upgrade_llm_completion_tokens_total")),
+        "db_s": round(_total(m, "upgrade_db_call_duration_seconds", "sum"), 3),
+        "cache_hit_rate": f"{hits / lookups:.0%}" if lookups else "–",
+        "phases": phases,
+    }
+
+@app.get("/runs", response_class=HTMLResponse)
+async def runs_page(request: Request):
+    runs = [summarize_run(r) for r in list(RUNS.values())[-HISTORY_RUNS:]][::-1]
+    phase_names = sorted({p for r in runs for p in r["phases"]},
+                         key=lambda p: (int(p.split(".")[0]) if p.split(".")[0].isdigit() else 99, p))
+    # Phase means of each run against the run before it (newest first)
+    changes = []
+    for i, r in enumerate(runs):
+        prev = runs[i + 1]["phases"] if i + 1 < len(runs) else {}
+        changes.append({p: (r["phases"][p] / prev[p] - 1) if prev.get(p) and p in r["phases"] else None
+                        for p in phase_names})
+    return templates.TemplateResponse("runs.html", {
+        "request": request,
+        "runs": runs,
+        "phase_names": phase_names,
+        "changes": changes,
+    })
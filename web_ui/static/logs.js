@@ -1,7 +1,20 @@
-let socket = new WebSocket("ws://" + window.location.host + "/ws/logs");
 let box = document.getElementById("logbox");
 
-socket.onmessage = function(event) {
-    box.textContent += event.data + "\n";
-    box.scrollTop = box.scrollHeight;
-};
+// One frame may carry several lines; the server closes slow clients (1013), so reconnect.
+function connect() {
+    let socket = new WebSocket("ws://" + window.location.host + "/ws/logs");
+
+    socket.onmessage = function(event) {
+        box.textContent += event.data + "\n";
+        box.scrollTop = box.scrollHeight;
+    };
+
+    socket.onclose = function(event) {
+        if (event.code === 1013) {
+            box.textContent += "[live log fell behind; reconnecting, some lines were skipped]\n";
+        }
+        setTimeout(connect, 2000);
+    };
+}
+
+connect();